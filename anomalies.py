@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Ночной поиск аномалий по всем семьям
+
+Кормления и смены подгузников всех семей за последние SCAN_DAYS суток
+читаются одним проходом по покрывающему индексу (family_id, type, ts) —
+строки уже отсортированы, поэтому группы «семья × вид» идут подряд и
+обрабатываются в NumPy через reduceat без циклов по семьям:
+
+    - long_feed_gap  — за последние сутки был перерыв между кормлениями
+      намного длиннее обычного для этой семьи;
+    - feeding_drop   — кормлений за сутки заметно меньше, чем в среднем
+      за предыдущие дни;
+    - diaper_gap     — подгузник не меняли дольше DIAPER_GAP_HOURS (только
+      у семей, которые вообще отмечают смены подгузников).
+
+    python anomalies.py --days 3   # разовый прогон по текущей базе
+"""
+
+import argparse
+import logging
+import time
+
+import numpy as np
+
+import clock
+import storage
+
+logger = logging.getLogger('babybot.anomalies')
+
+SCAN_DAYS = 3
+FETCH_BATCH = 200_000
+
+# Перерыв между кормлениями аномален, если он длиннее LONG_GAP_FACTOR средних
+# промежутков семьи за окно и не короче LONG_GAP_MIN_HOURS
+LONG_GAP_FACTOR = 2.5
+LONG_GAP_MIN_HOURS = 5.0
+# Нужно столько промежутков, чтобы «обычный» промежуток что-то значил
+MIN_GAPS = 5
+# Кормлений за сутки меньше DROP_RATIO от среднего за предыдущие дни
+DROP_RATIO = 0.5
+DROP_MIN_BASELINE = 4.0
+DIAPER_GAP_HOURS = 8.0
+# Семья без смен подгузника за окно получает флаг, только если записывала их
+# за последние DIAPER_LOOKBACK_DAYS суток: кто подгузники не отмечает, тому не пишем
+DIAPER_LOOKBACK_DAYS = 7
+
+
+def load_events(since_ts):
+    """Все кормления и смены подгузников с since_ts: массивы (family_id, type, ts),
+    отсортированные по (family_id, type, ts)"""
+    chunks = [np.array(rows, dtype=np.float64)
+              for rows in storage.iter_event_times(('feedings', 'diapers'), since_ts, FETCH_BATCH)]
+    if not chunks:
+        empty = np.empty(0)
+        return empty.astype(np.int64), empty.astype(np.int8), empty
+    data = np.concatenate(chunks)
+    return data[:, 0].astype(np.int64), data[:, 1].astype(np.int8), data[:, 2]
+
+
+def detect(family, kind, ts, now, days=SCAN_DAYS):
+    """Флаги аномалий по отсортированным массивам: {family_id: {флаг: подробности}}"""
+    if not len(ts):
+        return {}
+    day_start = now - 86400
+
+    key = family * 8 + kind
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    group_family, group_kind = family[starts], kind[starts]
+
+    # Промежуток до каждого события внутри своей группы (у первого события группы — 0)
+    gap = np.r_[0.0, np.diff(ts)]
+    gap[starts] = 0.0
+    gap_count = ends - starts
+    mean_gap = np.add.reduceat(gap, starts) / np.maximum(gap_count, 1)
+    # Самый длинный перерыв за сутки, включая перерыв от последнего события до «сейчас»
+    recent_gap = np.maximum.reduceat(np.where(ts >= day_start, gap, 0.0), starts)
+    recent_gap = np.maximum(recent_gap, now - ts[ends])
+    last_day = np.add.reduceat((ts >= day_start).astype(np.int64), starts)
+    baseline = (gap_count + 1 - last_day) / max(days - 1, 1)
+
+    flags = {}
+
+    feed = group_kind == storage.FEEDING
+    long_gap = (feed & (gap_count >= MIN_GAPS)
+                & (recent_gap > np.maximum(LONG_GAP_FACTOR * mean_gap, LONG_GAP_MIN_HOURS * 3600)))
+    for i in np.flatnonzero(long_gap):
+        flags.setdefault(int(group_family[i]), {})['long_feed_gap'] = (recent_gap[i] / 3600, mean_gap[i] / 3600)
+
+    if days > 1:
+        drop = feed & (baseline >= DROP_MIN_BASELINE) & (last_day < DROP_RATIO * baseline)
+        for i in np.flatnonzero(drop):
+            flags.setdefault(int(group_family[i]), {})['feeding_drop'] = (int(last_day[i]), float(baseline[i]))
+
+    diaper = group_kind == storage.DIAPER
+    diaper_gap = diaper & (recent_gap > DIAPER_GAP_HOURS * 3600)
+    for i in np.flatnonzero(diaper_gap):
+        flags.setdefault(int(group_family[i]), {})['diaper_gap'] = recent_gap[i] / 3600
+    # Кормили за сутки, а смен подгузника за всё окно нет вовсе
+    fed_today = group_family[feed & (last_day > 0)]
+    no_diapers = np.setdiff1d(fed_today, group_family[diaper])
+    for family_id in no_diapers:
+        flags.setdefault(int(family_id), {})['diaper_gap'] = None
+
+    return flags
+
+
+def scan(days=SCAN_DAYS, now=None, families=None):
+    """Прочитать события за days суток и найти аномалии (families — ограничить этим множеством id)"""
+    now = clock.time() if now is None else now
+    started = time.perf_counter()
+    family, kind, ts = load_events(now - days * 86400)
+    loaded = time.perf_counter()
+    flags = detect(family, kind, ts, now, days)
+    if families is not None:
+        flags = {family_id: found for family_id, found in flags.items() if family_id in families}
+    # «Смен подгузника нет вовсе» — проверить, что семья их раньше записывала
+    missing = [family_id for family_id, found in flags.items()
+               if 'diaper_gap' in found and found['diaper_gap'] is None]
+    if missing:
+        logged = storage.families_with_events('diapers', missing, now - DIAPER_LOOKBACK_DAYS * 86400)
+        for family_id in set(missing) - logged:
+            del flags[family_id]['diaper_gap']
+            if not flags[family_id]:
+                del flags[family_id]
+    logger.info("🔎 Поиск аномалий: %d событий, %d семей с флагами (чтение %.2f с, расчёт %.2f с)",
+                len(ts), len(flags), loaded - started, time.perf_counter() - loaded)
+    return flags
+
+
+def format_digest(found):
+    """Текст сводки для одной семьи"""
+    lines = ["🌙 **Итоги дня: на что обратить внимание**\n"]
+    if 'long_feed_gap' in found:
+        longest, usual = found['long_feed_gap']
+        lines.append(f"• 🍼 Долгий перерыв между кормлениями: {longest:.1f} ч. (обычно ~{usual:.1f} ч.)")
+    if 'feeding_drop' in found:
+        count, usual = found['feeding_drop']
+        lines.append(f"• 📉 Кормлений за сутки: {count} (обычно ~{usual:.0f})")
+    if 'diaper_gap' in found:
+        hours = found['diaper_gap']
+        if hours is None:
+            lines.append("• 🧷 Смены подгузника давно не записывались")
+        else:
+            lines.append(f"• 🧷 Подгузник не меняли {hours:.1f} ч.")
+    lines.append("\n💡 Возможно, часть записей просто пропущена. Если малыш ведёт себя "
+                 "необычно, посоветуйтесь с педиатром.")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Разовый поиск аномалий по базе BabyCareBot")
+    parser.add_argument('--days', type=int, default=SCAN_DAYS, help="Окно в сутках")
+    args = parser.parse_args()
+    flags = scan(args.days)
+    print(f"Семей с флагами: {len(flags)}")
+    for family_id, found in list(flags.items())[:10]:
+        print(f"\n[семья {family_id}]\n{format_digest(found)}")
+
+
+if __name__ == '__main__':
+    from logconfig import setup_logging
+    setup_logging()
+    main()
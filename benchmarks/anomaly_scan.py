@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк ночного поиска аномалий
+
+Создаёт синтетическую базу: у каждой семьи кормления и смены подгузников
+за последние --days суток в своём ритме, а у доли --anomalous семей —
+одна из аномалий (долгий перерыв в кормлениях, резкое падение числа
+кормлений за сутки или подгузник без смены). Затем запускает задачу
+send_anomaly_digests как тик APScheduler и показывает время чтения,
+время расчёта и сколько семей получили сводку — и сколько из них
+аномалии действительно были заложены.
+
+    python benchmarks/anomaly_scan.py --families 100000 --days 3
+"""
+
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+import numpy as np
+
+from bot_handlers import FakeClient, import_bot
+
+BATCH = 50_000
+KINDS = ('long_feed_gap', 'feeding_drop', 'diaper_gap')
+
+
+def family_events(rng, now, days, kind):
+    """Кормления и смены подгузников одной семьи: два массива epoch-времени"""
+    start = now - days * 86400
+    feed_gap = rng.uniform(2.0, 3.5) * 3600
+    diaper_gap = rng.uniform(2.5, 4.0) * 3600
+    feedings = np.arange(start + rng.uniform(0, feed_gap), now, feed_gap)
+    diapers = np.arange(start + rng.uniform(0, diaper_gap), now, diaper_gap)
+    feedings = feedings + rng.normal(0, 600, len(feedings))
+    diapers = diapers + rng.normal(0, 600, len(diapers))
+    if kind == 'long_feed_gap':
+        # Восемь часов без кормлений посреди последних суток
+        hole = now - rng.uniform(10, 20) * 3600
+        feedings = feedings[(feedings < hole) | (feedings > hole + 8 * 3600)]
+    elif kind == 'feeding_drop':
+        # В последние сутки записано только каждое третье кормление
+        recent = feedings >= now - 86400
+        keep = ~recent | (np.arange(len(feedings)) % 3 == 0)
+        feedings = feedings[keep]
+    elif kind == 'diaper_gap':
+        diapers = diapers[diapers < now - 12 * 3600]
+    return np.sort(feedings[feedings < now]), np.sort(diapers[diapers < now])
+
+
+def seed(bot, families, days, anomalous, rng):
+    """Заполнить пустую базу; вернуть {family_id: заложенная аномалия}"""
+    conn = bot.storage.get_connection()
+    now = bot.clock.time()
+    planted = {}
+
+    def family_rows():
+        for family_id in range(1, families + 1):
+            yield (family_id, f"Семья {family_id}")
+
+    def member_rows():
+        for family_id in range(1, families + 1):
+            yield (family_id, family_id * 10, 'Мама', 'user0')
+
+    def settings_rows():
+        for family_id in range(1, families + 1):
+            yield (family_id,)
+
+    def event_rows():
+        for family_id in range(1, families + 1):
+            kind = None
+            if rng.random() < anomalous:
+                kind = KINDS[rng.integers(len(KINDS))]
+                planted[family_id] = kind
+            feedings, diapers = family_events(rng, now, days, kind)
+            author = family_id * 10
+            for event_type, times in ((bot.storage.FEEDING, feedings), (bot.storage.DIAPER, diapers)):
+                for ts in times.tolist():
+                    yield (family_id, event_type, ts, author, 'Мама', 'user0')
+
+    started = time.perf_counter()
+    for sql, rows in (
+        ("INSERT INTO families (id, name) VALUES (?, ?)", family_rows()),
+        ("INSERT INTO family_members (family_id, user_id, role, name) VALUES (?, ?, ?, ?)", member_rows()),
+        ("INSERT INTO settings (family_id) VALUES (?)", settings_rows()),
+        ("INSERT INTO events (family_id, type, ts, author_id, author_role, author_name) "
+         "VALUES (?, ?, ?, ?, ?, ?)", event_rows()),
+    ):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH:
+                conn.executemany(sql, batch)
+                batch = []
+        if batch:
+            conn.executemany(sql, batch)
+        conn.commit()
+    bot.storage.invalidate_cache()
+    return planted, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк ночного поиска аномалий BabyCareBot")
+    parser.add_argument('--families', type=int, default=10_000, help="Число семей")
+    parser.add_argument('--days', type=int, default=3, help="Сколько суток событий у каждой семьи")
+    parser.add_argument('--anomalous', type=float, default=0.05, help="Доля семей с заложенной аномалией")
+    parser.add_argument('--seed', type=int, default=42, help="Seed генератора случайных чисел")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='babybot-anomalies-') as workdir:
+        bot = import_bot(workdir)
+        fake = FakeClient()
+        bot.client = fake
+        bot.anomalies.SCAN_DAYS = args.days
+
+        planted, seeded = seed(bot, args.families, args.days, args.anomalous, np.random.default_rng(args.seed))
+        events = bot.storage.get_connection().execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        print(f"=== {args.families} семей, {events} событий за {args.days} сут. (база за {seeded:.1f} с)")
+
+        # Время чтения и расчёта пишет сам anomalies.scan
+        logging.getLogger('babybot.anomalies').setLevel(logging.INFO)
+        started = time.perf_counter()
+        asyncio.run(bot.send_anomaly_digests())
+        elapsed = time.perf_counter() - started
+
+        flags = bot.anomalies.scan(args.days)
+        found = {kind: 0 for kind in KINDS}
+        for family_id, kind in planted.items():
+            if kind in flags.get(family_id, {}):
+                found[kind] += 1
+        print(f"Задача: {elapsed:.2f} с, сводок отправлено: {fake.sent}, семей с флагами: {len(flags)}")
+        for kind in KINDS:
+            total = sum(1 for k in planted.values() if k == kind)
+            print(f"  {kind:<15} заложено {total:>6}, найдено {found[kind]:>6}")
+        false_positive = sum(1 for family_id in flags if family_id not in planted)
+        print(f"  без заложенной аномалии, но с флагом: {false_positive}")
+        bot.storage.close_connection()
+
+
+if __name__ == '__main__':
+    main()
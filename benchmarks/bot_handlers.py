@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Офлайн-бенчмарк обработчиков бота
+
+Импортирует main.py без подключения к Telegram (во временную базу и сессию),
+заменяет клиент на FakeClient и прогоняет через настоящие обработчики
+(start, feeding_menu, callback_handler, handle_text, history и др.) поток
+апдейтов, похожий на реальный: N семей × M участников, типичное число
+кормлений, смен подгузников и просмотров за сутки. Сеть не нужна, так что
+скрипт можно запускать в CI.
+
+    python benchmarks/bot_handlers.py --families 200 --members 2 --days 1 --history-days 30
+
+Выводит апдейты в секунду, p50/p90/p99 задержки по типам апдейтов и время,
+проведённое в функциях storage.py.
+"""
+
+import argparse
+import asyncio
+import collections
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Сколько раз за сутки один участник делает действие (примерно, для младенца)
+DAILY_ACTIONS = {
+    'feeding': 8.0,        # 🍽 Кормление → feed_now / feed_15 / feed_30
+    'diaper': 7.0,         # 🧷 Смена подгузника → diaper_now / ...
+    'sleep': 3.0,          # 😴 Уснул → 🌅 Проснулся
+    'last_feed': 4.0,      # ⏰ Когда ел?
+    'status': 2.0,         # 🍼 Статус кормления
+    'history': 1.5,        # 📜 История → hist_0..2
+    'manual_feed': 0.5,    # feed_manual → ввод времени ЧЧ:ММ
+    'tip': 0.5,            # 💡 Совет
+    'start': 0.2,          # /start
+    'settings': 0.2,       # ⚙ Настройки
+}
+
+
+def percentile(sorted_values, p):
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class FakeMessage:
+    def __init__(self, client, chat_id, text):
+        self.client = client
+        self.chat_id = chat_id
+        self.text = text
+
+
+class FakeClient:
+    """Вместо Telegram: запоминает число отправок и по желанию имитирует задержку сети"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = 0
+
+    async def _network(self):
+        self.sent += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send_message(self, entity, message='', **kwargs):
+        await self._network()
+        return FakeMessage(self, entity, message)
+
+    async def send_file(self, entity, file, caption='', **kwargs):
+        await self._network()
+        return FakeMessage(self, entity, caption)
+
+    def is_connected(self):
+        return True
+
+
+class FakeEvent:
+    """Минимальный NewMessage/CallbackQuery с теми атрибутами, что используют обработчики"""
+
+    def __init__(self, client, sender_id, text='', data=None):
+        self.client = client
+        self.sender_id = sender_id
+        self.chat_id = sender_id
+        self.raw_text = text
+        self.text = text
+        self.data = data
+        self.pattern_match = None
+
+    async def respond(self, message='', **kwargs):
+        return await self.client.send_message(self.sender_id, message, **kwargs)
+
+    async def reply(self, message='', **kwargs):
+        return await self.client.send_message(self.sender_id, message, **kwargs)
+
+    async def edit(self, message='', **kwargs):
+        await self.client._network()
+        return FakeMessage(self.client, self.sender_id, message)
+
+    async def answer(self, message=None, **kwargs):
+        await self.client._network()
+
+
+def import_bot(workdir):
+    """Импортировать main.py и собрать бота во временном окружении (без сети и без боевой базы)"""
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    sys.path.insert(0, ROOT)
+    # Советы читаются из data/advice.csv относительно текущей директории
+    os.chdir(ROOT)
+    import main
+    main.create_app(main.Config(1, 'benchmark', '0:benchmark', session=os.path.join(workdir, 'bench'),
+                                db_path=os.path.join(workdir, 'bench.db')))
+    return main
+
+
+class Dispatcher:
+    """Раздаёт апдейты зарегистрированным обработчикам так же, как Telethon"""
+
+    def __init__(self, bot):
+        from telethon import events
+        self.message_handlers = []
+        self.callback_handlers = []
+        for callback, builder in bot.client.list_event_handlers():
+            if isinstance(builder, events.CallbackQuery):
+                self.callback_handlers.append(callback)
+            elif isinstance(builder, events.NewMessage):
+                self.message_handlers.append((getattr(builder, 'pattern', None), callback))
+        self.stop_propagation = events.StopPropagation
+
+    async def dispatch(self, event):
+        if event.data is not None:
+            handlers = [(None, cb) for cb in self.callback_handlers]
+        else:
+            handlers = []
+            for pattern, cb in self.message_handlers:
+                match = pattern(event.raw_text) if pattern is not None else None
+                if pattern is None or match:
+                    handlers.append((match, cb))
+        for match, callback in handlers:
+            # Как Telethon: результат regex-шаблона доступен обработчику
+            event.pattern_match = match
+            try:
+                await callback(event)
+            except self.stop_propagation:
+                break
+
+
+def seed(bot, families, members, history_days, rng):
+    """Создать семьи, участников и историю событий за history_days дней"""
+    storage = bot.storage
+    conn = storage.get_connection()
+    now = bot.get_thai_time()
+    users = []
+    feedings, diapers = [], []
+    for f in range(families):
+        cur = conn.execute("INSERT INTO families (name) VALUES (?)", (f"Семья {f}",))
+        family_id = cur.lastrowid
+        conn.execute("INSERT INTO settings (family_id) VALUES (?)", (family_id,))
+        family_users = []
+        for m in range(members):
+            user_id = 10_000_000 + f * 100 + m
+            role = ('Мама', 'Папа', 'Бабушка', 'Дедушка')[m % 4]
+            conn.execute("INSERT INTO family_members (family_id, user_id, role, name) VALUES (?, ?, ?, ?)",
+                         (family_id, user_id, role, f"user{m}"))
+            family_users.append((user_id, role))
+        users.extend(u for u, _ in family_users)
+
+        for table, per_day, rows in (('feedings', DAILY_ACTIONS['feeding'], feedings),
+                                     ('diapers', DAILY_ACTIONS['diaper'], diapers)):
+            count = int(per_day * history_days)
+            for _ in range(count):
+                user_id, role = rng.choice(family_users)
+                ts = now - timedelta(minutes=rng.uniform(0, history_days * 24 * 60))
+                rows.append((family_id, storage.EVENT_TYPES[table], ts.timestamp(), user_id, role, f"user{user_id % 100}"))
+    conn.executemany("INSERT INTO events (family_id, type, ts, author_id, author_role, author_name) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", feedings + diapers)
+    conn.commit()
+    # Вставка в обход add_event не обновляет производные таблицы — пересчитываем их,
+    # чтобы история, статистика и адаптивный интервал работали на реальных данных
+    storage.backfill_daily_rollup()
+    storage.backfill_feeding_stats()
+    storage.invalidate_cache()
+    return users, len(feedings) + len(diapers)
+
+
+def build_updates(client, users, days, rng):
+    """Последовательность апдейтов за days суток: (тип, событие)"""
+    updates = []
+    for user_id in users:
+        for action, per_day in DAILY_ACTIONS.items():
+            count = int(per_day * days) + (1 if rng.random() < (per_day * days) % 1 else 0)
+            for _ in range(count):
+                updates.append((action, user_id))
+    rng.shuffle(updates)
+
+    events = []
+    for action, user_id in updates:
+        if action == 'feeding':
+            events.append(('message.feeding_menu', FakeEvent(client, user_id, '🍽 Кормление')))
+            events.append(('callback.feed', FakeEvent(client, user_id, data=rng.choice(
+                (b'feed_now', b'feed_15', b'feed_30')))))
+        elif action == 'diaper':
+            events.append(('message.diaper_menu', FakeEvent(client, user_id, '🧷 Смена подгузника')))
+            events.append(('callback.diaper', FakeEvent(client, user_id, data=rng.choice(
+                (b'diaper_now', b'diaper_15', b'diaper_30')))))
+        elif action == 'sleep':
+            events.append(('message.sleep_start', FakeEvent(client, user_id, '😴 Уснул')))
+            events.append(('message.sleep_stop', FakeEvent(client, user_id, '🌅 Проснулся')))
+        elif action == 'last_feed':
+            events.append(('message.last_feed', FakeEvent(client, user_id, '⏰ Когда ел?')))
+        elif action == 'status':
+            events.append(('message.feeding_status', FakeEvent(client, user_id, '🍼 Статус кормления')))
+        elif action == 'history':
+            events.append(('message.history_menu', FakeEvent(client, user_id, '📜 История')))
+            events.append(('callback.hist', FakeEvent(client, user_id, data=f"hist_{rng.randrange(3)}".encode())))
+        elif action == 'manual_feed':
+            events.append(('callback.feed_manual', FakeEvent(client, user_id, data=b'feed_manual')))
+            minutes_ago = rng.randrange(5, 120)
+            text = (datetime.now() - timedelta(minutes=minutes_ago)).strftime('%H:%M')
+            events.append(('message.handle_text', FakeEvent(client, user_id, text)))
+        elif action == 'tip':
+            events.append(('message.tip_command', FakeEvent(client, user_id, '💡 Совет')))
+        elif action == 'start':
+            events.append(('message.start', FakeEvent(client, user_id, '/start')))
+        elif action == 'settings':
+            events.append(('message.settings_menu', FakeEvent(client, user_id, '⚙ Настройки')))
+    return events
+
+
+async def run(dispatcher, events, concurrency):
+    """Прогнать апдейты; concurrency > 1 — как Telethon, несколько апдейтов одновременно"""
+    latencies = collections.defaultdict(list)
+    errors = collections.Counter()
+    queue = asyncio.Queue()
+    for item in events:
+        queue.put_nowait(item)
+
+    async def worker():
+        while True:
+            try:
+                kind, event = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                await dispatcher.dispatch(event)
+            except Exception as e:
+                errors[f"{kind}: {type(e).__name__}"] += 1
+            latencies[kind].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, errors
+
+
+def report(elapsed, latencies, errors, db_time, db_calls, sent):
+    total = sum(len(v) for v in latencies.values())
+    everything = sorted(x for v in latencies.values() for x in v)
+    print(f"\nАпдейтов: {total} за {elapsed:.2f} с → {total / elapsed:.0f} апдейтов/с")
+    print(f"Задержка, мс: p50 {percentile(everything, 50) * 1000:.2f} | "
+          f"p90 {percentile(everything, 90) * 1000:.2f} | p99 {percentile(everything, 99) * 1000:.2f}")
+    print(f"storage.py: {db_calls} вызовов, {db_time:.2f} с ({db_time / elapsed * 100:.0f}% времени), "
+          f"{db_time / max(total, 1) * 1000:.3f} мс на апдейт")
+    print(f"Отправок в Telegram (fake): {sent}")
+    print(f"\n{'Тип апдейта':<26}{'N':>7}{'p50 мс':>10}{'p99 мс':>10}{'max мс':>10}")
+    for kind in sorted(latencies, key=lambda k: -sum(latencies[k])):
+        values = sorted(latencies[kind])
+        print(f"{kind:<26}{len(values):>7}{percentile(values, 50) * 1000:>10.2f}"
+              f"{percentile(values, 99) * 1000:>10.2f}{values[-1] * 1000:>10.2f}")
+    if errors:
+        print("\nОшибки:")
+        for key, count in errors.most_common():
+            print(f"  {key}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк обработчиков BabyCareBot")
+    parser.add_argument('--families', type=int, default=100, help="Число семей")
+    parser.add_argument('--members', type=int, default=2, help="Участников в семье")
+    parser.add_argument('--days', type=float, default=1.0, help="Сколько суток активности прогнать")
+    parser.add_argument('--history-days', type=int, default=30, help="Дней истории в базе до начала прогона")
+    parser.add_argument('-c', '--concurrency', type=int, default=1, help="Одновременно обрабатываемых апдейтов")
+    parser.add_argument('--tg-latency-ms', type=float, default=0.0, help="Имитация задержки Telegram API")
+    parser.add_argument('--seed', type=int, default=42, help="Seed генератора случайных чисел")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix='babybot-bench-') as workdir:
+        bot = import_bot(workdir)
+        fake = FakeClient(args.tg_latency_ms / 1000.0)
+        dispatcher = Dispatcher(bot)
+        # Обработчики и задачи обращаются к глобальному client — подменяем его
+        bot.client = fake
+
+        started = time.perf_counter()
+        users, history_rows = seed(bot, args.families, args.members, args.history_days, rng)
+        print(f"База: {args.families} семей × {args.members} участников, "
+              f"{history_rows} событий за {args.history_days} дн. ({time.perf_counter() - started:.1f} с)")
+
+        events = build_updates(fake, users, args.days, rng)
+        calls_before, db_before = bot.metrics.DB_QUERY_LATENCY.totals()
+        elapsed, latencies, errors = asyncio.run(run(dispatcher, events, args.concurrency))
+        calls_after, db_after = bot.metrics.DB_QUERY_LATENCY.totals()
+
+        bot.storage.close_connection()
+        report(elapsed, latencies, errors, db_after - db_before, calls_after - calls_before, fake.sent)
+
+
+if __name__ == '__main__':
+    main()
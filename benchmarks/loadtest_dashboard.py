@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный тест веб-дашборда
+
+Несколько потоков в течение заданного времени запрашивают API дашборда
+и выводят запросы в секунду, перцентили задержки и число ошибок.
+
+    python benchmarks/loadtest_dashboard.py --url http://localhost:5000 --family 1 -c 16 -d 30
+"""
+
+import argparse
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_PATHS = (
+    '/api/baby/{family}',
+    '/api/stats/{family}',
+    '/api/stats/{family}?format=columnar&days=30',
+    '/api/activity/{family}',
+    '/api/activity/{family}?format=columnar&days=30&limit=0',
+    '/api/analytics/{family}/intervals',
+    '/api/analytics/{family}/heatmap',
+)
+
+
+def percentile(sorted_values, p):
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def worker(base_url, paths, deadline, latencies, errors, lock, accept_encoding):
+    """Крутить запросы по кругу до истечения времени"""
+    local_latencies = []
+    local_errors = 0
+    i = 0
+    while time.perf_counter() < deadline:
+        url = base_url + paths[i % len(paths)]
+        i += 1
+        request = urllib.request.Request(url, headers={'Accept-Encoding': accept_encoding})
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+            local_latencies.append(time.perf_counter() - started)
+        except (urllib.error.URLError, OSError):
+            local_errors += 1
+    with lock:
+        latencies.extend(local_latencies)
+        errors[0] += local_errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест веб-дашборда BabyCareBot")
+    parser.add_argument('--url', default='http://localhost:5000', help="адрес дашборда")
+    parser.add_argument('--family', type=int, default=1, help="ID семьи в запросах")
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help="число параллельных клиентов")
+    parser.add_argument('-d', '--duration', type=float, default=10.0, help="длительность теста, с")
+    parser.add_argument('--path', action='append', help="путь для запросов (можно несколько, {family} подставляется)")
+    parser.add_argument('--accept-encoding', default='gzip', help="значение заголовка Accept-Encoding")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    paths = [p.format(family=args.family) for p in (args.path or DEFAULT_PATHS)]
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(base_url, paths, deadline, latencies, errors, lock, args.accept_encoding))
+        for _ in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"📊 {base_url}: {args.concurrency} клиентов, {elapsed:.1f} с")
+    print(f"   Запросов: {total}, ошибок: {errors[0]}")
+    print(f"   Запросов/с: {total / elapsed:.1f}")
+    if total:
+        print(f"   Задержка, мс: среднее {statistics.mean(latencies) * 1000:.1f}, "
+              f"p50 {percentile(latencies, 50) * 1000:.1f}, "
+              f"p90 {percentile(latencies, 90) * 1000:.1f}, "
+              f"p99 {percentile(latencies, 99) * 1000:.1f}, "
+              f"max {latencies[-1] * 1000:.1f}")
+
+
+if __name__ == '__main__':
+    main()
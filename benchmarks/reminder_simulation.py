@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Симуляция напоминаний на виртуальных часах
+
+Подменяет часы бота на clock.VirtualClock и прокручивает N суток: задачи
+планировщика запускаются с теми же интервалами, что в APScheduler, а
+«родители» кормят и меняют подгузники сами по своему ритму и в ответ на
+напоминания. Реального ожидания нет — время двигается от события к событию.
+
+Проверяет поведение напоминаний и заодно меряет пропускную способность:
+    - задачи не пишут ошибок в лог;
+    - после записи кормления напоминания о кормлении не приходят раньше,
+      чем за 15 минут до интервала (то же для подгузников);
+    - напоминание о купании приходит, только если с последнего купания
+      прошло bath_interval дней;
+    - сколько напоминаний каждого вида получает семья в сутки.
+
+    python benchmarks/reminder_simulation.py --families 200 --days 30
+    python benchmarks/reminder_simulation.py --adaptive   # интервал кормления по статистике семьи
+
+Задачи опрашивают все семьи на каждом тике (советы — раз в минуту), поэтому
+время симуляции растёт как семьи × тики: мкс/семья в отчёте показывает,
+во что обходится один тик на каждую семью.
+"""
+
+import argparse
+import asyncio
+import collections
+import heapq
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bot_handlers import FakeClient, import_bot
+from scheduler_sweep import JOBS
+
+START = datetime(2025, 1, 6)
+
+# Заголовок сообщения → вид напоминания (всё остальное от задач — советы)
+KINDS = {
+    '🍼 **Время кормления!**': 'feed_due',
+    '🚨 **СРОЧНО! Долго не кормили!**': 'feed_urgent',
+    '⏰ **Скоро время кормления**': 'feed_soon',
+    '🍼 **Напоминание о кормлении!**': 'feed_check',
+    '🍼 **Первое кормление!**': 'feed_first',
+    '🧷 **Время сменить подгузник!**': 'diaper_due',
+    '🚨 **СРОЧНО! Долго не меняли подгузник!**': 'diaper_urgent',
+    '⏰ **Скоро время сменить подгузник**': 'diaper_soon',
+    '🛁 **Время купания!**': 'bath',
+    '⏰ **Напоминание о купании**': 'bath_soon',
+}
+
+# На эти напоминания родители реагируют записью события
+RESPONDS_TO = {
+    'feed_due': 'feedings', 'feed_urgent': 'feedings', 'feed_check': 'feedings',
+    'diaper_due': 'diapers', 'diaper_urgent': 'diapers', 'bath': 'baths',
+}
+
+
+class SimClient(FakeClient):
+    """FakeClient, который запоминает адресатов и тексты отправленных сообщений"""
+
+    def __init__(self):
+        super().__init__()
+        self.outbox = []
+
+    async def send_message(self, entity, message='', **kwargs):
+        self.outbox.append((entity, message))
+        return await super().send_message(entity, message, **kwargs)
+
+
+class ErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = collections.Counter()
+
+    def emit(self, record):
+        self.messages[record.getMessage()[:120]] += 1
+
+
+class Family:
+    def __init__(self, family_id, members, feed_interval, diaper_interval, bath_interval):
+        self.id = family_id
+        self.members = members
+        # Кормления и подгузники — в часах, купание — в днях
+        self.intervals = {'feedings': feed_interval, 'diapers': diaper_interval, 'baths': bath_interval}
+        self.last = {}
+        # Номер «поколения» события: устаревшие запланированные действия пропускаются
+        self.generation = {'feedings': 0, 'diapers': 0, 'baths': 0}
+        self.pending = {'feedings': None, 'diapers': None, 'baths': None}
+
+
+class Simulation:
+    def __init__(self, bot, virtual_clock, args):
+        self.bot = bot
+        self.clock = virtual_clock
+        self.rng = random.Random(args.seed)
+        self.respond = args.respond
+        self.adaptive = args.adaptive
+        self.client = SimClient()
+        bot.client = self.client
+        self.families = {}
+        self.owner = {}
+        self.actions = []
+        self.seq = 0
+        self.reminders = collections.Counter()
+        self.violations = collections.Counter()
+        self.events_logged = 0
+        self.job_time = collections.Counter()
+        self.job_runs = collections.Counter()
+
+    def seed(self, families, members):
+        """Семьи с разными интервалами и временем советов/купания; первое событие — в момент старта"""
+        conn = self.bot.storage.get_connection()
+        for family_id in range(1, families + 1):
+            feed, diaper, bath = self.rng.choice((2, 3, 4)), self.rng.choice((2, 3)), self.rng.choice((1, 2, 3))
+            users = [family_id * 10 + m for m in range(members)]
+            conn.execute("INSERT INTO families (id, name) VALUES (?, ?)", (family_id, f"Семья {family_id}"))
+            conn.executemany("INSERT INTO family_members (family_id, user_id, role, name) VALUES (?, ?, ?, ?)",
+                             [(family_id, u, ('Мама', 'Папа')[i % 2], f"user{i}") for i, u in enumerate(users)])
+            conn.execute("INSERT INTO settings (family_id, feed_interval, diaper_interval, tips_time_hour, "
+                         "tips_time_minute, bath_interval, bath_time_hour, bath_time_minute, adaptive_feeding) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (family_id, feed, diaper, self.rng.randrange(7, 22), self.rng.randrange(60),
+                          bath, self.rng.randrange(17, 22), self.rng.randrange(60), int(self.adaptive)))
+            family = Family(family_id, users, feed, diaper, bath)
+            self.families[family_id] = family
+            for user_id in users:
+                self.owner[user_id] = family
+        conn.commit()
+        self.bot.storage.invalidate_cache()
+        for family in self.families.values():
+            for table in ('feedings', 'diapers'):
+                self.log_event(family, table)
+
+    def schedule(self, when, family, table):
+        self.seq += 1
+        heapq.heappush(self.actions, (when, self.seq, family.id, table, family.generation[table]))
+
+    def log_event(self, family, table):
+        """Родитель записывает событие «сейчас» и сам планирует следующее по своему ритму"""
+        author = self.rng.choice(family.members)
+        if table == 'feedings':
+            self.bot.add_feeding(author)
+        elif table == 'diapers':
+            self.bot.add_diaper_change(author)
+        else:
+            self.bot.add_bath(author)
+        now = self.clock.now()
+        family.last[table] = now
+        family.generation[table] += 1
+        family.pending[table] = None
+        self.events_logged += 1
+        if table == 'baths':
+            # Купают только по напоминанию
+            return
+        gap = family.intervals[table] * self.rng.uniform(0.7, 1.5)
+        self.schedule(now + timedelta(hours=gap), family, table)
+
+    def on_message(self, family, kind):
+        table = 'feedings' if kind.startswith('feed') else 'diapers' if kind.startswith('diaper') else None
+        if table and kind != 'feed_first':
+            # Раньше чем за 15 минут до интервала напоминать нельзя
+            hours = (self.clock.now() - family.last[table]).total_seconds() / 3600
+            interval = family.intervals[table]
+            if table == 'feedings' and self.adaptive:
+                interval = self.bot.get_feed_interval(family.id, self.bot.get_settings(family.id))
+            if hours < interval - 0.25 - 1e-9:
+                self.violations[kind] += 1
+        if kind in ('bath', 'bath_soon') and 'baths' in family.last:
+            # Купание не чаще, чем раз в bath_interval календарных дней
+            bath_day = (self.clock.now() + timedelta(hours=1 if kind == 'bath_soon' else 0)).date()
+            if (bath_day - family.last['baths'].date()).days < family.intervals['baths']:
+                self.violations[kind] += 1
+        table = RESPONDS_TO.get(kind)
+        if table and family.pending[table] is None and self.rng.random() < self.respond:
+            family.pending[table] = True
+            self.schedule(self.clock.now() + timedelta(minutes=self.rng.uniform(1, 20)), family, table)
+
+    def drain_outbox(self):
+        """Разобрать сообщения тика; напоминание всем участникам семьи считается одним"""
+        seen = set()
+        for user_id, text in self.client.outbox:
+            family = self.owner[user_id]
+            kind = KINDS.get(text.split('\n', 1)[0], 'tip')
+            if (family.id, kind) not in seen:
+                seen.add((family.id, kind))
+                self.reminders[kind] += 1
+                self.on_message(family, kind)
+        self.client.outbox.clear()
+
+    async def run(self, days, job_names):
+        end = self.clock.now() + timedelta(days=days)
+        jobs = [(self.clock.now() + timedelta(seconds=interval), i, name, interval)
+                for i, (name, interval) in enumerate(JOBS) if name in job_names]
+        heapq.heapify(jobs)
+        ticks = 0
+        while True:
+            next_job = jobs[0][0] if jobs else end
+            if self.actions and self.actions[0][0] <= next_job:
+                when, _, family_id, table, generation = heapq.heappop(self.actions)
+                if when > end:
+                    break
+                family = self.families[family_id]
+                if generation == family.generation[table]:
+                    self.clock.set(when)
+                    self.log_event(family, table)
+                continue
+            if next_job > end:
+                break
+            due, order, name, interval = heapq.heappop(jobs)
+            self.clock.set(due)
+            started = time.perf_counter()
+            await getattr(self.bot, name)()
+            self.job_time[name] += time.perf_counter() - started
+            self.job_runs[name] += 1
+            ticks += 1
+            heapq.heappush(jobs, (due + timedelta(seconds=interval), order, name, interval))
+            self.drain_outbox()
+        return ticks
+
+
+def report(sim, days, elapsed, ticks, errors):
+    families = len(sim.families)
+    print(f"\nСимулировано {days} сут. для {families} семей за {elapsed:.2f} с "
+          f"({days * 86400 / elapsed:,.0f}× быстрее реального времени)")
+    print(f"Тиков задач: {ticks}, событий записано: {sim.events_logged}, сообщений: {sim.client.sent}")
+
+    print(f"\n{'Задача':<36}{'тиков':>8}{'всего, с':>10}{'мс/тик':>10}{'мкс/семья':>12}")
+    for name, runs in sim.job_runs.items():
+        per_tick = sim.job_time[name] / runs
+        print(f"{name:<36}{runs:>8}{sim.job_time[name]:>10.2f}{per_tick * 1000:>10.2f}"
+              f"{per_tick / families * 1e6:>12.1f}")
+
+    print(f"\n{'Напоминание':<16}{'всего':>10}{'на семью в сутки':>20}")
+    for kind, count in sorted(sim.reminders.items(), key=lambda item: -item[1]):
+        print(f"{kind:<16}{count:>10}{count / families / days:>20.2f}")
+
+    print("\nПроверки:")
+    print(f"  ошибок в логе задач: {sum(errors.values())}")
+    for message, count in errors.most_common(5):
+        print(f"    {count}× {message}")
+    print(f"  напоминаний раньше срока: {sum(sim.violations.values())} {dict(sim.violations) or ''}")
+    return not errors and not sim.violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Симуляция напоминаний BabyCareBot на виртуальных часах")
+    parser.add_argument('--families', type=int, default=200, help="Число семей")
+    parser.add_argument('--members', type=int, default=2, help="Участников в семье")
+    parser.add_argument('--days', type=float, default=30, help="Сколько суток симулировать")
+    parser.add_argument('--respond', type=float, default=0.8, help="Вероятность, что родители откликнутся на напоминание")
+    parser.add_argument('--jobs', default=','.join(name for name, _ in JOBS), help="Какие задачи запускать (через запятую)")
+    parser.add_argument('--adaptive', action='store_true', help="Адаптивный интервал кормления у всех семей")
+    parser.add_argument('--seed', type=int, default=42, help="Seed генератора случайных чисел")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='babybot-sim-') as workdir:
+        bot = import_bot(workdir)
+        bot.random.seed(args.seed)
+        virtual_clock = bot.clock.VirtualClock(START)
+        previous = bot.clock.set_clock(virtual_clock)
+        errors = ErrorCounter()
+        logging.getLogger('babybot').addHandler(errors)
+        try:
+            bot.storage.configure(os.path.join(workdir, 'simulation.db'))
+            bot.storage.init_db()
+            sim = Simulation(bot, virtual_clock, args)
+            sim.seed(args.families, args.members)
+            started = time.perf_counter()
+            ticks = asyncio.run(sim.run(args.days, set(args.jobs.split(','))))
+            ok = report(sim, args.days, time.perf_counter() - started, ticks, errors.messages)
+        finally:
+            logging.getLogger('babybot').removeHandler(errors)
+            bot.clock.set_clock(previous)
+            bot.storage.close_connection()
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк задач планировщика на больших базах
+
+Для каждого размера из --families создаёт синтетическую базу (семьи,
+участники, настройки, последние события) и несколько раз подряд запускает
+каждую задачу планировщика, как это сделал бы один тик APScheduler.
+Часы бота заменены на clock.VirtualClock: тики идут с TICK_START_HOUR часов и
+сдвигаются на интервал задачи, а время купания, советов и сводки у семей
+разбросано по дню, поэтому часть семей попадает в окна тиков и задачи
+действительно отправляют сообщения. Показывает время тика, время на семью
+и число отправленных сообщений по каждой задаче — видно, на каком размере
+текущая схема «обойти все семьи» перестаёт укладываться в интервал задачи.
+
+    python benchmarks/scheduler_sweep.py --families 1000,10000,100000 --members 2 --events 10
+
+Для миллиона семей уменьшайте --events: база получается в десятки миллионов строк.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+from bot_handlers import FakeClient, import_bot
+
+# Первый тик — в 18:00 по тайскому времени: окна купания (17:00–21:59) и
+# напоминания за час до него попадают в первые тики
+TICK_START_HOUR = 18
+
+# Задачи и их интервал в APScheduler (секунды) — тик должен успевать за интервал
+JOBS = (
+    ('send_scheduled_tips', 60),
+    ('send_scheduled_digests', 60),
+    ('send_scheduled_feeding_reminders', 15 * 60),
+    ('send_scheduled_diaper_reminders', 15 * 60),
+    ('send_scheduled_bath_reminders', 15 * 60),
+    ('send_bath_reminder_1hour_before', 15 * 60),
+    ('check_feeding_reminders', 30 * 60),
+)
+
+BATCH = 50_000
+
+
+def _batched(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(bot, families, members, events, rng):
+    """Заполнить пустую базу: семьи, участники, настройки и события за последние сутки"""
+    conn = bot.storage.get_connection()
+    now = bot.get_thai_time()
+
+    def family_rows():
+        for family_id in range(1, families + 1):
+            yield (family_id, f"Семья {family_id}")
+
+    def member_rows():
+        for family_id in range(1, families + 1):
+            for m in range(members):
+                yield (family_id, family_id * 10 + m, ('Мама', 'Папа', 'Бабушка', 'Дедушка')[m % 4], f"user{m}")
+
+    def settings_rows():
+        for family_id in range(1, families + 1):
+            # Время купания — любая минута с 17:00 до 21:59, сводки — любая минута суток
+            yield (family_id, rng.choice((2, 3, 4)), rng.choice((2, 3)), rng.randrange(24), rng.randrange(60),
+                   rng.choice((1, 2, 3)), rng.randrange(17, 22), rng.randrange(60),
+                   1, rng.randrange(24), rng.randrange(60))
+
+    def event_rows(table):
+        event_type = bot.storage.EVENT_TYPES[table]
+        for family_id in range(1, families + 1):
+            for _ in range(events):
+                author = family_id * 10 + rng.randrange(members)
+                ts = now - timedelta(minutes=rng.uniform(0, 24 * 60))
+                yield (family_id, event_type, ts.timestamp(), author, 'Мама', 'user0')
+
+    started = time.perf_counter()
+    for sql, rows in (
+        ("INSERT INTO families (id, name) VALUES (?, ?)", family_rows()),
+        ("INSERT INTO family_members (family_id, user_id, role, name) VALUES (?, ?, ?, ?)", member_rows()),
+        ("INSERT INTO settings (family_id, feed_interval, diaper_interval, tips_time_hour, tips_time_minute, "
+         "bath_interval, bath_time_hour, bath_time_minute, digest_enabled, digest_time_hour, digest_time_minute) "
+         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", settings_rows()),
+        ("INSERT INTO events (family_id, type, ts, author_id, author_role, author_name) "
+         "VALUES (?, ?, ?, ?, ?, ?)", event_rows('feedings')),
+        ("INSERT INTO events (family_id, type, ts, author_id, author_role, author_name) "
+         "VALUES (?, ?, ?, ?, ?, ?)", event_rows('diapers')),
+    ):
+        for batch in _batched(rows):
+            conn.executemany(sql, batch)
+        conn.commit()
+    # Сводка читает итоги по суткам, а вставка в обход add_event их не обновляет
+    bot.storage.backfill_daily_rollup()
+    bot.storage.invalidate_cache()
+    return time.perf_counter() - started
+
+
+async def sweep(bot, fake, virtual_clock, start, ticks):
+    """Запустить каждую задачу ticks раз подряд с start, сдвигая часы на её интервал.
+
+    Возвращает [(задача, интервал, среднее время тика, сообщений всего)].
+    """
+    results = []
+    for name, interval in JOBS:
+        job = getattr(bot, name)
+        virtual_clock.set(start)
+        durations = []
+        sent_before = fake.sent
+        for _ in range(ticks):
+            started = time.perf_counter()
+            await job()
+            durations.append(time.perf_counter() - started)
+            virtual_clock.advance(seconds=interval)
+        results.append((name, interval, sum(durations) / ticks, fake.sent - sent_before))
+    return results
+
+
+def report(families, ticks, results):
+    print(f"\n{'Задача':<36}{'тик, с':>10}{'мкс/семья':>12}{'сообщ.':>10}{'сообщ./тик':>12}{'загрузка':>10}")
+    for name, interval, duration, sent in results:
+        # Доля интервала, которую занимает тик: 100% — задача перестаёт успевать
+        load = duration / interval * 100
+        print(f"{name:<36}{duration:>10.3f}{duration / families * 1e6:>12.1f}{sent:>10}{sent / ticks:>12.1f}"
+              f"{load:>9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк задач планировщика BabyCareBot")
+    parser.add_argument('--families', default='1000,10000', help="Размеры через запятую (например 1000,10000,100000)")
+    parser.add_argument('--members', type=int, default=2, help="Участников в семье")
+    parser.add_argument('--events', type=int, default=10, help="Кормлений и смен подгузников на семью")
+    parser.add_argument('--ticks', type=int, default=3, help="Сколько раз запускать каждую задачу")
+    parser.add_argument('--tg-latency-ms', type=float, default=0.0, help="Имитация задержки Telegram API")
+    parser.add_argument('--seed', type=int, default=42, help="Seed генератора случайных чисел")
+    args = parser.parse_args()
+
+    sizes = [int(x) for x in args.families.split(',') if x.strip()]
+    with tempfile.TemporaryDirectory(prefix='babybot-sweep-') as workdir:
+        bot = import_bot(workdir)
+        fake = FakeClient(args.tg_latency_ms / 1000.0)
+        bot.client = fake
+        start = bot.clock.now().replace(hour=TICK_START_HOUR, minute=0, second=0, microsecond=0)
+        virtual_clock = bot.clock.VirtualClock(start)
+        previous = bot.clock.set_clock(virtual_clock)
+
+        try:
+            for families in sizes:
+                rng = random.Random(args.seed)
+                virtual_clock.set(start)
+                bot.storage.configure(os.path.join(workdir, f"sweep_{families}.db"))
+                bot.storage.init_db()
+                seeded = seed(bot, families, args.members, args.events, rng)
+                print(f"\n=== {families} семей × {args.members} участников, "
+                      f"{families * args.events * 2} событий (база за {seeded:.1f} с), "
+                      f"тики с {start:%H:%M}")
+                report(families, args.ticks, asyncio.run(sweep(bot, fake, virtual_clock, start, args.ticks)))
+                bot.storage.close_connection()
+        finally:
+            bot.clock.set_clock(previous)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Часы BabyCareBot
+
+Весь код, которому нужно текущее время, берёт его отсюда: now() всегда
+возвращает aware-время в тайском часовом поясе. По умолчанию это системные
+часы; в симуляциях и бенчмарках их заменяют VirtualClock, который стоит на
+месте, пока его явно не сдвинут, — так месяц напоминаний прогоняется за
+секунды.
+
+Старые записи в базе хранят наивное тайское время, новые — с +07:00;
+to_thai() и parse() приводят и те и другие к одному виду.
+"""
+
+import time as _time
+from datetime import datetime, timedelta
+
+import pytz
+
+THAI_TZ = pytz.timezone('Asia/Bangkok')
+
+
+def to_thai(dt):
+    """Привести datetime к aware тайскому времени (наивное считается тайским)"""
+    if dt.tzinfo is None:
+        return THAI_TZ.localize(dt)
+    return dt.astimezone(THAI_TZ)
+
+
+def parse(value):
+    """Разобрать ISO-строку из базы в aware тайское время"""
+    return to_thai(datetime.fromisoformat(value))
+
+
+def from_timestamp(ts):
+    """epoch-секунды → aware тайское время"""
+    return datetime.fromtimestamp(ts, THAI_TZ)
+
+
+class SystemClock:
+    """Настоящее время"""
+
+    def now(self):
+        return datetime.now(pytz.UTC).astimezone(THAI_TZ)
+
+    def time(self):
+        return _time.time()
+
+
+class VirtualClock:
+    """Управляемое время для симуляций: меняется только через set() и advance()"""
+
+    def __init__(self, start=None):
+        self._now = to_thai(start) if start is not None else SystemClock().now()
+
+    def now(self):
+        return self._now
+
+    def time(self):
+        return self._now.timestamp()
+
+    def set(self, dt):
+        self._now = to_thai(dt)
+
+    def advance(self, delta=None, **kwargs):
+        """Сдвинуть часы вперёд: advance(timedelta(...)) или advance(minutes=15)"""
+        self._now = (self._now + (delta or timedelta(**kwargs))).astimezone(THAI_TZ)
+        return self._now
+
+
+_clock = SystemClock()
+
+
+def set_clock(clock):
+    """Подменить часы (None — вернуть системные); возвращает прежние"""
+    global _clock
+    previous = _clock
+    _clock = clock if clock is not None else SystemClock()
+    return previous
+
+
+def get_clock():
+    return _clock
+
+
+def now():
+    """Текущее тайское время (aware)"""
+    return _clock.now()
+
+
+def today():
+    """Текущая дата по тайскому времени"""
+    return _clock.now().date()
+
+
+def time():
+    """Текущее время в epoch-секундах"""
+    return _clock.time()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Выгрузка истории семьи в CSV или JSON Lines
+
+Общая для бота (/export — файл-документ) и дашборда (/api/export/<id>).
+Записи идут потоком: настройки, участники, затем все события по времени
+из генератора storage.iter_family_events. Текст отдаётся кусками по
+CHUNK_RECORDS записей, а write_export() дописывает их в файл на диске —
+ни ответ, ни файл целиком в памяти не собираются.
+
+Каждая строка — одна запись с полем record:
+    setting — key, value
+    member  — user_id, role, name
+    event   — id, type, time, end_time, author_id, author_role, author_name
+"""
+
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import clock
+import storage
+
+FORMATS = ('csv', 'jsonl')
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+CSV_FIELDS = ('record', 'id', 'type', 'time', 'end_time', 'author_id', 'author_role', 'author_name',
+              'user_id', 'role', 'name', 'key', 'value')
+# Сколько записей собирается в один кусок ответа или файла
+CHUNK_RECORDS = 500
+
+
+# У Бангкока нет перехода на летнее время: постоянное смещение вместо pytz вдвое быстрее на каждой строке
+_THAI_OFFSET = timezone(timedelta(seconds=storage.THAI_UTC_OFFSET))
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, _THAI_OFFSET).isoformat() if ts is not None else None
+
+
+def iter_records(family_id):
+    """Записи выгрузки по одной (словари)"""
+    settings = storage.get_settings(family_id) or {}
+    for key in storage.SETTINGS_COLUMNS:
+        if key in settings:
+            yield {'record': 'setting', 'key': key, 'value': settings[key]}
+    for user_id, role, name in storage.get_family_members_with_roles(family_id):
+        yield {'record': 'member', 'user_id': user_id, 'role': role, 'name': name}
+    for entry_id, table, ts, end_ts, author_id, role, name in storage.iter_family_events(family_id):
+        yield {'record': 'event', 'id': entry_id, 'type': table, 'time': _iso(ts), 'end_time': _iso(end_ts),
+               'author_id': author_id, 'author_role': role, 'author_name': name}
+
+
+def iter_csv(family_id):
+    """CSV кусками строк (первый кусок начинается с заголовка)"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    for i, record in enumerate(iter_records(family_id), 1):
+        writer.writerow(record)
+        if i % CHUNK_RECORDS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_jsonl(family_id):
+    """JSON Lines кусками строк"""
+    lines = []
+    for record in iter_records(family_id):
+        lines.append(json.dumps({k: v for k, v in record.items() if v is not None}, ensure_ascii=False))
+        if len(lines) >= CHUNK_RECORDS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def iter_export(family_id, fmt):
+    """Выгрузка в формате fmt ('csv' или 'jsonl') кусками строк"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+    return iter_csv(family_id) if fmt == 'csv' else iter_jsonl(family_id)
+
+
+def filename(family_id, fmt):
+    """Имя файла выгрузки: babycare_<семья>_<дата>.<формат>"""
+    return f"babycare_{family_id}_{clock.today().strftime('%Y%m%d')}.{fmt}"
+
+
+def write_export(family_id, fmt, path):
+    """Записать выгрузку в файл path по кускам; вернуть размер в байтах"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for chunk in iter_export(family_id, fmt):
+            f.write(chunk)
+    return os.path.getsize(path)
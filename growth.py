@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Перцентили веса и роста по стандартам ВОЗ
+
+Параметры LMS (data/who_growth_lms.csv, 0–12 месяцев) читаются один раз в
+массивы NumPy. Перцентиль измерения считается векторно для всего ряда
+сразу: L, M и S интерполируются по возрасту, z-оценка получается по
+формуле LMS, а z → перцентиль берётся из заранее посчитанной таблицы
+нормального распределения. Вне диапазона таблицы перцентиль — NaN.
+"""
+
+import csv
+import functools
+import math
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from clock import THAI_TZ
+
+LMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "who_growth_lms.csv")
+
+INDICATORS = ('weight', 'height')
+# Средняя длина месяца в днях, как в таблицах ВОЗ
+DAYS_PER_MONTH = 30.4375
+# Линии на графике роста
+REFERENCE_PERCENTILES = (3, 15, 50, 85, 97)
+
+# Функция нормального распределения на сетке z: перцентиль — интерполяция по ней
+_Z_GRID = np.linspace(-5.0, 5.0, 2001)
+_P_GRID = np.array([50.0 * (1.0 + math.erf(z / math.sqrt(2.0))) for z in _Z_GRID])
+
+_tables = None
+_tables_lock = threading.Lock()
+
+
+def _load(path):
+    """Прочитать CSV в {(показатель, пол): (месяцы, L, M, S)}"""
+    rows = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            key = (row['indicator'], row['sex'])
+            rows.setdefault(key, []).append((float(row['month']), float(row['L']), float(row['M']), float(row['S'])))
+    tables = {}
+    for key, values in rows.items():
+        values.sort()
+        tables[key] = tuple(np.array(column) for column in zip(*values))
+    return tables
+
+
+def get_tables():
+    """Таблицы LMS (загружаются при первом обращении)"""
+    global _tables
+    if _tables is None:
+        with _tables_lock:
+            if _tables is None:
+                _tables = _load(LMS_PATH)
+    return _tables
+
+
+def sex_code(gender):
+    """'Мальчик' → 'm', 'Девочка' → 'f', иначе None"""
+    value = (gender or '').strip().lower()
+    if value.startswith(('м', 'm', 'boy')):
+        return 'm'
+    if value.startswith(('д', 'ж', 'f', 'g')):
+        return 'f'
+    return None
+
+
+def parse_birth_date(birth_date):
+    """Дата рождения из baby_info (ДД.ММ.ГГГГ) → epoch полуночи по тайскому времени или None"""
+    try:
+        birth = datetime.strptime(birth_date, "%d.%m.%Y")
+    except (TypeError, ValueError):
+        return None
+    return THAI_TZ.localize(birth).timestamp()
+
+
+def age_in_months(birth_ts, ts):
+    """Возраст в месяцах для массива epoch-времени"""
+    return (np.asarray(ts, dtype=np.float64) - birth_ts) / 86400.0 / DAYS_PER_MONTH
+
+
+def _lms(indicator, sex, age_months):
+    months, L, M, S = get_tables()[(indicator, sex)]
+    age = np.asarray(age_months, dtype=np.float64)
+    inside = (age >= months[0]) & (age <= months[-1])
+    return np.interp(age, months, L), np.interp(age, months, M), np.interp(age, months, S), inside
+
+
+def percentiles(indicator, sex, age_months, values):
+    """Перцентили измерений (массивы возраста и значений одной длины); NaN — нет данных"""
+    values = np.asarray(values, dtype=np.float64)
+    if sex is None:
+        return np.full(values.shape, np.nan)
+    L, M, S, inside = _lms(indicator, sex, age_months)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # При L = 0 формула LMS переходит в логарифмическую
+        small = np.abs(L) < 1e-6
+        z = np.where(small, np.log(values / M) / S, ((values / M) ** L - 1.0) / (L * S))
+    result = np.interp(z, _Z_GRID, _P_GRID)
+    return np.where(inside & (values > 0), result, np.nan)
+
+
+@functools.lru_cache(maxsize=None)
+def reference_curves(indicator, sex, step=0.5):
+    """Линии REFERENCE_PERCENTILES по возрасту: {'months': [...], 'p3': [...], ...} (не изменять)"""
+    months_table = get_tables()[(indicator, sex)][0]
+    months = np.arange(months_table[0], months_table[-1] + step / 2, step)
+    L, M, S, _ = _lms(indicator, sex, months)
+    curves = {'months': months.tolist()}
+    for p in REFERENCE_PERCENTILES:
+        z = float(np.interp(p, _P_GRID, _Z_GRID))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            small = np.abs(L) < 1e-6
+            values = np.where(small, M * np.exp(S * z), M * (1.0 + L * S * z) ** (1.0 / L))
+        curves[f"p{p}"] = np.round(values, 2).tolist()
+    return curves
@@ -5,86 +5,20 @@
 Создает базу данных с тестовыми данными
 """
 
-import sqlite3
 import os
 from datetime import datetime, timedelta
 
+import storage
+
 def init_database():
     """Инициализация базы данных"""
     print("🗄️ Инициализация базы данных...")
     
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    
-    # Создание таблиц
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS families (
-            id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS family_members (
-            family_id INTEGER,
-            user_id INTEGER,
-            role TEXT DEFAULT 'Родитель',
-            name TEXT DEFAULT 'Неизвестно',
-            FOREIGN KEY (family_id) REFERENCES families (id)
-        )
-    """)
+    # Схема и индексы общие с ботом и дашбордом
+    storage.init_db()
     
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS feedings (
-            id INTEGER PRIMARY KEY,
-            family_id INTEGER,
-            author_id INTEGER,
-            timestamp TEXT NOT NULL,
-            author_role TEXT DEFAULT 'Родитель',
-            author_name TEXT DEFAULT 'Неизвестно',
-            FOREIGN KEY (family_id) REFERENCES families (id)
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS diapers (
-            id INTEGER PRIMARY KEY,
-            family_id INTEGER,
-            author_id INTEGER,
-            timestamp TEXT NOT NULL,
-            author_role TEXT DEFAULT 'Родитель',
-            author_name TEXT DEFAULT 'Неизвестно',
-            FOREIGN KEY (family_id) REFERENCES families (id)
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS settings (
-            family_id INTEGER,
-            feed_interval INTEGER DEFAULT 3,
-            diaper_interval INTEGER DEFAULT 2,
-            tips_enabled INTEGER DEFAULT 1,
-            tips_time_hour INTEGER DEFAULT 9,
-            tips_time_minute INTEGER DEFAULT 0,
-            bath_interval INTEGER DEFAULT 1,
-            bath_time_hour INTEGER DEFAULT 19,
-            bath_time_minute INTEGER DEFAULT 0,
-            bath_enabled INTEGER DEFAULT 1,
-            FOREIGN KEY (family_id) REFERENCES families (id)
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS baby_info (
-            family_id INTEGER PRIMARY KEY,
-            name TEXT DEFAULT 'Малыш',
-            birth_date TEXT,
-            gender TEXT DEFAULT 'Не указан',
-            weight REAL DEFAULT 0.0,
-            height REAL DEFAULT 0.0,
-            FOREIGN KEY (family_id) REFERENCES families (id)
-        )
-    """)
+    conn = storage.get_connection()
+    cur = conn.cursor()
     
     # Создаем тестовую семью
     cur.execute("INSERT OR IGNORE INTO families (id, name) VALUES (1, 'Тестовая семья')")
@@ -112,7 +46,7 @@ def init_database():
                    (1, 123456789, time.isoformat(), 'Родитель', 'Тест'))
     
     conn.commit()
-    conn.close()
+    storage.invalidate_cache()
     
     print("✅ База данных инициализирована с тестовыми данными")
     print("📊 Создано:")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Настройка логирования BabyCareBot
+
+Записи складываются в очередь (QueueHandler), а в stdout их выводит
+отдельный поток (QueueListener), так что event loop бота и потоки дашборда
+не ждут вывода. Уровень задаётся LOG_LEVEL (по умолчанию INFO): отладочные
+сообщения в продакшене отбрасываются ещё до форматирования.
+
+Переменные окружения:
+    LOG_LEVEL   DEBUG / INFO / WARNING / ERROR (по умолчанию INFO)
+    LOG_FORMAT  text или json (по умолчанию text)
+
+Для горячих путей есть выборка: logger.warning(..., extra=sample(20))
+пропускает только каждое двадцатое сообщение с тем же шаблоном.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+
+TEXT_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def sample(every):
+    """extra для logger.*: писать только каждое every-е сообщение с этим шаблоном"""
+    return {'sample_every': every}
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает 1 из N записей с одинаковым шаблоном (если задан sample_every)"""
+
+    def __init__(self):
+        super().__init__()
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        every = getattr(record, 'sample_every', None)
+        if not every or every <= 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — одна строка JSON"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'sample_every', None):
+            entry['sample_every'] = record.sample_every
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level=None, fmt=None):
+    """Настроить корневой логгер с асинхронным выводом (повторный вызов ничего не делает)"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        fmt = fmt or LOG_FORMAT
+        output = logging.StreamHandler(sys.stdout)
+        output.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+        log_queue = queue.SimpleQueue()
+        handler = logging.handlers.QueueHandler(log_queue)
+        handler.addFilter(SamplingFilter())
+
+        root = logging.getLogger()
+        root.handlers[:] = [handler]
+        root.setLevel(level or LOG_LEVEL)
+        # Сторонние библиотеки шумят даже на INFO — от них нужны только предупреждения
+        for noisy in ('telethon', 'apscheduler', 'urllib3', 'waitress'):
+            logging.getLogger(noisy).setLevel(max(root.level, logging.WARNING))
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
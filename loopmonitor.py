@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Контроль задержек event loop бота
+
+Фоновая корутина периодически засыпает на фиксированный интервал и меряет,
+насколько позже она просыпается: это и есть задержка цикла (lag). Если
+включён детектор медленных шагов (LOOP_SLOW_CALLBACK_MS), отдельный поток
+следит за пульсом корутины и, когда цикл завис дольше порога, снимает стек
+потока цикла — так видно, какой синхронный вызов (SQLite, CSV и т.п.)
+блокирует бота.
+
+Переменные окружения:
+    LOOP_LAG_INTERVAL      период замера в секундах (по умолчанию 0.5)
+    LOOP_LAG_WARN_MS       порог предупреждения в логах (по умолчанию 100)
+    LOOP_SLOW_CALLBACK_MS  порог детектора блокировок, 0 — выключен
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+import metrics
+from logconfig import sample
+
+logger = logging.getLogger('babybot.loop')
+
+LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL', '0.5'))
+LAG_WARN_MS = float(os.getenv('LOOP_LAG_WARN_MS', '100'))
+SLOW_CALLBACK_MS = float(os.getenv('LOOP_SLOW_CALLBACK_MS', '0'))
+
+# Сколько последних блокировок хранить для /loop
+RECENT_STALLS = 20
+
+LOOP_LAG = metrics.REGISTRY.histogram(
+    'babybot_loop_lag_seconds', 'Задержка пробуждения event loop относительно расписания',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+LOOP_LAG_MAX = metrics.REGISTRY.gauge(
+    'babybot_loop_lag_max_seconds', 'Максимальная задержка event loop с момента запуска')
+SLOW_CALLBACKS = metrics.REGISTRY.counter(
+    'babybot_loop_stalls_total', 'Сколько раз event loop был заблокирован дольше порога')
+
+
+class LoopMonitor:
+    """Замер задержки event loop и (опционально) поиск блокирующих вызовов"""
+
+    def __init__(self, interval=LAG_INTERVAL, warn_ms=LAG_WARN_MS, slow_callback_ms=SLOW_CALLBACK_MS):
+        self.interval = interval
+        self.warn = warn_ms / 1000.0
+        self.slow_threshold = slow_callback_ms / 1000.0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = collections.deque(maxlen=RECENT_STALLS)
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+
+    def start(self, loop=None):
+        """Запустить замер на текущем (или переданном) цикле"""
+        loop = loop or asyncio.get_event_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = loop.create_task(self._measure())
+        if self.slow_threshold > 0:
+            self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+            self._watchdog.start()
+        logger.info("⏱️ Loop monitor started: interval %ss, stall detector %s", self.interval,
+                    f"on at {self.slow_threshold * 1000:.0f}ms" if self.slow_threshold else "off")
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _measure(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            lag = max(0.0, now - started - self.interval)
+            self.last_lag = lag
+            LOOP_LAG.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+                LOOP_LAG_MAX.set(lag)
+            if lag >= self.warn:
+                # Под нагрузкой лаг бывает на каждом замере — пишем каждое 20-е
+                logger.warning("⚠️ Event loop lag: %.0f ms", lag * 1000, extra=sample(20))
+
+    def _watch(self):
+        """Поток-сторож: снимает стек цикла, если пульс пропал дольше порога"""
+        reported_beat = None
+        check_every = max(self.slow_threshold / 4, 0.01)
+        while not self._stop.wait(check_every):
+            beat = self._last_beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.slow_threshold or beat == reported_beat:
+                continue
+            # Одну блокировку записываем один раз, пока пульс не вернётся
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+            self.stalls.append({
+                'detected_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'blocked_ms': round(blocked * 1000),
+                'stack': stack,
+            })
+            SLOW_CALLBACKS.inc()
+            logger.warning("🐢 Event loop blocked for over %.0f ms at:\n%s", blocked * 1000, stack)
+
+    def snapshot(self):
+        """Сводка для health-сервера"""
+        return {
+            'interval_seconds': self.interval,
+            'last_lag_ms': round(self.last_lag * 1000, 1),
+            'max_lag_ms': round(self.max_lag * 1000, 1),
+            'stall_detector_ms': round(self.slow_threshold * 1000) or None,
+            'stalls_total': SLOW_CALLBACKS.total(),
+            'recent_stalls': list(self.stalls),
+        }
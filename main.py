@@ -1,63 +1,106 @@
+import time
+
+# Момент начала импорта — для отчёта о фазах холодного старта
+_IMPORT_STARTED = time.perf_counter()
+
 from telethon import TelegramClient, events, Button
 from datetime import datetime, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import asyncio
-import sqlite3
+import contextlib
+import functools
 import random
-import threading
-import time
-import http.server
-import socketserver
+import json
+import shutil
+import tempfile
+import urllib.parse
 import pytz
 
 # Конфигурация (загружается из переменных окружения)
+import logging
 import os
 from dotenv import load_dotenv
 
-# Загружаем переменные окружения
-load_dotenv('config.env')
-
-# Получаем данные из переменных окружения
-API_ID = os.getenv('API_ID')
-API_HASH = os.getenv('API_HASH')
-BOT_TOKEN = os.getenv('BOT_TOKEN')
-
-# Проверяем наличие всех необходимых переменных
-if not all([API_ID, API_HASH, BOT_TOKEN]):
-    print("❌ ОШИБКА: Не все необходимые переменные окружения установлены!")
-    print("📝 Убедитесь, что в файле config.env установлены:")
-    print("   • API_ID - ваш Telegram API ID")
-    print("   • API_HASH - ваш Telegram API Hash") 
-    print("   • BOT_TOKEN - токен бота от @BotFather")
-    print("🔧 Отредактируйте файл config.env и заполните API_ID и API_HASH")
-    print("💡 Получите API_ID и API_HASH на https://my.telegram.org/apps")
-    print("🤖 BOT_TOKEN уже установлен: 8075869535:AAFGs_9SgnM5RFH4H_OTc-xsdhGby8s1lKc")
-    exit(1)
-
-# Преобразуем API_ID в число
-try:
-    API_ID = int(API_ID)
-except ValueError:
-    print("❌ ОШИБКА: API_ID должен быть числом!")
-    exit(1)
-
-print("✅ Все переменные окружения загружены успешно")
-print(f"🤖 Бот: @Prettyotterbot")
-print(f"🔑 Токен: {BOT_TOKEN[:10]}...")
-print(f"🔑 API_ID: {API_ID}")
-print(f"🔑 API_HASH: {API_HASH[:10]}...")
+from logconfig import setup_logging
+import tracing
+import clock
+import profiling
+
+setup_logging()
+logger = logging.getLogger('babybot')
+
+
+class ConfigError(Exception):
+    """Не заданы или неверны обязательные переменные окружения"""
+
+
+class Config:
+    """Параметры запуска бота: доступ к Telegram, сессия, база и порт health-сервера"""
+
+    def __init__(self, api_id, api_hash, bot_token, session='babybot', db_path=None, health_port=8000):
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.bot_token = bot_token
+        self.session = session
+        self.db_path = db_path
+        self.health_port = health_port
+
+    @classmethod
+    def from_env(cls, env_file='config.env'):
+        """Прочитать config.env и переменные окружения"""
+        load_dotenv(env_file)
+        api_id = os.getenv('API_ID')
+        api_hash = os.getenv('API_HASH')
+        bot_token = os.getenv('BOT_TOKEN')
+        if not all([api_id, api_hash, bot_token]):
+            raise ConfigError("Не все необходимые переменные окружения установлены!")
+        try:
+            api_id = int(api_id)
+        except ValueError:
+            raise ConfigError("API_ID должен быть числом!")
+        return cls(api_id, api_hash, bot_token,
+                   session=os.getenv('TELEGRAM_SESSION', 'babybot'),
+                   db_path=os.getenv('BABYBOT_DB'),
+                   health_port=int(os.getenv('HEALTH_PORT', '8000')))
+
+
+def explain_config_error(error):
+    """Подсказать, какие переменные окружения нужно заполнить"""
+    logger.error("❌ ОШИБКА: %s", error)
+    logger.info("📝 Убедитесь, что в файле config.env установлены:")
+    logger.info("   • API_ID - ваш Telegram API ID")
+    logger.info("   • API_HASH - ваш Telegram API Hash")
+    logger.info("   • BOT_TOKEN - токен бота от @BotFather")
+    logger.info("🔧 Отредактируйте файл config.env и заполните API_ID и API_HASH")
+    logger.info("💡 Получите API_ID и API_HASH на https://my.telegram.org/apps")
+
+
+# Фазы холодного старта: имя → секунды (отдаются в /status и /metrics)
+STARTUP_PHASES = {}
+
+
+@contextlib.contextmanager
+def startup_phase(name):
+    """Замерить фазу запуска"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_startup_phase(name, time.perf_counter() - started)
+
+
+def record_startup_phase(name, seconds):
+    STARTUP_PHASES[name] = round(seconds, 4)
+    metrics.STARTUP_PHASE.set(seconds, phase=name)
 
 # Функция для получения тайского времени
 def get_thai_time():
-    """Получить текущее время в тайском часовом поясе"""
-    thai_tz = pytz.timezone('Asia/Bangkok')
-    utc_now = datetime.now(pytz.UTC)
-    thai_now = utc_now.astimezone(thai_tz)
-    return thai_now
+    """Получить текущее время в тайском часовом поясе (по часам из clock.py)"""
+    return clock.now()
 
 def get_thai_date():
     """Получить текущую дату в тайском часовом поясе"""
-    return get_thai_time().date()
+    return clock.today()
 
 # Функция для внешнего keep-alive (для Render)
 def external_keep_alive():
@@ -77,524 +120,215 @@ def external_keep_alive():
             try:
                 response = urllib.request.urlopen(f'{external_url}/ping', timeout=10)
                 if response.getcode() == 200:
-                    print(f"✅ External keep-alive successful: {time.strftime('%H:%M:%S')}")
+                    logger.debug("✅ External keep-alive successful: %s", time.strftime('%H:%M:%S'))
                 else:
-                    print(f"⚠️ External keep-alive returned status: {response.getcode()}")
+                    logger.warning("⚠️ External keep-alive returned status: %s", response.getcode())
             except urllib.error.URLError as e:
-                print(f"⚠️ External keep-alive failed: {e}")
+                logger.warning("⚠️ External keep-alive failed: %s", e)
             except Exception as e:
-                print(f"⚠️ External keep-alive error: {e}")
+                logger.warning("⚠️ External keep-alive error: %s", e)
         else:
-            print("ℹ️ RENDER_EXTERNAL_URL not set, skipping external keep-alive")
+            logger.info("ℹ️ RENDER_EXTERNAL_URL not set, skipping external keep-alive")
             
     except Exception as e:
-        print(f"❌ External keep-alive critical error: {e}")
-
-client = TelegramClient('babybot', API_ID, API_HASH).start(bot_token=BOT_TOKEN)
-
-# Инициализация базы данных
-def init_db():
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    
-    # Создание таблиц (если их нет)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS families (
-            id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS family_members (
-            family_id INTEGER,
-            user_id INTEGER,
-            role TEXT DEFAULT 'Родитель',
-            name TEXT DEFAULT 'Неизвестно',
-            FOREIGN KEY (family_id) REFERENCES families (id)
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS feedings (
-            id INTEGER PRIMARY KEY,
-            family_id INTEGER,
-            author_id INTEGER,
-            timestamp TEXT NOT NULL,
-            author_role TEXT DEFAULT 'Родитель',
-            author_name TEXT DEFAULT 'Неизвестно',
-            FOREIGN KEY (family_id) REFERENCES families (id)
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS diapers (
-            id INTEGER PRIMARY KEY,
-            family_id INTEGER,
-            author_id INTEGER,
-            timestamp TEXT NOT NULL,
-            author_role TEXT DEFAULT 'Родитель',
-            author_name TEXT DEFAULT 'Неизвестно',
-            FOREIGN KEY (family_id) REFERENCES families (id)
-        )
-    """)
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS settings (
-            family_id INTEGER,
-            feed_interval INTEGER DEFAULT 3,
-            diaper_interval INTEGER DEFAULT 2,
-            tips_enabled INTEGER DEFAULT 1,
-            tips_time_hour INTEGER DEFAULT 9,
-            tips_time_minute INTEGER DEFAULT 0,
-            bath_interval INTEGER DEFAULT 1,
-            bath_time_hour INTEGER DEFAULT 19,
-            bath_time_minute INTEGER DEFAULT 0,
-            bath_enabled INTEGER DEFAULT 1,
-            FOREIGN KEY (family_id) REFERENCES families (id)
-        )
-    """)
-    
-    # Добавляем новые колонки к существующей таблице settings, если их нет
-    try:
-        cur.execute("ALTER TABLE settings ADD COLUMN tips_time_hour INTEGER DEFAULT 9")
-        print("✅ Добавлена колонка tips_time_hour")
-    except sqlite3.OperationalError:
-        print("ℹ️ Колонка tips_time_hour уже существует")
-    
-    try:
-        cur.execute("ALTER TABLE settings ADD COLUMN tips_time_minute INTEGER DEFAULT 0")
-        print("✅ Добавлена колонка tips_time_minute")
-    except sqlite3.OperationalError:
-        print("ℹ️ Колонка tips_time_minute уже существует")
-    
-    # Обновляем существующие записи, устанавливая значения по умолчанию
-    cur.execute("UPDATE settings SET tips_time_hour = 9 WHERE tips_time_hour IS NULL")
-    cur.execute("UPDATE settings SET tips_time_minute = 0 WHERE tips_time_minute IS NULL")
-    
-    # Добавляем новые колонки для купания, если их нет
-    try:
-        cur.execute("ALTER TABLE settings ADD COLUMN bath_interval INTEGER DEFAULT 1")
-        print("✅ Добавлена колонка bath_interval")
-    except sqlite3.OperationalError:
-        print("ℹ️ Колонка bath_interval уже существует")
-    
-    try:
-        cur.execute("ALTER TABLE settings ADD COLUMN bath_time_hour INTEGER DEFAULT 19")
-        print("✅ Добавлена колонка bath_time_hour")
-    except sqlite3.OperationalError:
-        print("ℹ️ Колонка bath_time_hour уже существует")
-    
-    try:
-        cur.execute("ALTER TABLE settings ADD COLUMN bath_time_minute INTEGER DEFAULT 0")
-        print("✅ Добавлена колонка bath_time_minute")
-    except sqlite3.OperationalError:
-        print("ℹ️ Колонка bath_time_minute уже существует")
-    
-    try:
-        cur.execute("ALTER TABLE settings ADD COLUMN bath_enabled INTEGER DEFAULT 1")
-        print("✅ Добавлена колонка bath_enabled")
-    except sqlite3.OperationalError:
-        print("ℹ️ Колонка bath_enabled уже существует")
-    
-    # Обновляем существующие записи, устанавливая значения по умолчанию для купания
-    cur.execute("UPDATE settings SET bath_interval = 1 WHERE bath_interval IS NULL")
-    cur.execute("UPDATE settings SET bath_time_hour = 19 WHERE bath_time_hour IS NULL")
-    cur.execute("UPDATE settings SET bath_time_minute = 0 WHERE bath_time_minute IS NULL")
-    cur.execute("UPDATE settings SET bath_enabled = 1 WHERE bath_enabled IS NULL")
-    
-    # Миграция таблиц feedings и diapers
-    try:
-        # Проверяем, есть ли колонка family_id в таблице feedings
-        cur.execute("PRAGMA table_info(feedings)")
-        columns = [col[1] for col in cur.fetchall()]
-        
-        if 'family_id' not in columns:
-            print("🔄 Мигрируем таблицу feedings...")
-            # Создаем временную таблицу с новой структурой
-            cur.execute("""
-                CREATE TABLE feedings_new (
-                    id INTEGER PRIMARY KEY,
-                    family_id INTEGER,
-                    author_id INTEGER,
-                    timestamp TEXT NOT NULL,
-                    author_role TEXT DEFAULT 'Родитель',
-                    author_name TEXT DEFAULT 'Неизвестно',
-                    FOREIGN KEY (family_id) REFERENCES families (id)
-                )
-            """)
-            
-            # Копируем данные из старой таблицы
-            cur.execute("SELECT id, user_id, timestamp FROM feedings")
-            old_data = cur.fetchall()
-            
-            for row in old_data:
-                # Для каждой записи создаем временную семью
-                temp_family_id = create_family(f"Миграция {row[0]}", row[1])
-                cur.execute("INSERT INTO feedings_new (family_id, author_id, timestamp, author_role, author_name) VALUES (?, ?, ?, ?, ?)",
-                           (temp_family_id, row[1], row[2], 'Родитель', 'Неизвестно'))
-            
-            # Удаляем старую таблицу и переименовываем новую
-            cur.execute("DROP TABLE feedings")
-            cur.execute("ALTER TABLE feedings_new RENAME TO feedings")
-            print("✅ Таблица feedings мигрирована")
-        else:
-            print("ℹ️ Таблица feedings уже имеет правильную структуру")
-            
-    except sqlite3.OperationalError as e:
-        print(f"ℹ️ Миграция feedings: {e}")
-    
-    try:
-        # Проверяем, есть ли колонка family_id в таблице diapers
-        cur.execute("PRAGMA table_info(diapers)")
-        columns = [col[1] for col in cur.fetchall()]
-        
-        if 'family_id' not in columns:
-            print("🔄 Мигрируем таблицу diapers...")
-            # Создаем временную таблицу с новой структурой
-            cur.execute("""
-                CREATE TABLE diapers_new (
-                    id INTEGER PRIMARY KEY,
-                    family_id INTEGER,
-                    author_id INTEGER,
-                    timestamp TEXT NOT NULL,
-                    author_role TEXT DEFAULT 'Родитель',
-                    author_name TEXT DEFAULT 'Неизвестно',
-                    FOREIGN KEY (family_id) REFERENCES families (id)
-                )
-            """)
-            
-            # Копируем данные из старой таблицы
-            cur.execute("SELECT id, user_id, timestamp FROM diapers")
-            old_data = cur.fetchall()
-            
-            for row in old_data:
-                # Для каждой записи создаем временную семью
-                temp_family_id = create_family(f"Миграция {row[0]}", row[1])
-                cur.execute("INSERT INTO diapers_new (family_id, author_id, timestamp, author_role, author_name) VALUES (?, ?, ?, ?, ?)",
-                           (temp_family_id, row[1], row[2], 'Родитель', 'Неизвестно'))
-            
-            # Удаляем старую таблицу и переименовываем новую
-            cur.execute("DROP TABLE diapers")
-            cur.execute("ALTER TABLE diapers_new RENAME TO diapers")
-            print("✅ Таблица diapers мигрирована")
-        else:
-            print("ℹ️ Таблица diapers уже имеет правильную структуру")
-            
-    except sqlite3.OperationalError as e:
-        print(f"ℹ️ Миграция diapers: {e}")
-    
-    conn.commit()
-    conn.close()
-    print("✅ База данных инициализирована/обновлена")
-
-# Функции для работы с базой данных
-def get_family_id(user_id):
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("SELECT family_id FROM family_members WHERE user_id = ?", (user_id,))
-    result = cur.fetchone()
-    conn.close()
-    family_id = result[0] if result else None
-    print(f"DEBUG: get_family_id({user_id}) = {family_id}")
-    return family_id
-
-def create_family(name, user_id):
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    
-    cur.execute("INSERT INTO families (name) VALUES (?)", (name,))
-    family_id = cur.lastrowid
-    
-    cur.execute("INSERT INTO family_members (family_id, user_id) VALUES (?, ?)", (family_id, user_id))
-    cur.execute("INSERT INTO settings (family_id) VALUES (?)", (family_id,))
-    
-    conn.commit()
-    conn.close()
-    return family_id
-
-def join_family_by_code(code, user_id):
-    """Присоединить пользователя к семье по коду приглашения"""
-    try:
-        family_id = int(code)
-        conn = sqlite3.connect("babybot.db")
-        cur = conn.cursor()
-        
-        # Проверяем, существует ли семья
-        cur.execute("SELECT id, name FROM families WHERE id = ?", (family_id,))
-        family = cur.fetchone()
-        
-        if not family:
-            conn.close()
-            return None, "Семья не найдена"
-        
-        # Проверяем, не состоит ли пользователь уже в семье
-        cur.execute("SELECT family_id FROM family_members WHERE user_id = ?", (user_id,))
-        existing = cur.fetchone()
-        
-        if existing:
-            conn.close()
-            return None, "Вы уже состоите в семье"
-        
-        # Добавляем пользователя в семью
-        cur.execute("INSERT INTO family_members (family_id, user_id) VALUES (?, ?)", (family_id, user_id))
-        conn.commit()
-        conn.close()
-        
-        return family_id, family[1]  # family_id, family_name
-    except ValueError:
-        return None, "Неверный код приглашения"
-    except Exception as e:
-        return None, f"Ошибка: {str(e)}"
+        logger.error("❌ External keep-alive critical error: %s", e)
+
+class TracedTelegramClient(TelegramClient):
+    """Клиент, отмечающий каждый запрос к Telegram API span'ом трассировки"""
+
+    async def _call(self, sender, request, ordered=False, flood_sleep_threshold=None):
+        if tracing.current_span() is None:
+            return await super()._call(sender, request, ordered, flood_sleep_threshold)
+        with tracing.span(f"tg.{type(request).__name__}"):
+            return await super()._call(sender, request, ordered, flood_sleep_threshold)
+
+# Клиент, планировщик и конфигурация создаются в create_app(), а не при импорте:
+# так модуль можно импортировать в бенчмарках и тестах без сети и переменных окружения
+bot_config = None
+client = None
+scheduler = None
+
+# Обработчики и задачи собираются декораторами on() и scheduled_job()
+# и регистрируются на клиенте и планировщике в create_app()
+HANDLERS = []
+SCHEDULED_JOBS = []
+
+def on(event_builder):
+    """Аналог @client.on: запомнить обработчик до создания клиента"""
+    def decorator(func):
+        HANDLERS.append((func, event_builder))
+        return func
+    return decorator
+
+def scheduled_job(trigger, **trigger_args):
+    """Аналог @scheduler.scheduled_job: запомнить задачу до создания планировщика"""
+    def decorator(func):
+        SCHEDULED_JOBS.append((func, trigger, trigger_args))
+        return func
+    return decorator
+
+def connect():
+    """Авторизоваться как бот (синхронно, если цикл ещё не запущен)"""
+    return client.start(bot_token=bot_config.bot_token)
+
+# Функции для работы с базой данных (общий слой storage используется и дашбордом)
+from storage import (
+    init_db, get_family_id, create_family, join_family_by_code, get_family_name,
+    get_member_info, set_member_role, get_family_members_with_roles, get_family_member_ids,
+    get_settings, get_all_settings, get_user_intervals, set_user_interval,
+    is_tips_enabled, toggle_tips, set_tips_time, get_tips_time,
+    get_bath_settings, set_bath_interval, set_bath_time, toggle_bath_reminders,
+    get_last_feeding_time_for_family, get_last_diaper_change_for_family, delete_entry,
+)
+import anomalies
+import export
+import growth
+import storage
+import metrics
+from loopmonitor import LoopMonitor
+
+async def send_message(entity, *args, **kwargs):
+    """Отправка сообщения с учётом задержки и ошибок в метриках"""
+    return await metrics.timed_send(client.send_message, entity, *args, **kwargs)
+
+async def send_file(entity, *args, **kwargs):
+    """Отправка файла с учётом задержки и ошибок в метриках"""
+    return await metrics.timed_send(client.send_file, entity, *args, **kwargs)
 
 def invite_code_for(family_id):
     # В существующей базе нет колонки invite_code, возвращаем ID семьи
     return str(family_id)
 
-def get_family_name(family_id):
-    """Получить название семьи по ID"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("SELECT name FROM families WHERE id = ?", (family_id,))
-    result = cur.fetchone()
-    conn.close()
-    return result[0] if result else "Неизвестная семья"
-
-def get_member_info(user_id):
-    """Получить информацию о члене семьи"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("SELECT role, name FROM family_members WHERE user_id = ?", (user_id,))
-    result = cur.fetchone()
-    conn.close()
-    if result:
-        return result[0], result[1]  # role, name
-    return "Родитель", "Неизвестно"
-
-def set_member_role(user_id, role, name):
-    """Установить роль и имя для члена семьи"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("UPDATE family_members SET role = ?, name = ? WHERE user_id = ?", (role, name, user_id))
-    conn.commit()
-    conn.close()
-
-def get_family_members_with_roles(family_id):
-    """Получить всех членов семьи с ролями"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("SELECT user_id, role, name FROM family_members WHERE family_id = ?", (family_id,))
-    members = cur.fetchall()
-    conn.close()
-    return members
-
 def add_feeding(user_id, minutes_ago=0):
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    
-    # Получаем family_id пользователя
-    family_id = get_family_id(user_id)
-    if not family_id:
-        # Если пользователь не в семье, создаем временную семью
-        family_id = create_family("Временная семья", user_id)
-    
-    # Получаем информацию об авторе
-    role, name = get_member_info(user_id)
-    
     timestamp = get_thai_time() - timedelta(minutes=minutes_ago)
-    cur.execute("INSERT INTO feedings (family_id, author_id, timestamp, author_role, author_name) VALUES (?, ?, ?, ?, ?)", 
-                (family_id, user_id, timestamp.isoformat(), role, name))
-    conn.commit()
-    conn.close()
+    storage.add_event("feedings", user_id, timestamp)
 
 def add_diaper_change(user_id, minutes_ago=0):
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    
-    # Получаем family_id пользователя
-    family_id = get_family_id(user_id)
-    if not family_id:
-        # Если пользователь не в семье, создаем временную семью
-        family_id = create_family("Временная семья", user_id)
-    
-    # Получаем информацию об авторе
-    role, name = get_member_info(user_id)
-    
     timestamp = get_thai_time() - timedelta(minutes=minutes_ago)
-    cur.execute("INSERT INTO diapers (family_id, author_id, timestamp, author_role, author_name) VALUES (?, ?, ?, ?, ?)", 
-                (family_id, user_id, timestamp.isoformat(), role, name))
-    conn.commit()
-    conn.close()
+    storage.add_event("diapers", user_id, timestamp)
+
+def add_bath(user_id, minutes_ago=0):
+    timestamp = get_thai_time() - timedelta(minutes=minutes_ago)
+    storage.add_event("baths", user_id, timestamp)
 
 def get_last_feeding_time(user_id):
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    
     # Получаем family_id пользователя
     family_id = get_family_id(user_id)
     if not family_id:
         return None
-    
-    cur.execute("SELECT timestamp FROM feedings WHERE family_id = ? ORDER BY timestamp DESC LIMIT 1", (family_id,))
-    result = cur.fetchone()
-    conn.close()
-    if result:
-        return datetime.fromisoformat(result[0])
-    return None
-
-def get_last_diaper_change_for_family(family_id):
-    """Получить время последней смены подгузника для семьи"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    
-    cur.execute("SELECT timestamp FROM diapers WHERE family_id = ? ORDER BY timestamp DESC LIMIT 1", (family_id,))
-    result = cur.fetchone()
-    conn.close()
-    if result:
-        return datetime.fromisoformat(result[0])
-    return None
-
-def get_last_feeding_time_for_family(family_id):
-    """Получить время последнего кормления для семьи"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    
-    cur.execute("SELECT timestamp FROM feedings WHERE family_id = ? ORDER BY timestamp DESC LIMIT 1", (family_id,))
-    result = cur.fetchone()
-    conn.close()
-    if result:
-        return datetime.fromisoformat(result[0])
-    return None
-
-def get_user_intervals(family_id):
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("SELECT feed_interval, diaper_interval FROM settings WHERE family_id = ?", (family_id,))
-    result = cur.fetchone()
-    conn.close()
-    if result:
-        return result[0], result[1]
-    return 3, 2
-
-def set_user_interval(family_id, feed_interval=None, diaper_interval=None):
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    if feed_interval is not None:
-        cur.execute("UPDATE settings SET feed_interval = ? WHERE family_id = ?", (feed_interval, family_id))
-    if diaper_interval is not None:
-        cur.execute("UPDATE settings SET diaper_interval = ? WHERE family_id = ?", (diaper_interval, family_id))
-    conn.commit()
-    conn.close()
-
-def is_tips_enabled(family_id):
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("SELECT tips_enabled FROM settings WHERE family_id = ?", (family_id,))
-    result = cur.fetchone()
-    conn.close()
-    return result[0] if result else 1
-
-def toggle_tips(family_id):
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("UPDATE settings SET tips_enabled = CASE WHEN tips_enabled = 1 THEN 0 ELSE 1 END WHERE family_id = ?", (family_id,))
-    conn.commit()
-    conn.close()
-
-def set_tips_time(family_id, hour, minute):
-    """Установить время рассылки советов"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("UPDATE settings SET tips_time_hour = ?, tips_time_minute = ? WHERE family_id = ?", (hour, minute, family_id))
-    conn.commit()
-    conn.close()
-
-def get_tips_time(family_id):
-    """Получить время рассылки советов"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("SELECT tips_time_hour, tips_time_minute FROM settings WHERE family_id = ?", (family_id,))
-    result = cur.fetchone()
-    conn.close()
-    if result:
-        return result[0], result[1]
-    return 9, 0  # значения по умолчанию
-
-def get_bath_settings(family_id):
-    """Получить настройки купания для семьи"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("SELECT bath_interval, bath_time_hour, bath_time_minute, bath_enabled FROM settings WHERE family_id = ?", (family_id,))
-    result = cur.fetchone()
-    conn.close()
-    if result:
-        return result[0], result[1], result[2], result[3]
-    return 1, 19, 0, 1  # значения по умолчанию
-
-def set_bath_interval(family_id, interval):
-    """Установить интервал купания"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("UPDATE settings SET bath_interval = ? WHERE family_id = ?", (interval, family_id))
-    conn.commit()
-    conn.close()
-
-def set_bath_time(family_id, hour, minute):
-    """Установить время купания"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("UPDATE settings SET bath_time_hour = ?, bath_time_minute = ? WHERE family_id = ?", (hour, minute, family_id))
-    conn.commit()
-    conn.close()
-
-def toggle_bath_reminders(family_id):
-    """Включить/выключить напоминания о купании"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("UPDATE settings SET bath_enabled = CASE WHEN bath_enabled = 1 THEN 0 ELSE 1 END WHERE family_id = ?", (family_id,))
-    conn.commit()
-    conn.close()
-
-def get_feedings_by_day(user_id, date):
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    
-    # Получаем family_id пользователя
-    family_id = get_family_id(user_id)
-    if not family_id:
-        return []
-    
-    start_date = datetime.combine(date, datetime.min.time()).isoformat()
-    end_date = datetime.combine(date, datetime.max.time()).isoformat()
-    cur.execute("SELECT id, timestamp, author_role, author_name FROM feedings WHERE family_id = ? AND timestamp BETWEEN ? AND ? ORDER BY timestamp", 
-                (family_id, start_date, end_date))
-    result = cur.fetchall()
-    conn.close()
-    return result
-
-def get_diapers_by_day(user_id, date):
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    
-    # Получаем family_id пользователя
-    family_id = get_family_id(user_id)
-    if not family_id:
-        return []
-    
-    start_date = datetime.combine(date, datetime.min.time()).isoformat()
-    end_date = datetime.combine(date, datetime.max.time()).isoformat()
-    cur.execute("SELECT id, timestamp, author_role, author_name FROM diapers WHERE family_id = ? AND timestamp BETWEEN ? AND ? ORDER BY timestamp", 
-                (family_id, start_date, end_date))
-    result = cur.fetchall()
-    conn.close()
-    return result
-
-def delete_entry(table, entry_id):
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute(f"DELETE FROM {table} WHERE id = ?", (entry_id,))
-    conn.commit()
-    conn.close()
+    return get_last_feeding_time_for_family(family_id)
+
+# Адаптивный интервал используется, когда накопилось столько промежутков
+ADAPTIVE_MIN_SAMPLES = 3
+# и не выходит за пределы интервалов, доступных в настройках
+ADAPTIVE_INTERVAL_RANGE = (1.0, 6.0)
+
+def get_feed_interval(family_id, settings):
+    """Интервал кормления в часах: из настроек или, в адаптивном режиме, по бегущей статистике семьи"""
+    if settings.get('adaptive_feeding'):
+        stats = storage.get_feeding_stats(family_id)
+        if stats and stats['samples'] >= ADAPTIVE_MIN_SAMPLES:
+            low, high = ADAPTIVE_INTERVAL_RANGE
+            return round(min(max(stats['ewma_gap'] / 3600, low), high), 1)
+    return settings['feed_interval']
+
+# История: страница дня — не больше HISTORY_PAGE_SIZE записей, сколько бы их ни было за день
+HISTORY_PAGE_SIZE = 10
+HISTORY_TABLES = ('feedings', 'diapers', 'baths')
+HISTORY_ICONS = {'feedings': '🍼', 'diapers': '🧷', 'baths': '🛁'}
+# Виды, у которых в истории есть кнопки правки и удаления (префикс callback-данных)
+HISTORY_EDITABLE = {'feedings': 'feed', 'diapers': 'diaper'}
+WEEKDAYS = ('пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс')
+
+def day_bounds(date):
+    """Начало и конец тайских суток date (aware)"""
+    start = clock.THAI_TZ.localize(datetime.combine(date, datetime.min.time()))
+    return start, start + timedelta(days=1)
+
+def format_day_totals(totals, date):
+    """Строка итогов суток из storage.get_daily_totals: «🍼 8 · 🧷 6 · 😴 10ч 5м»"""
+    day = date.isoformat()
+    parts = [f"{HISTORY_ICONS[table]} {totals.get((day, table), 0)}" for table in HISTORY_TABLES]
+    sleep_seconds = totals.get((day, 'sleep'), 0)
+    if sleep_seconds:
+        parts.append(f"😴 {format_duration(sleep_seconds)}")
+    return " · ".join(parts)
+
+def history_day_view(family_id, date, cursor=None, backward=False):
+    """Текст и кнопки страницы истории за день.
+
+    cursor — (ts, id) крайней записи соседней страницы: backward=False —
+    страница после неё, True — перед ней. Записи читаются по индексу
+    (family_id, ts) с LIMIT, итоги дня — из daily_rollup.
+
+    Кнопки страниц несут только id крайней записи (histn_<id>, histp_<id>):
+    день и время берутся из самой записи, а тип callback-запроса в метриках
+    и трассировке остаётся постоянным.
+    """
+    start, end = day_bounds(date)
+    rows = storage.get_timeline(family_id, start, end, tables=HISTORY_TABLES, limit=HISTORY_PAGE_SIZE + 1,
+                                newest_first=backward, after=cursor)
+    more = len(rows) > HISTORY_PAGE_SIZE
+    rows = rows[:HISTORY_PAGE_SIZE]
+    if backward:
+        rows.reverse()
+    has_earlier = more if backward else cursor is not None
+    has_later = True if backward else more
+
+    totals = storage.get_daily_totals(family_id, start, end)
+    text = (f"📅 История за {date.strftime('%d.%m.%Y')} ({WEEKDAYS[date.weekday()]})\n"
+            f"{format_day_totals(totals, date)}\n\n")
+    if not rows:
+        text += "Записей нет\n"
+    key = date.strftime('%Y%m%d')
+    buttons = []
+    for entry_id, table, ts, role, name in rows:
+        time_str = clock.from_timestamp(ts).strftime("%H:%M")
+        author_info = f"{role} {name}" if role and name else "Неизвестно"
+        text += f"  • {time_str} {HISTORY_ICONS[table]} {author_info} [ID {entry_id}]\n"
+        prefix = HISTORY_EDITABLE.get(table)
+        if prefix:
+            buttons.append([Button.inline(f"{HISTORY_ICONS[table]} {time_str} ✏️", f"edit_{prefix}_{entry_id}".encode()),
+                            Button.inline("🗑", f"del_{prefix}_{entry_id}".encode())])
+
+    pages = []
+    if has_earlier and rows:
+        pages.append(Button.inline("⬆️ Раньше", f"histp_{rows[0][0]}".encode()))
+    if has_later and rows:
+        pages.append(Button.inline("⬇️ Позже", f"histn_{rows[-1][0]}".encode()))
+    if pages:
+        buttons.append(pages)
+    previous_day, next_day = date - timedelta(days=1), date + timedelta(days=1)
+    days = [Button.inline(f"◀ {previous_day.strftime('%d.%m')}", f"histd_{previous_day.strftime('%Y%m%d')}".encode()),
+            Button.inline("📆 Неделя", f"histw_{key}".encode())]
+    if next_day <= get_thai_date():
+        days.append(Button.inline(f"{next_day.strftime('%d.%m')} ▶", f"histd_{next_day.strftime('%Y%m%d')}".encode()))
+    buttons.append(days)
+    return text, buttons
+
+def history_week_view(family_id, end_date):
+    """Итоги семи дней, заканчивающихся end_date: по строке на день из daily_rollup"""
+    first_day = end_date - timedelta(days=6)
+    start, _ = day_bounds(first_day)
+    _, end = day_bounds(end_date)
+    totals = storage.get_daily_totals(family_id, start, end)
+
+    text = f"📆 Неделя {first_day.strftime('%d.%m')} – {end_date.strftime('%d.%m.%Y')}\n\n"
+    buttons = []
+    for i in range(7):
+        date = end_date - timedelta(days=i)
+        label = f"{date.strftime('%d.%m')} {WEEKDAYS[date.weekday()]}"
+        text += f"{label}: {format_day_totals(totals, date)}\n"
+        buttons.append([Button.inline(f"📅 {label}", f"histd_{date.strftime('%Y%m%d')}".encode())])
+
+    today = get_thai_date()
+    previous_week = end_date - timedelta(days=7)
+    weeks = [Button.inline("◀ Пред. неделя", f"histw_{previous_week.strftime('%Y%m%d')}".encode())]
+    if end_date < today:
+        next_week = min(end_date + timedelta(days=7), today)
+        weeks.append(Button.inline("След. неделя ▶", f"histw_{next_week.strftime('%Y%m%d')}".encode()))
+    buttons.append(weeks)
+    return text, buttons
 
 # Функция для получения случайного совета
 def get_random_tip():
@@ -614,45 +348,35 @@ def get_random_tip():
             return "Пока нет доступных советов."
             
     except Exception as e:
-        print(f"Ошибка при чтении советов: {e}")
+        logger.warning("⚠️ Ошибка при чтении советов: %s", e)
         # Возвращаем запасной совет в случае ошибки
         return "Помните, что каждый ребенок уникален и развивается в своем темпе."
 
 
 
-# Инициализация
-init_db()
-scheduler = AsyncIOScheduler()
+loop_monitor = LoopMonitor()
 
 # Добавляем задачу для поддержания активности (каждые 5 минут)
-def keep_alive_ping():
-    """Функция для поддержания активности бота"""
+async def keep_alive_ping():
+    """Функция для поддержания активности бота: GET /ping к собственному health-серверу"""
     try:
-        import urllib.request
-        import urllib.error
-        
-        # Пингуем собственный health check сервер
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection('127.0.0.1', bot_config.health_port), timeout=5)
         try:
-            response = urllib.request.urlopen('http://localhost:8000/ping', timeout=5)
-            if response.getcode() == 200:
-                print(f"✅ Keep-alive ping successful: {time.strftime('%H:%M:%S')}")
-            else:
-                print(f"⚠️ Keep-alive ping returned status: {response.getcode()}")
-        except urllib.error.URLError as e:
-            print(f"⚠️ Keep-alive ping failed: {e}")
-        except Exception as e:
-            print(f"⚠️ Keep-alive ping error: {e}")
-            
+            writer.write(b"GET /ping HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            status_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        finally:
+            writer.close()
+        status = status_line.split()[1:2]
+        if status == [b'200']:
+            logger.debug("✅ Keep-alive ping successful: %s", time.strftime('%H:%M:%S'))
+        else:
+            logger.warning("⚠️ Keep-alive ping returned status: %s", status_line.decode('latin-1').strip())
+    except (OSError, asyncio.TimeoutError) as e:
+        logger.warning("⚠️ Keep-alive ping failed: %s", e)
     except Exception as e:
-        print(f"❌ Keep-alive ping critical error: {e}")
-
-# Добавляем задачу в планировщик (каждые 5 минут)
-scheduler.add_job(keep_alive_ping, 'interval', minutes=5, id='keep_alive_ping')
-print("⏰ Keep-alive ping scheduled every 5 minutes")
-
-# Добавляем внешний keep-alive для Render (каждые 3 минуты)
-scheduler.add_job(external_keep_alive, 'interval', minutes=3, id='external_keep_alive')
-print("⏰ External keep-alive scheduled every 3 minutes")
+        logger.error("❌ Keep-alive ping critical error: %s", e)
 
 # Состояния ожидания
 family_creation_pending = {}
@@ -661,7 +385,8 @@ join_pending = {}
 edit_pending = {}
 edit_role_pending = {}
 
-@client.on(events.NewMessage(pattern='/start'))
+@on(events.NewMessage(pattern='/start'))
+@metrics.track_handler('start')
 async def start(event):
     uid = event.sender_id
     fid = get_family_id(uid)
@@ -687,7 +412,7 @@ async def start(event):
         welcome_message = (
             f"👶 **Добро пожаловать в BabyCareBot!**\n\n"
             f"🎯 **Что я умею:**\n"
-            f"• 📝 Записывать кормления и смены подгузников\n"
+            f"• 📝 Записывать кормления, смены подгузников и сон\n"
             f"• 📊 Показывать историю и статистику\n"
             f"• ⏰ Напоминать о важных событиях\n"
             f"• 👥 Координировать уход в семье\n\n"
@@ -701,13 +426,15 @@ async def start(event):
     # Всегда показываем полное меню
     buttons = [
         [Button.text("🍽 Кормление"), Button.text("🧷 Смена подгузника")],
+        [Button.text("😴 Уснул"), Button.text("🌅 Проснулся"), Button.text("🛁 Купание")],
         [Button.text("🍼 Статус кормления"), Button.text("📜 История")],
         [Button.text("💡 Совет"), Button.text("⚙ Настройки")]
     ]
     
     await event.respond(welcome_message, buttons=buttons)
 
-@client.on(events.NewMessage(pattern='🍽 Кормление'))
+@on(events.NewMessage(pattern='🍽 Кормление'))
+@metrics.track_handler('feeding_menu')
 async def feeding_menu(event):
     buttons = [
         [Button.inline("Сейчас", b"feed_now")],
@@ -717,7 +444,8 @@ async def feeding_menu(event):
     ]
     await event.respond("🍼 Когда было кормление?", buttons=buttons)
 
-@client.on(events.NewMessage(pattern='🧷 Смена подгузника'))
+@on(events.NewMessage(pattern='🧷 Смена подгузника'))
+@metrics.track_handler('diaper_menu')
 async def diaper_menu(event):
     buttons = [
         [Button.inline("Сейчас", b"diaper_now")],
@@ -725,24 +453,235 @@ async def diaper_menu(event):
     ]
     await event.respond("🧷 Когда была смена подгузника?", buttons=buttons)
 
+@on(events.NewMessage(pattern='🛁 Купание'))
+@metrics.track_handler('bath_menu')
+async def bath_menu(event):
+    buttons = [
+        [Button.inline("Сейчас", b"bath_now")],
+        [Button.inline("30 мин назад", b"bath_30")],
+        [Button.inline("1 час назад", b"bath_60")],
+    ]
+    text = "🛁 Когда было купание?"
+    fid = get_family_id(event.sender_id)
+    last_bath = storage.get_last_bath_time(fid) if fid else None
+    if last_bath:
+        bath_interval = get_bath_settings(fid)[0]
+        next_bath = last_bath.date() + timedelta(days=bath_interval)
+        text += (f"\n\n📅 Последнее купание: {last_bath.strftime('%d.%m %H:%M')}\n"
+                 f"🔄 Следующее по интервалу: {next_bath.strftime('%d.%m')}")
+    await event.respond(text, buttons=buttons)
+
+def format_duration(seconds):
+    h, m = divmod(int(seconds // 60), 60)
+    return f"{h}ч {m}м"
+
+def get_sleep_today(family_id):
+    """Сколько секунд малыш спал с начала тайских суток (вместе с текущим сном)"""
+    start = clock.THAI_TZ.localize(datetime.combine(get_thai_date(), datetime.min.time()))
+    return storage.get_sleep_total(family_id, start)
+
+@on(events.NewMessage(pattern='😴 Уснул'))
+@metrics.track_handler('sleep_start')
+async def sleep_start(event):
+    uid = event.sender_id
+    now = get_thai_time()
+    entry_id, start_ts, created = storage.start_sleep(uid, now)
+    if created:
+        await event.respond(f"😴 Сон начался в {now.strftime('%H:%M')}. Нажмите «🌅 Проснулся», когда малыш проснётся.")
+    else:
+        started = clock.from_timestamp(start_ts)
+        await event.respond(f"😴 Малыш уже спит с {started.strftime('%H:%M')} "
+                            f"({format_duration(now.timestamp() - start_ts)}).")
 
+@on(events.NewMessage(pattern='🌅 Проснулся'))
+@metrics.track_handler('sleep_stop')
+async def sleep_stop(event):
+    uid = event.sender_id
+    closed = storage.stop_sleep(uid, get_thai_time())
+    if not closed:
+        await event.respond("❌ Сейчас сон не записан. Нажмите «😴 Уснул», когда малыш заснёт.")
+        return
+    _, start_ts, end_ts = closed
+    total = get_sleep_today(get_family_id(uid))
+    await event.respond(f"🌅 Проснулся! Сон длился {format_duration(end_ts - start_ts)}.\n"
+                        f"😴 Всего сна за сегодня: {format_duration(total)}.")
+
+
+
+# Допустимые значения измерений: опечатка не должна попасть в кривую роста
+GROWTH_LIMITS = {'weight': (0.5, 30.0), 'height': (30.0, 130.0)}
+GROWTH_USAGE = ("📏 Запись роста и веса:\n"
+                "/growth 7.2 68 — вес 7.2 кг и рост 68 см\n"
+                "/growth 7.2 — только вес\n"
+                "/growth - 68 — только рост")
+
+def parse_growth_args(text):
+    """'7,2 68' → {'weight': 7.2, 'height': 68.0}; ValueError при ошибке"""
+    parts = text.split()
+    if not 1 <= len(parts) <= 2:
+        raise ValueError(GROWTH_USAGE)
+    values = {}
+    for indicator, part in zip(('weight', 'height'), parts):
+        if part == '-':
+            continue
+        try:
+            value = float(part.replace(',', '.'))
+        except ValueError:
+            raise ValueError(GROWTH_USAGE) from None
+        low, high = GROWTH_LIMITS[indicator]
+        if not low <= value <= high:
+            raise ValueError(f"❌ {'Вес' if indicator == 'weight' else 'Рост'} должен быть от {low:g} до {high:g}")
+        values[indicator] = value
+    if not values:
+        raise ValueError(GROWTH_USAGE)
+    return values
+
+@on(events.NewMessage(pattern=r'^/growth(?:@\w+)?(?:\s+(.*))?$'))
+@metrics.track_handler('growth_command')
+async def growth_command(event):
+    """Записать вес и рост малыша и показать перцентили ВОЗ"""
+    args = (event.pattern_match.group(1) or '').strip()
+    if not args:
+        await event.respond(GROWTH_USAGE)
+        return
+    try:
+        values = parse_growth_args(args)
+    except ValueError as e:
+        await event.respond(str(e))
+        return
 
-@client.on(events.NewMessage(pattern='⏰ Когда ел?'))
+    now = get_thai_time()
+    storage.add_growth(event.sender_id, now, **values)
+    fid = get_family_id(event.sender_id)
+    record = storage.get_baby_record(fid)
+    birth_ts = growth.parse_birth_date(record[1]) if record else None
+    sex = growth.sex_code(record[2]) if record else None
+
+    lines = ["✅ Измерение записано:"]
+    for indicator, value in values.items():
+        label, unit = ("⚖️ Вес", "кг") if indicator == 'weight' else ("📏 Рост", "см")
+        line = f"{label}: {value:g} {unit}"
+        if birth_ts is not None and sex:
+            age = growth.age_in_months(birth_ts, [now.timestamp()])
+            percentile = growth.percentiles(indicator, sex, age, [value])[0]
+            if percentile == percentile:  # не NaN
+                line += f" — {percentile:.0f}-й перцентиль ВОЗ"
+        lines.append(line)
+    if birth_ts is None or not sex:
+        lines.append("\nℹ️ Перцентили появятся, когда будут указаны дата рождения и пол малыша.")
+    await event.respond("\n".join(lines))
+
+# Вечерняя сводка: что и сколько раз делали за день
+DIGEST_TYPES = ((storage.FEEDING, "🍼", "Кормления"), (storage.DIAPER, "🧷", "Подгузники"), (storage.BATH, "🛁", "Купания"))
+DIGEST_CHECK_MINUTES = 1
+
+def render_digest(rows, day):
+    """Текст сводки по строкам storage.get_digest_stats одной семьи"""
+    totals = {}
+    authors = {}
+    for _, event_type, count, first_ts, last_ts, max_gap, role, name, author_count in rows:
+        totals[event_type] = (count, first_ts, last_ts, max_gap)
+        author = f"{role} {name}" if role and name else "Неизвестно"
+        counts = authors.setdefault(author, {})
+        counts[event_type] = counts.get(event_type, 0) + author_count
+
+    lines = [f"📋 **Итоги дня** ({day.strftime('%d.%m')})\n"]
+    if not totals:
+        lines.append("Сегодня записей не было.")
+        return "\n".join(lines)
+    for event_type, icon, label in DIGEST_TYPES:
+        count, first_ts, last_ts, max_gap = totals.get(event_type, (0, 0.0, 0.0, 0.0))
+        lines.append(f"{icon} {label}: {count}")
+        if count > 1 and event_type != storage.BATH:
+            lines.append(f"   ⏱ В среднем раз в {format_duration((last_ts - first_ts) / (count - 1))}, "
+                         f"самый долгий перерыв {format_duration(max_gap)}")
+    lines.append("\n👥 **Кто что делал:**")
+    for author, counts in authors.items():
+        done = ", ".join(f"{icon} {counts[event_type]}" for event_type, icon, _ in DIGEST_TYPES if event_type in counts)
+        lines.append(f"• {author}: {done}")
+    return "\n".join(lines)
+
+def build_digests(family_ids, now):
+    """Сводки за сегодня для нескольких семей: {family_id: текст}.
+
+    Текст хранится в кэше storage до следующей записи события семьи, а итоги
+    остальных семей читаются одним запросом из daily_rollup.
+    """
+    day = now.date().isoformat()
+    texts = {}
+    missing = []
+    for family_id in family_ids:
+        cached = storage.get_cached(('digest', family_id))
+        if cached and cached[0] == day:
+            texts[family_id] = cached[1]
+        else:
+            missing.append(family_id)
+
+    rows = {}
+    for row in storage.get_digest_stats(missing, now.date()):
+        rows.setdefault(row[0], []).append(row)
+    for family_id in missing:
+        texts[family_id] = render_digest(rows.get(family_id, ()), now)
+        storage.put_cached(('digest', family_id), (day, texts[family_id]))
+    return texts
+
+@on(events.NewMessage(pattern=r'^/digest(?:@\w+)?$'))
+@metrics.track_handler('digest_command')
+async def digest_command(event):
+    """Показать сводку за сегодня"""
+    fid = get_family_id(event.sender_id)
+    if not fid:
+        await event.respond("❗ Сначала создайте семью или присоединитесь к существующей в ⚙ Настройках.")
+        return
+    await event.respond(build_digests([fid], get_thai_time())[fid])
+
+@on(events.NewMessage(pattern=r'^/export(?:@\w+)?(?:\s+(\S+))?$'))
+@metrics.track_handler('export_command')
+async def export_command(event):
+    """Выгрузить историю семьи файлом: /export (CSV) или /export jsonl"""
+    fid = get_family_id(event.sender_id)
+    if not fid:
+        await event.respond("❗ Сначала создайте семью или присоединитесь к существующей в ⚙ Настройках.")
+        return
+    fmt = (event.pattern_match.group(1) or 'csv').lower()
+    if fmt not in export.FORMATS:
+        await event.respond("ℹ️ Формат выгрузки: /export csv или /export jsonl")
+        return
+
+    workdir = tempfile.mkdtemp(prefix='babybot-export-')
+    path = os.path.join(workdir, export.filename(fid, fmt))
+    try:
+        # Файл пишется кусками на диск в пуле потоков — ни память, ни event loop не ждут всю историю
+        loop = asyncio.get_running_loop()
+        size = await loop.run_in_executor(None, export.write_export, fid, fmt, path)
+        await send_file(event.chat_id, path, force_document=True,
+                        caption=f"📦 Выгрузка истории семьи ({max(size // 1024, 1)} КБ)")
+        logger.info("📦 Выгрузка семьи %s (%s, %d байт) отправлена пользователю %s", fid, fmt, size, event.sender_id)
+    except Exception as e:
+        logger.error("❌ Ошибка выгрузки для семьи %s: %s", fid, e)
+        await event.respond("❌ Не удалось подготовить выгрузку, попробуйте позже.")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+@on(events.NewMessage(pattern='⏰ Когда ел?'))
+@metrics.track_handler('last_feed')
 async def last_feed(event):
     time = get_last_feeding_time(event.sender_id)
     if time:
-        delta = datetime.now() - time
+        delta = get_thai_time() - time
         h, m = divmod(int(delta.total_seconds() // 60), 60)
         await event.respond(f"🍼 Последнее кормление было {h}ч {m}м назад.")
     else:
         await event.respond("❌ Пока нет записей о кормлении.")
 
-@client.on(events.NewMessage(pattern='💡 Совет'))
+@on(events.NewMessage(pattern='💡 Совет'))
+@metrics.track_handler('tip_command')
 async def tip_command(event):
     tip = get_random_tip()
     await event.respond(tip)
 
-@client.on(events.NewMessage(pattern='ℹ️ Как это работает'))
+@on(events.NewMessage(pattern='ℹ️ Как это работает'))
+@metrics.track_handler('how_it_works')
 async def how_it_works(event):
     """Показать инструкцию по использованию бота"""
     message = (
@@ -764,10 +703,11 @@ async def how_it_works(event):
         f"📊 **История и статистика:**\n"
         f"• Просматривайте записи по дням\n"
         f"• Анализируйте тенденции\n"
+        f"• Выгружайте всю историю файлом: /export\n"
         f"• Планируйте уход\n\n"
         f"⚙️ **Настройки:**\n"
         f"• Интервалы кормления и смен\n"
-        f"• Время рассылки советов\n"
+        f"• Время рассылки советов и сводки за день (/digest)\n"
         f"• Управление семьей\n\n"
         f"🚀 **Начните с создания семьи в настройках!**"
     )
@@ -778,7 +718,8 @@ async def how_it_works(event):
     
     await event.respond(message, buttons=buttons)
 
-@client.on(events.NewMessage(pattern='👤 Моя роль'))
+@on(events.NewMessage(pattern='👤 Моя роль'))
+@metrics.track_handler('my_role_command')
 async def my_role_command(event):
     """Показать и изменить роль пользователя"""
     uid = event.sender_id
@@ -806,7 +747,8 @@ async def my_role_command(event):
 
 
 
-@client.on(events.NewMessage(pattern='⚙ Настройки'))
+@on(events.NewMessage(pattern='⚙ Настройки'))
+@metrics.track_handler('settings_menu')
 async def settings_menu(event):
     fid = get_family_id(event.sender_id)
     if not fid:
@@ -822,6 +764,14 @@ async def settings_menu(event):
     tips_on = is_tips_enabled(fid)
     tips_label = "🔕 Отключить советы" if tips_on else "🔔 Включить советы"
     tips_hour, tips_minute = get_tips_time(fid)
+    settings = get_settings(fid)
+    adaptive_label = ("🧠 Адаптивный интервал: вкл" if settings and settings['adaptive_feeding']
+                      else "🧠 Адаптивный интервал: выкл")
+    digest_label = ("📋 Сводка за день: вкл" if settings and settings['digest_enabled']
+                    else "📋 Сводка за день: выкл")
+    digest_hour, digest_minute = (settings['digest_time_hour'], settings['digest_time_minute']) if settings else (21, 0)
+    anomaly_label = ("🔎 Сводка аномалий: выкл" if settings and not settings['anomaly_alerts']
+                     else "🔎 Сводка аномалий: вкл")
     
     # Получаем настройки купания
     bath_interval, bath_hour, bath_minute, bath_enabled = get_bath_settings(fid)
@@ -830,11 +780,15 @@ async def settings_menu(event):
     buttons = [
         [Button.inline(f"🍽 Интервал кормления: {feed_i}ч", b"set_feed")],
         [Button.inline(f"🧷 Интервал подгузника: {diaper_i}ч", b"set_diaper")],
+        [Button.inline(adaptive_label, b"toggle_adaptive_feeding")],
         [Button.inline(f"🛁 Интервал купания: {bath_interval}д", b"set_bath_interval")],
         [Button.inline(f"🕐 Время купания: {bath_hour:02d}:{bath_minute:02d}", b"set_bath_time")],
         [Button.inline(bath_label, b"toggle_bath")],
         [Button.inline(tips_label, b"toggle_tips")],
         [Button.inline(f"🕐 Время советов: {tips_hour:02d}:{tips_minute:02d}", b"set_tips_time")],
+        [Button.inline(digest_label, b"toggle_digest")],
+        [Button.inline(f"🕐 Время сводки: {digest_hour:02d}:{digest_minute:02d}", b"set_digest_time")],
+        [Button.inline(anomaly_label, b"toggle_anomaly_alerts")],
         [Button.inline("👤 Моя роль", b"my_role")],
         [Button.inline("👨‍👩‍👧 Управление семьей", b"family_management")]
     ]
@@ -848,7 +802,7 @@ async def family_management_cmd(event):
     uid = event.sender_id
     fid = get_family_id(uid)
     
-    print(f"DEBUG: family_management_cmd для пользователя {uid}, family_id: {fid}")
+    logger.debug("family_management_cmd для пользователя %s, family_id: %s", uid, fid)
     
     if fid:
         code = invite_code_for(fid)
@@ -865,7 +819,7 @@ async def family_management_cmd(event):
         )
     else:
         # Пользователь не в семье - показываем опции
-        print(f"DEBUG: Пользователь {uid} не в семье, показываем опции присоединения")
+        logger.debug("Пользователь %s не в семье, показываем опции присоединения", uid)
         buttons = [
             [Button.inline("👨‍👩‍👧 Создать семью", b"create_family")],
             [Button.inline("🔗 Присоединиться к семье", b"join_family")],
@@ -880,12 +834,8 @@ async def family_management_cmd(event):
 async def family_members_cmd(event):
     fid = get_family_id(event.sender_id)
     if fid:
-        conn = sqlite3.connect("babybot.db")
-        cur = conn.cursor()
         # Получаем user_id, role и name для всех членов семьи
-        cur.execute("SELECT user_id, role, name FROM family_members WHERE family_id = ?", (fid,))
-        members = cur.fetchall()
-        conn.close()
+        members = get_family_members_with_roles(fid)
         
         if members:
             text = "👥 **Члены семьи:**\n\n"
@@ -903,16 +853,19 @@ async def family_members_cmd(event):
 
 
 
-@client.on(events.NewMessage(pattern='📜 История'))
+@on(events.NewMessage(pattern='📜 История'))
+@metrics.track_handler('history_menu')
 async def history_menu(event):
-    print(f"DEBUG: Обработка команды '📜 История' для пользователя {event.sender_id}")
-    today = get_thai_date()
-    buttons = [
-        [Button.inline(f"📅 {today - timedelta(days=i)}", f"hist_{i}".encode())] for i in range(3)
-    ]
-    await event.respond("📖 Выберите день для просмотра истории:", buttons=buttons)
+    logger.debug("Обработка команды '📜 История' для пользователя %s", event.sender_id)
+    family_id = get_family_id(event.sender_id)
+    if not family_id:
+        await event.respond("❗ Сначала создайте семью или присоединитесь к существующей в ⚙ Настройках.")
+        return
+    text, buttons = history_day_view(family_id, get_thai_date())
+    await event.respond(text, buttons=buttons)
 
-@client.on(events.NewMessage(pattern='🍼 Статус кормления'))
+@on(events.NewMessage(pattern='🍼 Статус кормления'))
+@metrics.track_handler('feeding_status')
 async def feeding_status(event):
     """Показать текущий статус кормления"""
     uid = event.sender_id
@@ -922,12 +875,10 @@ async def feeding_status(event):
         await event.respond("❌ Сначала создайте семью.")
         return
     
-    # Получаем интервал кормления
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    cur.execute("SELECT feed_interval FROM settings WHERE family_id = ?", (fid,))
-    interval_result = cur.fetchone()
-    feed_interval = interval_result[0] if interval_result else 3
+    # Получаем интервал кормления (фиксированный или адаптивный)
+    settings = get_settings(fid)
+    feed_interval = get_feed_interval(fid, settings) if settings else get_user_intervals(fid)[0]
+    interval_note = " (адаптивный)" if settings and settings['adaptive_feeding'] else ""
     
     # Получаем время последнего кормления
     last_feeding = get_last_feeding_time_for_family(fid)
@@ -955,12 +906,13 @@ async def feeding_status(event):
             f"{status_emoji} **Статус кормления**\n\n"
             f"⏰ Последнее кормление: {last_feeding.strftime('%H:%M')}\n"
             f"🕐 Прошло: {hours_since_last:.1f} ч. ({minutes_since_last:.0f} мин.)\n"
-            f"🔄 Интервал: {feed_interval} ч.\n"
+            f"🔄 Интервал: {feed_interval} ч.{interval_note}\n"
             f"📊 Статус: {status}\n"
         )
         
         if remaining > 0:
-            message += f"⏳ До следующего кормления: {remaining:.1f} ч."
+            next_feeding = last_feeding + timedelta(hours=feed_interval)
+            message += f"⏳ До следующего кормления: {remaining:.1f} ч. (≈ {next_feeding.strftime('%H:%M')})"
         else:
             message += f"💡 Рекомендуется покормить сейчас!"
     else:
@@ -971,8 +923,6 @@ async def feeding_status(event):
             f"💡 Запишите первое кормление!"
         )
     
-    conn.close()
-    
     # Добавляем кнопки для быстрых действий
     buttons = [
         [Button.inline("🍼 Кормить сейчас", b"feed_now")],
@@ -981,7 +931,8 @@ async def feeding_status(event):
     
     await event.respond(message, buttons=buttons)
 
-@client.on(events.CallbackQuery)
+@on(events.CallbackQuery)
+@metrics.track_handler('callback', kind='callback')
 async def callback_handler(event):
     data = event.data.decode()
 
@@ -1007,6 +958,13 @@ async def callback_handler(event):
     elif data == "diaper_30":
         add_diaper_change(event.sender_id, 30)
         await event.edit("🧷 Смена подгузника (30 мин назад) зафиксирована.")
+    elif data in ("bath_now", "bath_30", "bath_60"):
+        minutes_ago = 0 if data == "bath_now" else int(data.split("_")[1])
+        add_bath(event.sender_id, minutes_ago)
+        fid = get_family_id(event.sender_id)
+        bath_interval = get_bath_settings(fid)[0]
+        next_bath = (get_thai_time() - timedelta(minutes=minutes_ago)).date() + timedelta(days=bath_interval)
+        await event.edit(f"🛁 Купание зафиксировано. Следующее напоминание — {next_bath.strftime('%d.%m')}.")
     elif data == "diaper_manual":
         manual_feeding_pending[event.sender_id] = "diaper"
         await event.respond("🕒 Введите время смены подгузника в формате ЧЧ:ММ (например, 14:30):")
@@ -1021,13 +979,13 @@ async def callback_handler(event):
         minutes_ago = int(data.split("_")[-1])
         uid = event.sender_id
         
-        print(f"DEBUG: Обработка feed_yesterday_ для пользователя {uid}")
-        print(f"DEBUG: manual_feeding_pending[{uid}] = {manual_feeding_pending.get(uid, 'не найдено')}")
+        logger.debug("Обработка feed_yesterday_ для пользователя %s", uid)
+        logger.debug("manual_feeding_pending[%s] = %s", uid, manual_feeding_pending.get(uid, 'не найдено'))
         
         if uid in manual_feeding_pending and isinstance(manual_feeding_pending[uid], dict):
             time_str = manual_feeding_pending[uid]["time"]
             add_feeding(uid, minutes_ago=minutes_ago)
-            yesterday = (datetime.now() - timedelta(days=1)).strftime('%d.%m')
+            yesterday = (get_thai_date() - timedelta(days=1)).strftime('%d.%m')
             await event.edit(f"✅ Кормление за вчера ({yesterday}) в {time_str} зафиксировано.")
             del manual_feeding_pending[uid]
         else:
@@ -1037,13 +995,13 @@ async def callback_handler(event):
         minutes_ago = int(data.split("_")[-1])
         uid = event.sender_id
         
-        print(f"DEBUG: Обработка diaper_yesterday_ для пользователя {uid}")
-        print(f"DEBUG: manual_feeding_pending[{uid}] = {manual_feeding_pending.get(uid, 'не найдено')}")
+        logger.debug("Обработка diaper_yesterday_ для пользователя %s", uid)
+        logger.debug("manual_feeding_pending[%s] = %s", uid, manual_feeding_pending.get(uid, 'не найдено'))
         
         if uid in manual_feeding_pending and isinstance(manual_feeding_pending[uid], dict):
             time_str = manual_feeding_pending[uid]["time"]
             add_diaper_change(uid, minutes_ago=minutes_ago)
-            yesterday = (datetime.now() - timedelta(days=1)).strftime('%d.%m')
+            yesterday = (get_thai_date() - timedelta(days=1)).strftime('%d.%m')
             await event.edit(f"✅ Смена подгузника за вчера ({yesterday}) в {time_str} зафиксирована.")
             del manual_feeding_pending[uid]
         else:
@@ -1059,10 +1017,22 @@ async def callback_handler(event):
         fid = get_family_id(event.sender_id)
         set_user_interval(fid, diaper_interval=hours)
         await event.edit(f"✅ Интервал смены подгузника установлен на {hours} ч.")
+    elif data == "toggle_adaptive_feeding":
+        fid = get_family_id(event.sender_id)
+        storage.toggle_adaptive_feeding(fid)
+        await settings_menu(event)
     elif data == "toggle_tips":
         fid = get_family_id(event.sender_id)
         toggle_tips(fid)
         await settings_menu(event)
+    elif data == "toggle_digest":
+        fid = get_family_id(event.sender_id)
+        storage.toggle_digest(fid)
+        await settings_menu(event)
+    elif data == "toggle_anomaly_alerts":
+        fid = get_family_id(event.sender_id)
+        storage.toggle_anomaly_alerts(fid)
+        await settings_menu(event)
     
     elif data == "my_role":
         uid = event.sender_id
@@ -1143,6 +1113,29 @@ async def callback_handler(event):
         await asyncio.sleep(2)
         await settings_menu(event)
     
+    elif data == "set_digest_time":
+        # Сводка подводит итоги дня — предлагаем вечерние часы
+        buttons = [[Button.inline(f"{hour:02d}:00", f"digest_hour_{hour}".encode())] for hour in range(18, 24)]
+        buttons.append([Button.inline("🔙 Назад", b"back_to_settings")])
+        await event.edit("🕐 Выберите час для сводки за день:", buttons=buttons)
+
+    elif data.startswith("digest_hour_"):
+        hour = int(data.split("_")[-1])
+        buttons = [[Button.inline(f"{hour:02d}:{minute:02d}", f"digest_time_{hour}_{minute}".encode())]
+                   for minute in range(0, 60, 15)]
+        buttons.append([Button.inline("🔙 Назад", b"set_digest_time")])
+        await event.edit(f"🕐 Выберите минуту для времени {hour:02d}:XX:", buttons=buttons)
+
+    elif data.startswith("digest_time_"):
+        parts = data.split("_")
+        hour = int(parts[-2])
+        minute = int(parts[-1])
+        fid = get_family_id(event.sender_id)
+        storage.set_digest_time(fid, hour, minute)
+        await event.edit(f"✅ Время сводки за день установлено на {hour:02d}:{minute:02d}")
+        await asyncio.sleep(2)
+        await settings_menu(event)
+
     elif data == "set_bath_interval":
         buttons = [[Button.inline(f"{i} д", f"bath_interval_{i}".encode())] for i in range(1, 8)]
         await event.edit("🛁 Выберите интервал купания:", buttons=buttons)
@@ -1192,86 +1185,50 @@ async def callback_handler(event):
     
 
     
-    elif data.startswith("hist_"):
-        print(f"DEBUG: Обработка истории для пользователя {event.sender_id}, data: {data}")
+    elif data.startswith(("hist_", "histd_", "histw_", "histn_", "histp_")):
+        logger.debug("Обработка истории для пользователя %s, data: %s", event.sender_id, data)
+        family_id = get_family_id(event.sender_id)
+        if not family_id:
+            await event.answer("❗ Сначала создайте семью или присоединитесь к существующей", alert=True)
+            return
         try:
-            index = int(data.split("_")[1])
-            target_date = get_thai_date() - timedelta(days=index)
-            print(f"DEBUG: Целевая дата: {target_date}")
-            
-            feedings = get_feedings_by_day(event.sender_id, target_date)
-            diapers = get_diapers_by_day(event.sender_id, target_date)
-            
-            print(f"DEBUG: Найдено кормлений: {len(feedings) if feedings else 0}")
-            print(f"DEBUG: Найдено смен подгузников: {len(diapers) if diapers else 0}")
-            
-            if feedings:
-                print(f"DEBUG: Первое кормление: {feedings[0]}")
-                print(f"DEBUG: Количество колонок в кормлении: {len(feedings[0])}")
-                print(f"DEBUG: Структура кормления: id={feedings[0][0]}, time={feedings[0][1]}, role={feedings[0][2] if len(feedings[0]) > 2 else 'N/A'}, name={feedings[0][3] if len(feedings[0]) > 3 else 'N/A'}")
-            if diapers:
-                print(f"DEBUG: Первая смена: {diapers[0]}")
-                print(f"DEBUG: Количество колонок в смене: {len(diapers[0])}")
-                print(f"DEBUG: Структура смены: id={diapers[0][0]}, time={diapers[0][1]}, role={diapers[0][2] if len(diapers[0]) > 2 else 'N/A'}, name={diapers[0][3] if len(diapers[0]) > 3 else 'N/A'}")
+            kind, *args = data.split("_")
+            if kind == "hist":
+                # Кнопки старого меню: hist_<сколько дней назад>
+                text, buttons = history_day_view(family_id, get_thai_date() - timedelta(days=int(args[0])))
+            elif kind == "histw":
+                text, buttons = history_week_view(family_id, datetime.strptime(args[0], "%Y%m%d").date())
+            elif kind == "histd":
+                text, buttons = history_day_view(family_id, datetime.strptime(args[0], "%Y%m%d").date())
+            else:
+                # Страница до (histp) или после (histn) записи с этим id — в её сутках
+                cursor = storage.get_event_cursor(int(args[0]), family_id)
+                if cursor is None:
+                    await event.answer("❌ Запись не найдена, откройте историю заново", alert=True)
+                    return
+                text, buttons = history_day_view(family_id, clock.from_timestamp(cursor[0]).date(),
+                                                 cursor, backward=kind == "histp")
         except Exception as e:
-            print(f"DEBUG: Ошибка при обработке истории: {e}")
+            logger.exception("❌ Ошибка при обработке истории: %s", e)
             await event.answer(f"❌ Ошибка: {str(e)}", alert=True)
             return
-
-        text = f"📅 История за {target_date}:\n\n"
-
-        if feedings:
-            text += "🍼 Кормления:\n"
-            for f in feedings:
-                time_str = datetime.fromisoformat(f[1]).strftime("%H:%M")
-                # Проверяем, есть ли информация об авторе (индексы 2 и 3)
-                if len(f) >= 4 and f[2] and f[3]:  # author_role и author_name
-                    author_info = f"{f[2]} {f[3]}"
-                else:
-                    author_info = "Неизвестно"
-                text += f"  • {time_str} - {author_info} [ID {f[0]}]\n"
-        else:
-            text += "🍼 Кормлений нет\n"
-
-        if diapers:
-            text += "\n🧷 Подгузники:\n"
-            for d in diapers:
-                time_str = datetime.fromisoformat(d[1]).strftime("%H:%M")
-                # Проверяем, есть ли информация об авторе (индексы 2 и 3)
-                if len(d) >= 4 and d[2] and d[3]:  # author_role и author_name
-                    author_info = f"{d[2]} {d[3]}"
-                else:
-                    author_info = "Неизвестно"
-                text += f"  • {time_str} - {author_info} [ID {d[0]}]\n"
-        else:
-            text += "\n🧷 Смен нет\n"
-
-        # Кнопки удаления и редактирования
-        buttons = []
-        for f in feedings:
-            buttons.append([Button.inline(f"🍼 {f[0]} ✏️", f"edit_feed_{f[0]}".encode()),
-                            Button.inline("🗑", f"del_feed_{f[0]}".encode())])
-        for d in diapers:
-            buttons.append([Button.inline(f"🧷 {d[0]} ✏️", f"edit_diaper_{d[0]}".encode()),
-                            Button.inline("🗑", f"del_diaper_{d[0]}".encode())])
-
-        # Проверяем, есть ли кнопки
-        if buttons:
-            await event.edit(text, buttons=buttons)
-        else:
-            # Если кнопок нет, просто обновляем текст
-            await event.edit(text)
+        await event.edit(text, buttons=buttons)
         return
 
     elif data.startswith("del_feed_"):
         entry_id = int(data.split("_")[-1])
-        delete_entry("feedings", entry_id)
-        await event.answer("🗑 Удалено", alert=True)
+        # Удалить можно только запись своей семьи
+        if delete_entry("feedings", entry_id, get_family_id(event.sender_id)):
+            await event.answer("🗑 Удалено", alert=True)
+        else:
+            await event.answer("❌ Запись не найдена", alert=True)
 
     elif data.startswith("del_diaper_"):
         entry_id = int(data.split("_")[-1])
-        delete_entry("diapers", entry_id)
-        await event.answer("🗑 Удалено", alert=True)
+        if delete_entry("diapers", entry_id, get_family_id(event.sender_id)):
+            await event.answer("🗑 Удалено", alert=True)
+        else:
+            await event.answer("❌ Запись не найдена", alert=True)
 
     elif data.startswith("edit_feed_") or data.startswith("edit_diaper_"):
         entry_id = int(data.split("_")[-1])
@@ -1314,7 +1271,8 @@ async def callback_handler(event):
             del manual_feeding_pending[uid]
         await event.edit("❌ Запись смены подгузника отменена.")
 
-@client.on(events.NewMessage)
+@on(events.NewMessage)
+@metrics.track_handler('handle_text')
 async def handle_text(event):
     uid = event.sender_id
 
@@ -1324,13 +1282,13 @@ async def handle_text(event):
         
         # Проверяем, что это за действие
         if action_type == "diaper":
-            print(f"DEBUG: Пользователь {uid} ввел время для смены подгузника: '{user_input}'")
+            logger.debug("Пользователь %s ввел время для смены подгузника: '%s'", uid, user_input)
             action_name = "смена подгузника"
             add_func = add_diaper_change
             callback_prefix = "diaper_yesterday_"
             cancel_callback = "diaper_cancel"
         else:
-            print(f"DEBUG: Пользователь {uid} ввел время для кормления: '{user_input}'")
+            logger.debug("Пользователь %s ввел время для кормления: '%s'", uid, user_input)
             action_name = "кормление"
             add_func = add_feeding
             callback_prefix = "feed_yesterday_"
@@ -1339,27 +1297,27 @@ async def handle_text(event):
         try:
             # Парсим введенное время
             t = datetime.strptime(user_input, "%H:%M")
-            print(f"DEBUG: Парсинг времени успешен: {t}")
+            logger.debug("Парсинг времени успешен: %s", t)
             
             # Создаем datetime объект для сегодняшнего дня с введенным временем (в тайском времени)
             today = get_thai_date()
             # Создаем datetime объект с тайским часовым поясом
-            thai_tz = pytz.timezone('Asia/Bangkok')
+            thai_tz = clock.THAI_TZ
             dt = thai_tz.localize(datetime.combine(today, t.time()))
             now = get_thai_time()
             
-            print(f"DEBUG: Сегодня (Таиланд): {today}")
-            print(f"DEBUG: Введенное время: {dt}")
-            print(f"DEBUG: Текущее время (Таиланд): {now}")
-            print(f"DEBUG: UTC время: {datetime.now(pytz.UTC)}")
+            logger.debug("Сегодня (Таиланд): %s", today)
+            logger.debug("Введенное время: %s", dt)
+            logger.debug("Текущее время (Таиланд): %s", now)
+            logger.debug("UTC время: %s", now.astimezone(pytz.UTC))
             
             # Вычисляем разницу в минутах
             diff = int((now - dt).total_seconds() // 60)
-            print(f"DEBUG: Разница в минутах: {diff}")
+            logger.debug("Разница в минутах: %s", diff)
             
             # Проверяем, что время не в будущем и не слишком далеко в прошлом
             if diff < 0:
-                print(f"DEBUG: Время в будущем, разница: {diff}")
+                logger.debug("Время в будущем, разница: %s", diff)
                 # Предлагаем сделать запись за прошлый день
                 yesterday = today - timedelta(days=1)
                 yesterday_dt = thai_tz.localize(datetime.combine(yesterday, t.time()))
@@ -1377,20 +1335,20 @@ async def handle_text(event):
                         buttons=buttons)
                     # Сохраняем введенное время для возможного использования
                     manual_feeding_pending[uid] = {"type": action_type, "time": user_input, "minutes_ago": yesterday_diff}
-                    print(f"DEBUG: Сохранили данные в manual_feeding_pending[{uid}] = {manual_feeding_pending[uid]}")
+                    logger.debug("Сохранили данные в manual_feeding_pending[%s] = %s", uid, manual_feeding_pending[uid])
                     return
                 else:
                     await event.respond("❌ Нельзя указать время в будущем. Введите прошедшее время.")
                     return
             elif diff > 1440:  # больше 24 часов
-                print(f"DEBUG: Время слишком далеко в прошлом, разница: {diff}")
+                logger.debug("Время слишком далеко в прошлом, разница: %s", diff)
                 # Проверяем, может ли это быть время за вчера
                 yesterday = today - timedelta(days=1)
                 yesterday_dt = thai_tz.localize(datetime.combine(yesterday, t.time()))
                 yesterday_diff = int((now - yesterday_dt).total_seconds() // 60)
                 
                 if yesterday_diff >= 0 and yesterday_diff <= 1440:
-                    print(f"DEBUG: Время подходит для вчерашнего дня, разница: {yesterday_diff}")
+                    logger.debug("Время подходит для вчерашнего дня, разница: %s", yesterday_diff)
                     # Автоматически предлагаем записать за вчера
                     buttons = [
                         [Button.inline("✅ Да, за вчера", f"{callback_prefix}{yesterday_diff}".encode())],
@@ -1401,7 +1359,7 @@ async def handle_text(event):
                         f"Хотите сделать запись {action_name} за вчера ({yesterday.strftime('%d.%m')})?",
                         buttons=buttons)
                     manual_feeding_pending[uid] = {"type": action_type, "time": user_input, "minutes_ago": yesterday_diff}
-                    print(f"DEBUG: Сохранили данные в manual_feeding_pending[{uid}] = {manual_feeding_pending[uid]}")
+                    logger.debug("Сохранили данные в manual_feeding_pending[%s] = %s", uid, manual_feeding_pending[uid])
                     return
                 else:
                     await event.respond("❌ Время слишком далеко в прошлом. Максимум 24 часа назад.")
@@ -1409,7 +1367,7 @@ async def handle_text(event):
             
             # Если время в прошлом, но не слишком далеко
             if diff >= 0:
-                print(f"DEBUG: Добавляем {action_name}, minutes_ago: {diff}")
+                logger.debug("Добавляем %s, minutes_ago: %s", action_name, diff)
                 add_func(uid, minutes_ago=diff)
                 await event.respond(f"✅ {action_name.capitalize()} в {user_input} зафиксировано.")
             else:
@@ -1419,13 +1377,13 @@ async def handle_text(event):
             if uid in manual_feeding_pending:
                 del manual_feeding_pending[uid]
         except ValueError as e:
-            print(f"DEBUG: Ошибка парсинга времени: {e}")
+            logger.debug("Ошибка парсинга времени: %s", e)
             await event.respond("❌ Неверный формат. Введите время в формате ЧЧ:ММ (например: 14:30)")
             # Удаляем данные при ошибке парсинга
             if uid in manual_feeding_pending:
                 del manual_feeding_pending[uid]
         except Exception as e:
-            print(f"DEBUG: Неожиданная ошибка: {e}")
+            logger.exception("❌ Неожиданная ошибка: %s", e)
             await event.respond(f"❌ Ошибка: {str(e)}")
             # Удаляем данные при неожиданной ошибке
             if uid in manual_feeding_pending:
@@ -1451,6 +1409,28 @@ async def handle_text(event):
             await event.respond(f"❌ Не удалось присоединиться к семье: {family_name}")
         return
     
+    if uid in edit_pending:
+        table, entry_id = edit_pending.pop(uid)
+        fid = get_family_id(uid)
+        try:
+            t = datetime.strptime(event.raw_text.strip(), "%H:%M")
+        except ValueError:
+            await event.respond("❌ Неверный формат. Введите время в формате ЧЧ:ММ (например: 14:30)")
+            return
+        # День записи сохраняется, меняется только время
+        old_time = storage.get_event_time(table, entry_id, fid) if fid else None
+        if old_time is None:
+            await event.respond("❌ Запись не найдена")
+            return
+        new_time = clock.THAI_TZ.localize(datetime.combine(old_time.date(), t.time()))
+        if new_time > get_thai_time():
+            await event.respond("❌ Нельзя указать время в будущем. Введите прошедшее время.")
+            return
+        storage.update_event_time(table, entry_id, new_time, fid)
+        await event.respond(f"✅ Время записи ID {entry_id} изменено: "
+                            f"{old_time.strftime('%H:%M')} → {new_time.strftime('%H:%M')}")
+        return
+    
     if uid in edit_role_pending:
         user_input = event.raw_text.strip()
         role_data = edit_role_pending[uid]
@@ -1470,51 +1450,15 @@ async def handle_text(event):
 
 
 
-def get_last_feeding_time_for_family(family_id):
-    """Получить время последнего кормления для семьи"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    
-    # Получаем всех членов семьи
-    cur.execute("SELECT user_id FROM family_members WHERE family_id = ?", (family_id,))
-    members = cur.fetchall()
-    
-    if not members:
-        conn.close()
-        return None
-    
-    # Получаем последнее кормление среди всех членов семьи
-    member_ids = [str(member[0]) for member in members]
-    placeholders = ','.join(['?' for _ in member_ids])
-    
-    cur.execute(f"""
-        SELECT timestamp FROM feedings 
-        WHERE family_id = ? 
-        ORDER BY timestamp DESC 
-        LIMIT 1
-    """, (family_id,))
-    
-    result = cur.fetchone()
-    conn.close()
-    
-    if result:
-        return datetime.fromisoformat(result[0])
-    return None
-
 def should_send_feeding_reminder(family_id):
     """Проверить, нужно ли отправить напоминание о кормлении"""
-    conn = sqlite3.connect("babybot.db")
-    cur = conn.cursor()
-    
     # Получаем интервал кормления для семьи
-    cur.execute("SELECT feed_interval FROM settings WHERE family_id = ?", (family_id,))
-    result = cur.fetchone()
+    settings = get_settings(family_id)
     
-    if not result:
-        conn.close()
+    if not settings:
         return False
     
-    feed_interval = result[0]  # в часах
+    feed_interval = get_feed_interval(family_id, settings)  # в часах
     last_feeding = get_last_feeding_time_for_family(family_id)
     
     if not last_feeding:
@@ -1522,41 +1466,35 @@ def should_send_feeding_reminder(family_id):
         return True
     
     # Вычисляем, сколько времени прошло с последнего кормления
-    time_since_last = datetime.now() - last_feeding
+    time_since_last = get_thai_time() - last_feeding
     hours_since_last = time_since_last.total_seconds() / 3600
     
     # Если прошло больше интервала + 30 минут (буфер), отправляем напоминание
     return hours_since_last >= (feed_interval + 0.5)
-    
-    conn.close()
 
-@scheduler.scheduled_job('interval', minutes=30)
+@scheduled_job('interval', minutes=30)
+@metrics.track_job
 async def check_feeding_reminders():
     """Проверять каждые 30 минут, нужно ли отправить напоминания о кормлении"""
     try:
-        conn = sqlite3.connect("babybot.db")
-        cur = conn.cursor()
-        
         # Получаем все семьи с включенными уведомлениями
-        cur.execute("SELECT family_id FROM settings WHERE tips_enabled = 1")
-        families = cur.fetchall()
+        families = get_all_settings('tips_enabled')
+        metrics.JOB_FAMILIES.inc(len(families), job='check_feeding_reminders')
         
-        for (family_id,) in families:
+        for settings in families:
+            family_id = settings['family_id']
             if should_send_feeding_reminder(family_id):
                 # Получаем всех членов семьи
-                cur.execute("SELECT user_id FROM family_members WHERE family_id = ?", (family_id,))
-                members = cur.fetchall()
+                members = get_family_member_ids(family_id)
                 
                 # Получаем интервал кормления
-                cur.execute("SELECT feed_interval FROM settings WHERE family_id = ?", (family_id,))
-                interval_result = cur.fetchone()
-                feed_interval = interval_result[0] if interval_result else 3
+                feed_interval = get_feed_interval(family_id, settings)
                 
                 # Получаем время последнего кормления
                 last_feeding = get_last_feeding_time_for_family(family_id)
                 
                 if last_feeding:
-                    time_since_last = datetime.now() - last_feeding
+                    time_since_last = get_thai_time() - last_feeding
                     hours_since_last = time_since_last.total_seconds() / 3600
                     message = (
                         f"🍼 **Напоминание о кормлении!**\n\n"
@@ -1574,69 +1512,60 @@ async def check_feeding_reminders():
                     )
                 
                 # Отправляем уведомление всем членам семьи
-                for (user_id,) in members:
+                for user_id in members:
                     try:
-                        await client.send_message(user_id, message)
-                        print(f"✅ Отправлено напоминание о кормлении пользователю {user_id}")
+                        await send_message(user_id, message)
+                        logger.info("✅ Отправлено напоминание о кормлении пользователю %s", user_id)
                     except Exception as e:
-                        print(f"❌ Ошибка отправки напоминания пользователю {user_id}: {e}")
-        
-        conn.close()
+                        logger.error("❌ Ошибка отправки напоминания пользователю %s: %s", user_id, e)
     except Exception as e:
-        print(f"❌ Ошибка в check_feeding_reminders: {e}")
+        logger.error("❌ Ошибка в check_feeding_reminders: %s", e)
 
-@scheduler.scheduled_job('interval', minutes=1)
+@scheduled_job('interval', minutes=1)
+@metrics.track_job
 async def send_scheduled_tips():
     """Отправлять советы по расписанию для каждой семьи"""
     try:
-        current_time = datetime.now()
+        current_time = get_thai_time()
         current_hour = current_time.hour
         current_minute = current_time.minute
         
-        conn = sqlite3.connect("babybot.db")
-        cur = conn.cursor()
-        
         # Получаем все семьи с включенными советами
-        cur.execute("SELECT family_id, tips_time_hour, tips_time_minute FROM settings WHERE tips_enabled = 1")
-        families = cur.fetchall()
+        families = get_all_settings('tips_enabled')
+        metrics.JOB_FAMILIES.inc(len(families), job='send_scheduled_tips')
         
-        for (family_id, tips_hour, tips_minute) in families:
+        for settings in families:
+            family_id = settings['family_id']
             # Проверяем, пора ли отправлять советы для этой семьи
-            if current_hour == tips_hour and current_minute == tips_minute:
+            if current_hour == settings['tips_time_hour'] and current_minute == settings['tips_time_minute']:
                 tip = get_random_tip()
                 
                 # Получаем всех членов семьи
-                cur.execute("SELECT user_id FROM family_members WHERE family_id = ?", (family_id,))
-                members = cur.fetchall()
+                members = get_family_member_ids(family_id)
                 
                 # Отправляем совет всем членам семьи
-                for (user_id,) in members:
+                for user_id in members:
                     try:
-                        await client.send_message(user_id, tip)
-                        print(f"✅ Отправлен совет пользователю {user_id} в {current_hour:02d}:{current_minute:02d}")
+                        await send_message(user_id, tip)
+                        logger.info("✅ Отправлен совет пользователю %s в %02d:%02d", user_id, current_hour, current_minute)
                     except Exception as e:
-                        print(f"❌ Ошибка отправки совета пользователю {user_id}: {e}")
-        
-        conn.close()
+                        logger.error("❌ Ошибка отправки совета пользователю %s: %s", user_id, e)
     except Exception as e:
-        print(f"❌ Ошибка в send_scheduled_tips: {e}")
+        logger.error("❌ Ошибка в send_scheduled_tips: %s", e)
 
-@scheduler.scheduled_job('interval', minutes=15)
+@scheduled_job('interval', minutes=15)
+@metrics.track_job
 async def send_scheduled_feeding_reminders():
     """Отправлять регулярные напоминания о кормлении по расписанию"""
     try:
-        conn = sqlite3.connect("babybot.db")
-        cur = conn.cursor()
-        
         # Получаем все семьи с включенными уведомлениями
-        cur.execute("SELECT family_id FROM settings WHERE tips_enabled = 1")
-        families = cur.fetchall()
+        families = get_all_settings('tips_enabled')
+        metrics.JOB_FAMILIES.inc(len(families), job='send_scheduled_feeding_reminders')
         
-        for (family_id,) in families:
-            # Получаем интервал кормления
-            cur.execute("SELECT feed_interval FROM settings WHERE family_id = ?", (family_id,))
-            interval_result = cur.fetchone()
-            feed_interval = interval_result[0] if interval_result else 3
+        for settings in families:
+            family_id = settings['family_id']
+            # Получаем интервал кормления (фиксированный или адаптивный)
+            feed_interval = get_feed_interval(family_id, settings)
             
             # Получаем время последнего кормления
             last_feeding = get_last_feeding_time_for_family(family_id)
@@ -1653,8 +1582,7 @@ async def send_scheduled_feeding_reminders():
                     # Пора кормить!
                     if hours_since_last < (feed_interval + 0.5):  # В пределах 30 минут после интервала
                         # Получаем всех членов семьи
-                        cur.execute("SELECT user_id FROM family_members WHERE family_id = ?", (family_id,))
-                        members = cur.fetchall()
+                        members = get_family_member_ids(family_id)
                         
                         # Создаем сообщение с кнопками для быстрых действий
                         message = (
@@ -1674,17 +1602,16 @@ async def send_scheduled_feeding_reminders():
                         ]
                         
                         # Отправляем уведомление всем членам семьи
-                        for (user_id,) in members:
+                        for user_id in members:
                             try:
-                                await client.send_message(user_id, message, buttons=buttons)
-                                print(f"✅ Отправлено уведомление о кормлении пользователю {user_id}")
+                                await send_message(user_id, message, buttons=buttons)
+                                logger.info("✅ Отправлено уведомление о кормлении пользователю %s", user_id)
                             except Exception as e:
-                                print(f"❌ Ошибка отправки уведомления о кормлении пользователю {user_id}: {e}")
+                                logger.error("❌ Ошибка отправки уведомления о кормлении пользователю %s: %s", user_id, e)
                     
                     elif hours_since_last >= (feed_interval + 1):  # Через час после интервала - срочное уведомление
                         # Получаем всех членов семьи
-                        cur.execute("SELECT user_id FROM family_members WHERE family_id = ?", (family_id,))
-                        members = cur.fetchall()
+                        members = get_family_member_ids(family_id)
                         
                         # Срочное уведомление
                         urgent_message = (
@@ -1696,17 +1623,16 @@ async def send_scheduled_feeding_reminders():
                         )
                         
                         # Отправляем срочное уведомление всем членам семьи
-                        for (user_id,) in members:
+                        for user_id in members:
                             try:
-                                await client.send_message(user_id, urgent_message)
-                                print(f"🚨 Отправлено срочное уведомление о кормлении пользователю {user_id}")
+                                await send_message(user_id, urgent_message)
+                                logger.info("🚨 Отправлено срочное уведомление о кормлении пользователю %s", user_id)
                             except Exception as e:
-                                print(f"❌ Ошибка отправки срочного уведомления пользователю {user_id}: {e}")
+                                logger.error("❌ Ошибка отправки срочного уведомления пользователю %s: %s", user_id, e)
                 
                 elif hours_since_last >= (feed_interval - 0.25):  # За 15 минут до интервала - предварительное уведомление
                     # Получаем всех членов семьи
-                    cur.execute("SELECT user_id FROM family_members WHERE family_id = ?", (family_id,))
-                    members = cur.fetchall()
+                    members = get_family_member_ids(family_id)
                     
                     # Предварительное уведомление
                     pre_message = (
@@ -1718,33 +1644,28 @@ async def send_scheduled_feeding_reminders():
                     )
                     
                     # Отправляем предварительное уведомление всем членам семьи
-                    for (user_id,) in members:
+                    for user_id in members:
                         try:
-                            await client.send_message(user_id, pre_message)
-                            print(f"⏰ Отправлено предварительное уведомление о кормлении пользователю {user_id}")
+                            await send_message(user_id, pre_message)
+                            logger.info("⏰ Отправлено предварительное уведомление о кормлении пользователю %s", user_id)
                         except Exception as e:
-                            print(f"❌ Ошибка отправки предварительного уведомления пользователю {user_id}: {e}")
-        
-        conn.close()
+                            logger.error("❌ Ошибка отправки предварительного уведомления пользователю %s: %s", user_id, e)
     except Exception as e:
-        print(f"❌ Ошибка в send_scheduled_feeding_reminders: {e}")
+        logger.error("❌ Ошибка в send_scheduled_feeding_reminders: %s", e)
 
-@scheduler.scheduled_job('interval', minutes=15)
+@scheduled_job('interval', minutes=15)
+@metrics.track_job
 async def send_scheduled_diaper_reminders():
     """Отправлять регулярные напоминания о смене подгузника по расписанию"""
     try:
-        conn = sqlite3.connect("babybot.db")
-        cur = conn.cursor()
-        
         # Получаем все семьи с включенными уведомлениями
-        cur.execute("SELECT family_id FROM settings WHERE tips_enabled = 1")
-        families = cur.fetchall()
+        families = get_all_settings('tips_enabled')
+        metrics.JOB_FAMILIES.inc(len(families), job='send_scheduled_diaper_reminders')
         
-        for (family_id,) in families:
+        for settings in families:
+            family_id = settings['family_id']
             # Получаем интервал смены подгузника
-            cur.execute("SELECT diaper_interval FROM settings WHERE family_id = ?", (family_id,))
-            interval_result = cur.fetchone()
-            diaper_interval = interval_result[0] if interval_result else 2
+            diaper_interval = settings['diaper_interval']
             
             # Получаем время последней смены подгузника
             last_diaper = get_last_diaper_change_for_family(family_id)
@@ -1761,8 +1682,7 @@ async def send_scheduled_diaper_reminders():
                     # Пора менять подгузник!
                     if hours_since_last < (diaper_interval + 0.5):  # В пределах 30 минут после интервала
                         # Получаем всех членов семьи
-                        cur.execute("SELECT user_id FROM family_members WHERE family_id = ?", (family_id,))
-                        members = cur.fetchall()
+                        members = get_family_member_ids(family_id)
                         
                         # Создаем сообщение с кнопками для быстрых действий
                         message = (
@@ -1782,17 +1702,16 @@ async def send_scheduled_diaper_reminders():
                         ]
                         
                         # Отправляем уведомление всем членам семьи
-                        for (user_id,) in members:
+                        for user_id in members:
                             try:
-                                await client.send_message(user_id, message, buttons=buttons)
-                                print(f"✅ Отправлено уведомление о смене подгузника пользователю {user_id}")
+                                await send_message(user_id, message, buttons=buttons)
+                                logger.info("✅ Отправлено уведомление о смене подгузника пользователю %s", user_id)
                             except Exception as e:
-                                print(f"❌ Ошибка отправки уведомления о смене подгузника пользователю {user_id}: {e}")
+                                logger.error("❌ Ошибка отправки уведомления о смене подгузника пользователю %s: %s", user_id, e)
                     
                     elif hours_since_last >= (diaper_interval + 1):  # Через час после интервала - срочное уведомление
                         # Получаем всех членов семьи
-                        cur.execute("SELECT user_id FROM family_members WHERE family_id = ?", (family_id,))
-                        members = cur.fetchall()
+                        members = get_family_member_ids(family_id)
                         
                         # Срочное уведомление
                         urgent_message = (
@@ -1804,17 +1723,16 @@ async def send_scheduled_diaper_reminders():
                         )
                         
                         # Отправляем срочное уведомление всем членам семьи
-                        for (user_id,) in members:
+                        for user_id in members:
                             try:
-                                await client.send_message(user_id, urgent_message)
-                                print(f"🚨 Отправлено срочное уведомление о смене подгузника пользователю {user_id}")
+                                await send_message(user_id, urgent_message)
+                                logger.info("🚨 Отправлено срочное уведомление о смене подгузника пользователю %s", user_id)
                             except Exception as e:
-                                print(f"❌ Ошибка отправки срочного уведомления о смене подгузника пользователю {user_id}: {e}")
+                                logger.error("❌ Ошибка отправки срочного уведомления о смене подгузника пользователю %s: %s", user_id, e)
                 
                 elif hours_since_last >= (diaper_interval - 0.25):  # За 15 минут до интервала - предварительное уведомление
                     # Получаем всех членов семьи
-                    cur.execute("SELECT user_id FROM family_members WHERE family_id = ?", (family_id,))
-                    members = cur.fetchall()
+                    members = get_family_member_ids(family_id)
                     
                     # Предварительное уведомление
                     pre_message = (
@@ -1826,148 +1744,293 @@ async def send_scheduled_diaper_reminders():
                     )
                     
                     # Отправляем предварительное уведомление всем членам семьи
-                    for (user_id,) in members:
+                    for user_id in members:
                         try:
-                            await client.send_message(user_id, pre_message)
-                            print(f"⏰ Отправлено предварительное уведомление о смене подгузника пользователю {user_id}")
+                            await send_message(user_id, pre_message)
+                            logger.info("⏰ Отправлено предварительное уведомление о смене подгузника пользователю %s", user_id)
                         except Exception as e:
-                            print(f"❌ Ошибка отправки предварительного уведомления о смене подгузника пользователю {user_id}: {e}")
-        
-        conn.close()
+                            logger.error("❌ Ошибка отправки предварительного уведомления о смене подгузника пользователю %s: %s", user_id, e)
     except Exception as e:
-        print(f"❌ Ошибка в send_scheduled_diaper_reminders: {e}")
-
-@scheduler.scheduled_job('interval', minutes=15)
+        logger.error("❌ Ошибка в send_scheduled_diaper_reminders: %s", e)
+
+# Задачи купания идут раз в BATH_CHECK_MINUTES. Окно берётся с запасом назад, а
+# storage.claim_due_baths помнит дату последнего напоминания, поэтому пропущенный
+# тик или рестарт догоняется, а повтора в те же сутки не бывает
+BATH_CHECK_MINUTES = 15
+# Насколько позже времени купания ещё стоит прислать пропущенное напоминание
+BATH_CATCHUP_MINUTES = 2 * 60
+# Предупреждение «за час» догоняется, пока до купания остаётся хотя бы 15 минут
+BATH_SOON_CATCHUP_MINUTES = 45
+
+def bath_status_line(bath_interval, last_ts):
+    """Строка о последнем купании для напоминаний"""
+    if last_ts is None:
+        return f"🔄 Интервал: каждые {bath_interval} д.\n📅 Купаний ещё не записано\n\n"
+    last_bath = clock.from_timestamp(last_ts)
+    days = (get_thai_date() - last_bath.date()).days
+    return (f"🔄 Интервал: каждые {bath_interval} д.\n"
+            f"📅 Последнее купание: {last_bath.strftime('%d.%m %H:%M')} ({days} д. назад)\n\n")
+
+@scheduled_job('interval', minutes=BATH_CHECK_MINUTES)
+@metrics.track_job
 async def send_scheduled_bath_reminders():
-    """Отправлять напоминания о купании по расписанию"""
+    """Отправлять напоминания о купании, если с последнего купания прошло bath_interval дней"""
     try:
-        conn = sqlite3.connect("babybot.db")
-        cur = conn.cursor()
+        now = get_thai_time()
+        # Семьи, у которых время купания уже наступило, купание пора и напоминания сегодня не было
+        due = storage.claim_due_baths(now - timedelta(minutes=BATH_CATCHUP_MINUTES), now, 'bath')
+        metrics.JOB_FAMILIES.inc(len(due), job='send_scheduled_bath_reminders')
         
-        # Получаем все семьи с включенными напоминаниями о купании
-        cur.execute("SELECT family_id FROM settings WHERE bath_enabled = 1")
-        families = cur.fetchall()
-        
-        for (family_id,) in families:
-            # Получаем настройки купания
-            cur.execute("SELECT bath_interval, bath_time_hour, bath_time_minute FROM settings WHERE family_id = ?", (family_id,))
-            bath_settings = cur.fetchone()
-            
-            if not bath_settings:
-                continue
-                
-            bath_interval, bath_hour, bath_minute = bath_settings
+        for family_id, bath_interval, bath_hour, bath_minute, last_ts in due:
+            # Получаем всех членов семьи
+            members = get_family_member_ids(family_id)
             
-            # Получаем текущее время в тайском часовом поясе
-            current_time = get_thai_time()
-            current_hour = current_time.hour
-            current_minute = current_time.minute
+            # Создаем сообщение о купании
+            message = (
+                f"🛁 **Время купания!**\n\n"
+                f"⏰ Время: {bath_hour:02d}:{bath_minute:02d}\n"
+                f"{bath_status_line(bath_interval, last_ts)}"
+                f"💡 Пора искупать малыша!\n\n"
+                f"🛁 Купание помогает:\n"
+                f"• 🧼 Поддерживать гигиену\n"
+                f"• 😴 Улучшать сон\n"
+                f"• 🎵 Создавать приятные ассоциации\n"
+                f"• 🌡 Регулировать температуру тела\n\n"
+                f"⚠️ Не забудьте:\n"
+                f"• 🌡 Проверить температуру воды\n"
+                f"• 🧴 Подготовить средства для купания\n"
+                f"• 🧸 Взять игрушки для малыша\n"
+                f"• 🧺 Полотенце и чистую одежду"
+            )
+            buttons = [[Button.inline("🛁 Искупали", b"bath_now")]]
             
-            # Проверяем, пора ли отправлять напоминание о купании
-            if current_hour == bath_hour and current_minute == bath_minute:
-                # Получаем всех членов семьи
-                cur.execute("SELECT user_id FROM family_members WHERE family_id = ?", (family_id,))
-                members = cur.fetchall()
-                
-                # Создаем сообщение о купании
-                message = (
-                    f"🛁 **Время купания!**\n\n"
-                    f"⏰ Время: {bath_hour:02d}:{bath_minute:02d}\n"
-                    f"🔄 Интервал: каждые {bath_interval} д.\n\n"
-                    f"💡 Пора искупать малыша!\n\n"
-                    f"🛁 Купание помогает:\n"
-                    f"• 🧼 Поддерживать гигиену\n"
-                    f"• 😴 Улучшать сон\n"
-                    f"• 🎵 Создавать приятные ассоциации\n"
-                    f"• 🌡 Регулировать температуру тела\n\n"
-                    f"⚠️ Не забудьте:\n"
-                    f"• 🌡 Проверить температуру воды\n"
-                    f"• 🧴 Подготовить средства для купания\n"
-                    f"• 🧸 Взять игрушки для малыша\n"
-                    f"• 🧺 Полотенце и чистую одежду"
-                )
-                
-                # Отправляем уведомление всем членам семьи
-                for (user_id,) in members:
-                    try:
-                        await client.send_message(user_id, message)
-                        print(f"🛁 Отправлено напоминание о купании пользователю {user_id}")
-                    except Exception as e:
-                        print(f"❌ Ошибка отправки напоминания о купании пользователю {user_id}: {e}")
-        
-        conn.close()
+            # Отправляем уведомление всем членам семьи
+            for user_id in members:
+                try:
+                    await send_message(user_id, message, buttons=buttons)
+                    logger.info("🛁 Отправлено напоминание о купании пользователю %s", user_id)
+                except Exception as e:
+                    logger.error("❌ Ошибка отправки напоминания о купании пользователю %s: %s", user_id, e)
     except Exception as e:
-        print(f"❌ Ошибка в send_scheduled_bath_reminders: {e}")
+        logger.error("❌ Ошибка в send_scheduled_bath_reminders: %s", e)
 
-@scheduler.scheduled_job('interval', minutes=15)
+@scheduled_job('interval', minutes=BATH_CHECK_MINUTES)
+@metrics.track_job
 async def send_bath_reminder_1hour_before():
-    """Отправлять напоминание о купании за час до указанного времени"""
+    """Отправлять напоминание о купании за час до указанного времени (если купание в этот день нужно)"""
     try:
-        conn = sqlite3.connect("babybot.db")
-        cur = conn.cursor()
-        
-        # Получаем все семьи с включенными напоминаниями о купании
-        cur.execute("SELECT family_id FROM settings WHERE bath_enabled = 1")
-        families = cur.fetchall()
+        now = get_thai_time()
+        # Окно сдвинуто на час вперёд: купание, до которого остался час (или чуть меньше)
+        due = storage.claim_due_baths(now + timedelta(minutes=60 - BATH_SOON_CATCHUP_MINUTES),
+                                      now + timedelta(hours=1), 'bath_soon')
+        metrics.JOB_FAMILIES.inc(len(due), job='send_bath_reminder_1hour_before')
         
-        for (family_id,) in families:
-            # Получаем настройки купания
-            cur.execute("SELECT bath_interval, bath_time_hour, bath_time_minute FROM settings WHERE family_id = ?", (family_id,))
-            bath_settings = cur.fetchone()
+        for family_id, bath_interval, bath_hour, bath_minute, last_ts in due:
+            # Получаем всех членов семьи
+            members = get_family_member_ids(family_id)
             
-            if not bath_settings:
-                continue
-                
-            bath_interval, bath_hour, bath_minute = bath_settings
-            
-            # Получаем текущее время в тайском часовом поясе
-            current_time = get_thai_time()
-            current_hour = current_time.hour
-            current_minute = current_time.minute
+            # Создаем сообщение-напоминание за час
+            message = (
+                f"⏰ **Напоминание о купании**\n\n"
+                f"🛁 Скоро, в {bath_hour:02d}:{bath_minute:02d}, время купания!\n"
+                f"{bath_status_line(bath_interval, last_ts)}"
+                f"💡 Подготовьтесь заранее:\n"
+                f"• 🛁 Проверьте ванну/детскую ванночку\n"
+                f"• 🌡 Подготовьте воду комфортной температуры\n"
+                f"• 🧴 Соберите средства для купания\n"
+                f"• 🧸 Возьмите любимые игрушки малыша\n"
+                f"• 🧺 Полотенце и чистую одежду\n"
+                f"• 🧴 Средства для ухода после купания\n\n"
+                f"⏰ У вас есть время на подготовку!"
+            )
             
-            # Проверяем, пора ли отправлять напоминание за час до купания
-            reminder_hour = (bath_hour - 1) % 24  # За час до времени купания
-            if current_hour == reminder_hour and current_minute == bath_minute:
-                # Получаем всех членов семьи
-                cur.execute("SELECT user_id FROM family_members WHERE family_id = ?", (family_id,))
-                members = cur.fetchall()
-                
-                # Создаем сообщение-напоминание за час
-                message = (
-                    f"⏰ **Напоминание о купании**\n\n"
-                    f"🛁 Через час в {bath_hour:02d}:{bath_minute:02d} время купания!\n"
-                    f"🔄 Интервал: каждые {bath_interval} д.\n\n"
-                    f"💡 Подготовьтесь заранее:\n"
-                    f"• 🛁 Проверьте ванну/детскую ванночку\n"
-                    f"• 🌡 Подготовьте воду комфортной температуры\n"
-                    f"• 🧴 Соберите средства для купания\n"
-                    f"• 🧸 Возьмите любимые игрушки малыша\n"
-                    f"• 🧺 Полотенце и чистую одежду\n"
-                    f"• 🧴 Средства для ухода после купания\n\n"
-                    f"⏰ У вас есть час на подготовку!"
-                )
-                
-                # Отправляем уведомление всем членам семьи
-                for (user_id,) in members:
-                    try:
-                        await client.send_message(user_id, message)
-                        print(f"⏰ Отправлено напоминание о купании за час пользователю {user_id}")
-                    except Exception as e:
-                        print(f"❌ Ошибка отправки напоминания о купании за час пользователю {user_id}: {e}")
-        
-        conn.close()
+            # Отправляем уведомление всем членам семьи
+            for user_id in members:
+                try:
+                    await send_message(user_id, message)
+                    logger.info("⏰ Отправлено напоминание о купании за час пользователю %s", user_id)
+                except Exception as e:
+                    logger.error("❌ Ошибка отправки напоминания о купании за час пользователю %s: %s", user_id, e)
     except Exception as e:
-        print(f"❌ Ошибка в send_bath_reminder_1hour_before: {e}")
+        logger.error("❌ Ошибка в send_bath_reminder_1hour_before: %s", e)
 
-class HealthCheckHandler(http.server.BaseHTTPRequestHandler):
-    def do_GET(self):
-        current_time = time.strftime('%Y-%m-%d %H:%M:%S')
-        
-        if self.path == '/':
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            response = f"""
+@scheduled_job('cron', hour=22, minute=0, timezone=clock.THAI_TZ)
+@metrics.track_job
+async def send_anomaly_digests():
+    """Раз в сутки найти аномалии у семей со включённой сводкой аномалий и отправить каждой затронутой семье одну сводку"""
+    try:
+        families = {settings['family_id'] for settings in get_all_settings('anomaly_alerts')}
+        # Чтение всей базы и расчёт — в пуле потоков, чтобы не держать event loop
+        loop = asyncio.get_running_loop()
+        flags = await loop.run_in_executor(None, functools.partial(anomalies.scan, families=families))
+        metrics.JOB_FAMILIES.inc(len(flags), job='send_anomaly_digests')
+
+        for family_id, found in flags.items():
+            message = anomalies.format_digest(found)
+            for user_id in get_family_member_ids(family_id):
+                try:
+                    await send_message(user_id, message)
+                    logger.info("🔎 Отправлена сводка аномалий пользователю %s", user_id)
+                except Exception as e:
+                    logger.error("❌ Ошибка отправки сводки аномалий пользователю %s: %s", user_id, e)
+    except Exception as e:
+        logger.error("❌ Ошибка в send_anomaly_digests: %s", e)
+
+@scheduled_job('interval', minutes=DIGEST_CHECK_MINUTES)
+@metrics.track_job
+async def send_scheduled_digests():
+    """Отправлять вечернюю сводку семьям, у которых наступило время сводки"""
+    try:
+        now = get_thai_time()
+        # Только семьи, чьё время сводки попало в прошедший тик
+        due = storage.get_due_digests(now - timedelta(minutes=DIGEST_CHECK_MINUTES), now)
+        metrics.JOB_FAMILIES.inc(len(due), job='send_scheduled_digests')
+        if not due:
+            return
+
+        for family_id, message in build_digests(due, now).items():
+            for user_id in get_family_member_ids(family_id):
+                try:
+                    await send_message(user_id, message)
+                    logger.info("📋 Отправлена сводка за день пользователю %s", user_id)
+                except Exception as e:
+                    logger.error("❌ Ошибка отправки сводки за день пользователю %s: %s", user_id, e)
+    except Exception as e:
+        logger.error("❌ Ошибка в send_scheduled_digests: %s", e)
+
+# Health-сервер работает на event loop бота: запросы обслуживаются
+# конкурентно, а медленный клиент не мешает остальным
+HEALTH_READ_TIMEOUT = 10
+HEALTH_MAX_HEADERS = 100
+# Задача планировщика, просроченная дольше этого, считается зависшей
+SCHEDULER_STALL_SECONDS = 120
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+                405: 'Method Not Allowed', 409: 'Conflict', 503: 'Service Unavailable'}
+
+def scheduler_liveness():
+    """Работает ли планировщик и не отстают ли его задачи"""
+    if scheduler is None or not scheduler.running:
+        return {"ok": False, "running": False}
+    now = datetime.now(pytz.UTC)
+    jobs = scheduler.get_jobs()
+    overdue = max([(now - job.next_run_time).total_seconds() for job in jobs if job.next_run_time] + [0])
+    return {"ok": overdue < SCHEDULER_STALL_SECONDS, "running": True, "jobs": len(jobs),
+            "max_overdue_seconds": round(overdue, 1)}
+
+async def check_readiness():
+    """Готовность бота: время запроса к базе, планировщик, Telegram и последняя успешная отправка"""
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        # В пуле потоков: у каждого потока своё соединение, цикл не ждёт диск
+        await loop.run_in_executor(None, storage.ping)
+        db = {"ok": True, "rtt_ms": round((time.perf_counter() - started) * 1000, 2)}
+    except Exception as e:
+        db = {"ok": False, "error": str(e)}
+
+    last_send = metrics.LAST_SEND_SUCCESS.value()
+    checks = {
+        "db": db,
+        "scheduler": scheduler_liveness(),
+        "telegram": {"ok": client is not None and client.is_connected()},
+        "last_send": {"seconds_ago": round(time.time() - last_send, 1) if last_send else None},
+    }
+    ready = all(check.get("ok", True) for check in checks.values())
+    return ready, checks
+
+def _http_response(status, body=b'', content_type='text/plain; charset=utf-8', head=False):
+    if isinstance(body, str):
+        body = body.encode()
+    lines = [
+        f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        "Connection: close",
+        "", "",
+    ]
+    return '\r\n'.join(lines).encode('latin-1') + (b'' if head else body)
+
+async def _read_request(reader):
+    """Прочитать строку запроса и заголовки: (метод, URL, заголовки)"""
+    request_line = await reader.readline()
+    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+    headers = {}
+    for _ in range(HEALTH_MAX_HEADERS):
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return method, urllib.parse.urlsplit(target), headers
+
+async def handle_health_connection(reader, writer):
+    """Один HTTP-запрос на соединение (Connection: close)"""
+    head = False
+    try:
+        try:
+            method, url, headers = await asyncio.wait_for(_read_request(reader), HEALTH_READ_TIMEOUT)
+        except ValueError:
+            response = _http_response(400, 'bad request\n')
+        else:
+            head = method == 'HEAD'
+            if method not in ('GET', 'HEAD'):
+                response = _http_response(405, 'method not allowed\n')
+            else:
+                status, body, content_type = await route_health_request(url, headers)
+                response = _http_response(status, body, content_type, head=head)
+        writer.write(response)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    except Exception as e:
+        logger.error("❌ Health check server error: %s", e)
+    finally:
+        writer.close()
+
+async def handle_debug(url, headers):
+    """Профилирование по запросу (/debug/profile, /debug/tracemalloc), только с токеном"""
+    if not profiling.enabled():
+        return 404, 'profiling disabled\n', 'text/plain; charset=utf-8'
+    params = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+    auth = headers.get('authorization', '')
+    token = auth[len('Bearer '):] if auth.startswith('Bearer ') else params.get('token')
+    if not profiling.check_token(token):
+        return 401, 'unauthorized\n', 'text/plain; charset=utf-8'
+
+    seconds = profiling.clamp_seconds(params.get('seconds'))
+    loop = asyncio.get_running_loop()
+    text = 'text/plain; charset=utf-8'
+    # Профилировщики спят seconds секунд — в отдельном потоке, чтобы цикл работал дальше
+    try:
+        if url.path == '/debug/profile':
+            mode = params.get('mode', 'sample')
+            logger.info("🔬 Профилирование (%s) на %.1f с", mode, seconds)
+            if mode == 'cprofile':
+                if params.get('format') == 'pstats':
+                    body = await loop.run_in_executor(None, functools.partial(
+                        profiling.profile_loop, seconds, binary=True))
+                    return 200, body, 'application/octet-stream'
+                return 200, await loop.run_in_executor(None, profiling.profile_loop, seconds), text
+            interval = int(params.get('interval', profiling.DEFAULT_INTERVAL_MS))
+            return 200, await loop.run_in_executor(None, functools.partial(
+                profiling.sample_stacks, seconds, interval, loop_only=params.get('thread') == 'loop')), text
+        if url.path == '/debug/tracemalloc':
+            logger.info("🔬 Снимок tracemalloc на %.1f с", seconds)
+            return 200, await loop.run_in_executor(None, profiling.tracemalloc_diff, seconds), text
+    except profiling.ProfilerBusy as e:
+        return 409, f"{e}\n", text
+    return 404, 'not found\n', text
+
+async def route_health_request(url, headers):
+    """Ответ на запрос к health-серверу: (статус, тело, Content-Type)"""
+    current_time = time.strftime('%Y-%m-%d %H:%M:%S')
+    path = url.path
+
+    if path.startswith('/debug/'):
+        return await handle_debug(url, headers)
+    if path == '/':
+        response = f"""
             <html>
             <head><title>BabyCareBot Health Check</title></head>
             <body>
@@ -1981,91 +2044,157 @@ class HealthCheckHandler(http.server.BaseHTTPRequestHandler):
             </body>
             </html>
             """
-            self.wfile.write(response.encode())
-        elif self.path == '/health':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            response = f'{{"status": "healthy", "service": "babycare-bot", "timestamp": "{current_time}", "uptime": "active", "render_keepalive": "active"}}'
-            self.wfile.write(response.encode())
-        elif self.path == '/ping':
-            # Простой ping для постоянной активности
-            self.send_response(200)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(f"pong {current_time}".encode())
-        elif self.path == '/status':
-            # Расширенный статус
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            response = f'{{"status": "healthy", "bot": "running", "timestamp": "{current_time}", "health": "ok", "render_keepalive": "active"}}'
-            self.wfile.write(response.encode())
-        elif self.path == '/render-ping':
-            # Специальный endpoint для Render
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            response = f'{{"status": "ok", "service": "babycare-bot", "timestamp": "{current_time}", "render": "active"}}'
-            self.wfile.write(response.encode())
-        else:
-            self.send_response(404)
-            self.end_headers()
-
-def start_health_server(port=8000):
-    """Запуск HTTP сервера для health checks"""
-    try:
-        with socketserver.TCPServer(("", port), HealthCheckHandler) as httpd:
-            print(f"🌐 Health check server started on port {port}")
-            print(f"🔗 Health check URLs:")
-            print(f"   • Main: http://localhost:{port}/")
-            print(f"   • Health: http://localhost:{port}/health")
-            print(f"   • Ping: http://localhost:{port}/ping")
-            print(f"   • Status: http://localhost:{port}/status")
-            httpd.serve_forever()
-    except Exception as e:
-        print(f"❌ Health check server error: {e}")
+        return 200, response, 'text/html; charset=utf-8'
+    if path == '/health':
+        # Готовность: 503, если не отвечает база, встал планировщик или нет связи с Telegram
+        ready, checks = await check_readiness()
+        response = json.dumps({
+            "status": "healthy" if ready else "unhealthy",
+            "service": "babycare-bot",
+            "timestamp": current_time,
+            "checks": checks,
+            "render_keepalive": "active",
+        })
+        return (200 if ready else 503), response, 'application/json'
+    if path == '/ping':
+        # Простой ping для постоянной активности
+        return 200, f"pong {current_time}", 'text/plain'
+    if path == '/status':
+        # Расширенный статус
+        ready, checks = await check_readiness()
+        response = json.dumps({
+            "status": "healthy" if ready else "unhealthy",
+            "bot": "running" if client is not None and client.is_connected() else "disconnected",
+            "timestamp": current_time,
+            "uptime_seconds": round(time.time() - metrics.PROCESS_START.value()),
+            "scheduler_jobs": len(scheduler.get_jobs()) if scheduler is not None else 0,
+            "sends_in_flight": metrics.SENDS_IN_FLIGHT.value(),
+            "loop_lag_ms": round(loop_monitor.last_lag * 1000, 1),
+            "send_failures": metrics.SEND_FAILURES.total(),
+            "checks": checks,
+            "startup_seconds": STARTUP_PHASES,
+            "render_keepalive": "active",
+        })
+        return 200, response, 'application/json'
+    if path == '/render-ping':
+        # Специальный endpoint для Render
+        response = f'{{"status": "ok", "service": "babycare-bot", "timestamp": "{current_time}", "render": "active"}}'
+        return 200, response, 'application/json'
+    if path == '/loop':
+        # Задержка event loop и последние блокировки со стеками
+        return 200, json.dumps(loop_monitor.snapshot(), ensure_ascii=False), 'application/json'
+    if path == '/metrics':
+        # Метрики в формате Prometheus
+        return 200, metrics.render(), metrics.CONTENT_TYPE
+    return 404, b'', 'text/plain'
+
+async def start_health_server(port=8000):
+    """Запуск HTTP сервера для health checks на текущем event loop"""
+    server = await asyncio.start_server(handle_health_connection, port=port, reuse_address=True)
+    logger.info("🌐 Health check server started on port %s", port)
+    logger.info("🔗 Health check URLs:")
+    logger.info("   • Main: http://localhost:%s/", port)
+    logger.info("   • Health: http://localhost:%s/health", port)
+    logger.info("   • Ping: http://localhost:%s/ping", port)
+    logger.info("   • Status: http://localhost:%s/status", port)
+    logger.info("   • Metrics: http://localhost:%s/metrics", port)
+    logger.info("   • Loop: http://localhost:%s/loop", port)
+    return server
+
+def create_app(config=None):
+    """Собрать бота: база, клиент Telegram с обработчиками и планировщик с задачами.
+
+    Ничего не подключает к сети — это делает start_bot() (или connect()).
+    Без config параметры читаются из config.env и окружения (ConfigError, если их нет).
+    Модуль хранит одно приложение: повторный вызов заменяет client и scheduler.
+    Возвращает клиента Telegram.
+    """
+    global bot_config, client, scheduler
+    if config is None:
+        with startup_phase('config'):
+            config = Config.from_env()
+    bot_config = config
+
+    with startup_phase('db'):
+        if config.db_path:
+            storage.configure(config.db_path)
+        init_db()
+
+    with startup_phase('client'):
+        client = TracedTelegramClient(config.session, config.api_id, config.api_hash)
+        for callback, event_builder in HANDLERS:
+            client.add_event_handler(callback, event_builder)
+
+    with startup_phase('scheduler'):
+        scheduler = AsyncIOScheduler()
+        for func, trigger, trigger_args in SCHEDULED_JOBS:
+            scheduler.add_job(func, trigger, **trigger_args)
+        # Задача для поддержания активности (каждые 5 минут)
+        scheduler.add_job(metrics.track_job(keep_alive_ping), 'interval', minutes=5, id='keep_alive_ping')
+        logger.info("⏰ Keep-alive ping scheduled every 5 minutes")
+        # Внешний keep-alive для Render (каждые 3 минуты)
+        scheduler.add_job(metrics.track_job(external_keep_alive), 'interval', minutes=3, id='external_keep_alive')
+        logger.info("⏰ External keep-alive scheduled every 3 minutes")
+    return client
+
+def log_startup_phases():
+    """Вывести фазы холодного старта одной строкой"""
+    phases = ', '.join(f"{name} {seconds:.3f}" for name, seconds in STARTUP_PHASES.items())
+    logger.info("🚀 Холодный старт за %.2f с: %s", sum(STARTUP_PHASES.values()), phases)
 
 async def start_bot():
     """Запуск бота"""
-    print("🔍 Проверяем подключение к Telegram...")
+    logger.info("🔍 Проверяем подключение к Telegram...")
     
     try:
-        # Проверяем, что бот подключился
-        me = await client.get_me()
-        print(f"✅ Бот подключен: @{me.username}")
-        print(f"🆔 ID бота: {me.id}")
-        print(f"📝 Имя бота: {me.first_name}")
+        with startup_phase('connect'):
+            await connect()
+            # Проверяем, что бот подключился
+            me = await client.get_me()
+        logger.info("✅ Бот подключен: @%s", me.username)
+        logger.info("🆔 ID бота: %s", me.id)
+        logger.info("📝 Имя бота: %s", me.first_name)
         
-        # Запускаем health сервер в отдельном потоке
-        health_thread = threading.Thread(target=start_health_server, daemon=True)
-        health_thread.start()
-        print("🌐 Health check server started")
+        # Health сервер работает на том же event loop, что и бот
+        await start_health_server(bot_config.health_port)
         
-        scheduler.start()
-        print("✅ Бот запущен!")
+        with startup_phase('scheduler_start'):
+            scheduler.start()
+        loop_monitor.start()
+        profiling.attach_loop(asyncio.get_running_loop())
+        logger.info("✅ Бот запущен!")
+        log_startup_phases()
         
         # Запускаем бота
         await client.run_until_disconnected()
     except Exception as e:
-        print(f"❌ Ошибка при запуске бота: {e}")
-        print("🔍 Проверьте переменные окружения и токен бота")
+        logger.error("❌ Ошибка при запуске бота: %s", e)
+        logger.info("🔍 Проверьте переменные окружения и токен бота")
         raise e
 
+record_startup_phase('import', time.perf_counter() - _IMPORT_STARTED)
+
 # Запуск бота
 if __name__ == "__main__":
     try:
-        print("🚀 Запуск BabyCareBot...")
-        print(f"🔑 API_ID: {API_ID}")
-        print(f"🔑 API_HASH: {API_HASH[:10]}...")  # Показываем только первые 10 символов
-        print(f"🔑 BOT_TOKEN: {BOT_TOKEN[:10]}...")  # Показываем только первые 10 символов
+        logger.info("🚀 Запуск BabyCareBot...")
+        try:
+            create_app()
+        except ConfigError as e:
+            explain_config_error(e)
+            exit(1)
+        logger.info("✅ Все переменные окружения загружены успешно")
+        logger.info("🤖 Бот: @Prettyotterbot")
+        logger.info("🔑 API_ID: %s", bot_config.api_id)
+        logger.info("🔑 API_HASH: %s...", bot_config.api_hash[:10])  # Показываем только первые 10 символов
+        logger.info("🔑 BOT_TOKEN: %s...", bot_config.bot_token[:10])  # Показываем только первые 10 символов
         
-        with client:
+        try:
             client.loop.run_until_complete(start_bot())
+        finally:
+            client.disconnect()
     except KeyboardInterrupt:
-        print("\n🛑 Бот остановлен пользователем")
+        logger.info("🛑 Бот остановлен пользователем")
     except Exception as e:
-        print(f"❌ Критическая ошибка: {e}")
-        print("🔍 Проверьте логи для диагностики")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Критическая ошибка: %s", e)
+        logger.info("🔍 Проверьте логи для диагностики")
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Метрики BabyCareBot в формате Prometheus
+
+Небольшой реестр счётчиков, гистограмм и gauge-метрик без внешних
+зависимостей. Значения накапливаются в памяти процесса и отдаются
+health-сервером на /metrics. Декораторы track_* заодно открывают span'ы
+трассировки (см. tracing.py).
+"""
+
+import functools
+import inspect
+import re
+import threading
+import time
+
+import tracing
+
+# Границы корзин гистограмм по умолчанию (в секундах)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидались метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def total(self):
+        """Сумма по всем наборам меток"""
+        with self._lock:
+            return sum(self._values.values())
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Текущее значение, которое может расти и уменьшаться"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам с суммой и количеством"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def totals(self):
+        """Количество наблюдений и их сумма по всем наборам меток"""
+        with self._lock:
+            return sum(s[2] for s in self._values.values()), sum(s[1] for s in self._values.values())
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.histogram(
+    'babybot_handler_seconds', 'Время обработки сообщений и callback-запросов', ('handler', 'kind'))
+HANDLER_ERRORS = REGISTRY.counter(
+    'babybot_handler_errors_total', 'Необработанные исключения в обработчиках', ('handler', 'kind'))
+DB_QUERY_LATENCY = REGISTRY.histogram(
+    'babybot_db_query_seconds', 'Время выполнения функций слоя данных (без вложенных вызовов)', ('helper',))
+SEND_LATENCY = REGISTRY.histogram(
+    'babybot_send_message_seconds', 'Время отправки сообщений через Telegram API')
+SEND_FAILURES = REGISTRY.counter(
+    'babybot_send_message_failures_total', 'Неудачные отправки сообщений', ('error',))
+JOB_DURATION = REGISTRY.histogram(
+    'babybot_scheduler_job_seconds', 'Длительность задач планировщика', ('job',))
+JOB_FAMILIES = REGISTRY.counter(
+    'babybot_scheduler_families_total', 'Сколько семей проверили задачи планировщика', ('job',))
+SENDS_IN_FLIGHT = REGISTRY.gauge(
+    'babybot_sends_in_flight', 'Отправки, ожидающие ответа Telegram API')
+STARTUP_PHASE = REGISTRY.gauge(
+    'babybot_startup_phase_seconds', 'Длительность фаз холодного старта', ('phase',))
+LAST_SEND_SUCCESS = REGISTRY.gauge(
+    'babybot_last_send_success_time_seconds', 'Время последней успешной отправки сообщения (epoch)')
+PROCESS_START = REGISTRY.gauge(
+    'babybot_process_start_time_seconds', 'Время запуска процесса (epoch)')
+PROCESS_START.set(time.time())
+
+# Глубина вложенных вызовов track_query в текущем потоке
+_query_depth = threading.local()
+
+# feed_15, tips_hour_7, del_feed_123 → feed, tips_hour, del_feed
+_CALLBACK_ARG_RE = re.compile(r'(_\d+)+$')
+
+
+def callback_kind(data):
+    """Тип callback-запроса без числовых аргументов (чтобы не плодить метки)"""
+    if isinstance(data, bytes):
+        data = data.decode(errors='replace')
+    return _CALLBACK_ARG_RE.sub('', data or '') or 'empty'
+
+
+def track_handler(name, kind='message'):
+    """Декоратор обработчика Telethon: время выполнения, ошибки и корневой span апдейта"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(event, *args, **kwargs):
+            handler = callback_kind(getattr(event, 'data', b'')) if kind == 'callback' else name
+            start = time.perf_counter()
+            try:
+                with tracing.start_trace(f"{kind}.{handler}", handler=handler, kind=kind,
+                                         user_id=getattr(event, 'sender_id', None)):
+                    return await func(event, *args, **kwargs)
+            except Exception as e:
+                # StopPropagation и подобные служебные исключения Telethon — не ошибки
+                if not type(e).__module__.startswith('telethon.events'):
+                    HANDLER_ERRORS.inc(handler=handler, kind=kind)
+                raise
+            finally:
+                HANDLER_LATENCY.observe(time.perf_counter() - start, handler=handler, kind=kind)
+        return wrapper
+    return decorator
+
+
+def track_job(func):
+    """Декоратор задачи планировщика: длительность выполнения и корневой span"""
+    name = func.__name__
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with tracing.start_trace(f"job.{name}", job=name):
+                    return await func(*args, **kwargs)
+            finally:
+                JOB_DURATION.observe(time.perf_counter() - start, job=name)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                JOB_DURATION.observe(time.perf_counter() - start, job=name)
+    return wrapper
+
+
+def track_query(func):
+    """Декоратор функции слоя данных: время выполнения и span внутри трассы
+
+    В гистограмму попадает только внешний вызов: если одна функция storage
+    вызывает другую, время не учитывается дважды (span'ы остаются вложенными).
+    """
+    name = func.__name__
+    span_name = f"db.{name}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        depth = getattr(_query_depth, 'value', 0)
+        _query_depth.value = depth + 1
+        start = time.perf_counter()
+        try:
+            if tracing.current_span() is None:
+                return func(*args, **kwargs)
+            with tracing.span(span_name):
+                return func(*args, **kwargs)
+        finally:
+            _query_depth.value = depth
+            if not depth:
+                DB_QUERY_LATENCY.observe(time.perf_counter() - start, helper=name)
+    return wrapper
+
+
+async def timed_send(send, *args, **kwargs):
+    """Вызвать корутину отправки сообщения, учитывая задержку, ошибки и число одновременных отправок"""
+    SENDS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        result = await send(*args, **kwargs)
+    except Exception as e:
+        SEND_FAILURES.inc(error=type(e).__name__)
+        raise
+    else:
+        LAST_SEND_SUCCESS.set(time.time())
+        return result
+    finally:
+        SEND_LATENCY.observe(time.perf_counter() - start)
+        SENDS_IN_FLIGHT.dec()
+
+
+def render():
+    return REGISTRY.render()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Предрасчитанная аналитика для дашборда BabyCareBot
+
+Для каждой семьи в памяти хранятся отсортированные массивы NumPy с
+epoch-временем событий, часом недели и кодом автора. Кэш обновляется
+инкрементально: из базы читаются только строки с id больше последнего
+увиденного, а полный пересчёт нужен лишь при удалении или правке записей —
+их выдаёт смена счётчика правок семьи (storage.get_events_version).
+Так же кэшируется ряд измерений роста и веса с перцентилями ВОЗ.
+"""
+
+import threading
+from datetime import datetime
+
+import numpy as np
+
+import growth
+import storage
+from clock import THAI_TZ
+
+# У Бангкока нет перехода на летнее время, поэтому смещение постоянное
+THAI_OFFSET = int(THAI_TZ.utcoffset(datetime(2024, 1, 1)).total_seconds())
+
+EVENT_TABLES = ('feedings', 'diapers')
+
+# Корзины распределения интервалов между кормлениями (в минутах)
+GAP_BINS = np.array([0, 30, 60, 90, 120, 150, 180, 210, 240, 300, 360, 480, 720, 1440])
+
+
+class _EventSeries:
+    """Отсортированные по времени массивы событий одной таблицы для одной семьи"""
+
+    def __init__(self):
+        self.ts = np.empty(0, dtype=np.float64)
+        self.hour_of_week = np.empty(0, dtype=np.int16)
+        self.author = np.empty(0, dtype=np.int32)
+        self.last_id = 0
+
+    def extend(self, ts, authors):
+        """Добавить новые события, сохраняя сортировку по времени"""
+        if not len(ts):
+            return
+        ts = np.asarray(ts, dtype=np.float64)
+        local = (ts.astype(np.int64) + THAI_OFFSET)
+        # 01.01.1970 был четвергом: сдвиг на 3 даёт понедельник = 0
+        weekday = (local // 86400 + 3) % 7
+        hour = (local // 3600) % 24
+        how = (weekday * 24 + hour).astype(np.int16)
+        authors = np.asarray(authors, dtype=np.int32)
+
+        needs_sort = len(self.ts) and ts.min() < self.ts[-1]
+        self.ts = np.concatenate([self.ts, ts])
+        self.hour_of_week = np.concatenate([self.hour_of_week, how])
+        self.author = np.concatenate([self.author, authors])
+        if needs_sort or np.any(np.diff(ts) < 0):
+            order = np.argsort(self.ts, kind='stable')
+            self.ts = self.ts[order]
+            self.hour_of_week = self.hour_of_week[order]
+            self.author = self.author[order]
+
+    def window(self, since):
+        """Срез массивов, начиная с epoch-времени since"""
+        start = int(np.searchsorted(self.ts, since, side='left')) if since else 0
+        return self.ts[start:], self.hour_of_week[start:], self.author[start:]
+
+
+class _FamilyState:
+    """Кэшированные ряды событий и таблица авторов одной семьи"""
+
+    def __init__(self):
+        self.series = {table: _EventSeries() for table in EVENT_TABLES}
+        self.authors = []
+        self.author_index = {}
+        # Счётчик правок, с которым согласованы ряды (None — ещё не загружались)
+        self.version = None
+        self.lock = threading.Lock()
+
+    def author_code(self, role, name):
+        label = f"{role} {name}" if role and name else "Неизвестно"
+        code = self.author_index.get(label)
+        if code is None:
+            code = len(self.authors)
+            self.authors.append(label)
+            self.author_index[label] = code
+        return code
+
+
+class AnalyticsCache:
+    """Кэш аналитики по семьям с инкрементальным обновлением из базы"""
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _state(self, family_id):
+        with self._lock:
+            state = self._families.get(family_id)
+            if state is None:
+                state = self._families[family_id] = _FamilyState()
+            return state
+
+    def invalidate(self, family_id=None):
+        """Сбросить кэш семьи (или всех семей)"""
+        with self._lock:
+            if family_id is None:
+                self._families.clear()
+            else:
+                self._families.pop(family_id, None)
+
+    def _drop(self, family_id, state):
+        """Выбросить устаревшее состояние семьи, если его ещё не заменили"""
+        with self._lock:
+            if self._families.get(family_id) is state:
+                del self._families[family_id]
+
+    def _refresh(self, family_id):
+        """Дочитать из базы новые события семьи и вернуть актуальное состояние.
+
+        Запросы к базе идут без блокировки семьи: под ней только сверка счётчика
+        и добавление строк, поэтому медленное чтение не держит других читателей.
+        """
+        while True:
+            state = self._state(family_id)
+            with state.lock:
+                known = state.version
+                last_ids = {table: state.series[table].last_id for table in EVENT_TABLES}
+            # Счётчик читается до строк: правка между запросами даст расхождение в следующий раз
+            version = storage.get_events_version(family_id)
+            if known is not None and version != known:
+                # Уже виденные записи удалили или поменяли — дочитыванием не обойтись
+                self._drop(family_id, state)
+                continue
+            fetched = {table: storage.get_events_after_id(table, family_id, last_ids[table])
+                       for table in EVENT_TABLES}
+
+            with state.lock:
+                if state.version is None:
+                    state.version = version
+                elif state.version != version:
+                    # Другой поток уже загрузил ряды с другим счётчиком — сверяемся заново
+                    continue
+                for table, rows in fetched.items():
+                    series = state.series[table]
+                    # Параллельный запрос мог уже добавить часть этих строк
+                    rows = [row for row in rows if row[0] > series.last_id]
+                    ts, authors = [], []
+                    for entry_id, event_ts, role, name in rows:
+                        ts.append(event_ts)
+                        authors.append(state.author_code(role, name))
+                    series.extend(ts, authors)
+                    if rows:
+                        series.last_id = rows[-1][0]
+            return state
+
+    def intervals(self, family_id, since=None):
+        """Распределение интервалов между кормлениями, среднее и медиана (в минутах)"""
+        state = self._refresh(family_id)
+        with state.lock:
+            ts, _, _ = state.series['feedings'].window(since)
+            gaps = np.diff(ts) / 60.0
+
+        if not len(gaps):
+            return {
+                'count': 0,
+                'average_minutes': None,
+                'median_minutes': None,
+                'p90_minutes': None,
+                'bins': GAP_BINS.tolist(),
+                'histogram': [0] * len(GAP_BINS),
+            }
+
+        # Последняя корзина собирает всё, что длиннее суток
+        clipped = np.minimum(gaps, GAP_BINS[-1])
+        histogram = np.bincount(
+            np.searchsorted(GAP_BINS, clipped, side='right') - 1,
+            minlength=len(GAP_BINS),
+        )
+        return {
+            'count': int(len(gaps)),
+            'average_minutes': round(float(gaps.mean()), 1),
+            'median_minutes': round(float(np.median(gaps)), 1),
+            'p90_minutes': round(float(np.percentile(gaps, 90)), 1),
+            'bins': GAP_BINS.tolist(),
+            'histogram': histogram.tolist(),
+        }
+
+    def heatmap(self, family_id, since=None):
+        """Тепловая карта «день недели × час» для кормлений и смен подгузников"""
+        state = self._refresh(family_id)
+        result = {'weekdays': ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс'], 'hours': list(range(24))}
+        with state.lock:
+            for table in EVENT_TABLES:
+                _, how, _ = state.series[table].window(since)
+                counts = np.bincount(how, minlength=7 * 24).reshape(7, 24)
+                result[table] = counts.tolist()
+        return result
+
+    def authors(self, family_id, since=None):
+        """Доля событий по каждому автору"""
+        state = self._refresh(family_id)
+        with state.lock:
+            size = len(state.authors)
+            per_table = {}
+            for table in EVENT_TABLES:
+                _, _, codes = state.series[table].window(since)
+                per_table[table] = np.bincount(codes, minlength=size)
+            labels = list(state.authors)
+
+        if not size:
+            return []
+        totals = per_table['feedings'] + per_table['diapers']
+        grand_total = int(totals.sum())
+        order = np.argsort(-totals, kind='stable')
+        return [
+            {
+                'author': labels[i],
+                'feedings': int(per_table['feedings'][i]),
+                'diapers': int(per_table['diapers'][i]),
+                'total': int(totals[i]),
+                'share': round(float(totals[i]) / grand_total, 3) if grand_total else 0.0,
+            }
+            for i in order if totals[i]
+        ]
+
+
+class _GrowthSeries:
+    """Измерения одной семьи и посчитанные для них перцентили"""
+
+    def __init__(self):
+        self.ts = np.empty(0, dtype=np.float64)
+        self.values = {indicator: np.empty(0, dtype=np.float64) for indicator in growth.INDICATORS}
+        self.age = None
+        self.percentiles = None
+        self.baby = None
+        self.last_id = 0
+        self.lock = threading.Lock()
+
+
+class GrowthCache:
+    """Кривая роста по семьям: новые измерения дочитываются по id, перцентили
+    пересчитываются векторно только при новых измерениях или смене данных малыша"""
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _series(self, family_id):
+        with self._lock:
+            series = self._families.get(family_id)
+            if series is None:
+                series = self._families[family_id] = _GrowthSeries()
+            return series
+
+    def invalidate(self, family_id=None):
+        with self._lock:
+            if family_id is None:
+                self._families.clear()
+            else:
+                self._families.pop(family_id, None)
+
+    def series(self, family_id):
+        """Измерения с возрастом и перцентилями плюс линии ВОЗ для пола малыша"""
+        record = storage.get_baby_record(family_id)
+        birth_date, gender = (record[1], record[2]) if record else (None, None)
+        birth_ts, sex = growth.parse_birth_date(birth_date), growth.sex_code(gender)
+
+        series = self._series(family_id)
+        with series.lock:
+            # Измерения не удаляются, поэтому достаточно дочитать новые
+            rows = storage.get_growth_after_id(family_id, series.last_id)
+            if rows:
+                ts = np.array([row[1] for row in rows], dtype=np.float64)
+                series.ts = np.concatenate([series.ts, ts])
+                for column, indicator in enumerate(growth.INDICATORS, start=2):
+                    new = np.array([np.nan if row[column] is None else row[column] for row in rows], dtype=np.float64)
+                    series.values[indicator] = np.concatenate([series.values[indicator], new])
+                order = np.argsort(series.ts, kind='stable')
+                series.ts = series.ts[order]
+                series.values = {indicator: values[order] for indicator, values in series.values.items()}
+                series.last_id = rows[-1][0]
+                series.percentiles = None
+            if series.percentiles is None or series.baby != (birth_ts, sex):
+                series.baby = (birth_ts, sex)
+                series.age = growth.age_in_months(birth_ts, series.ts) if birth_ts is not None else None
+                series.percentiles = {
+                    indicator: growth.percentiles(indicator, sex, series.age, values) if series.age is not None
+                    else np.full(values.shape, np.nan)
+                    for indicator, values in series.values.items()
+                }
+            ts, values, percentiles, age = series.ts, series.values, series.percentiles, series.age
+
+        result = {
+            'birth_date': birth_date,
+            'sex': sex,
+            'ts': ts.astype(np.int64).tolist(),
+            'age_months': _nullable(np.round(age, 2)) if age is not None else [None] * len(ts),
+        }
+        for indicator in growth.INDICATORS:
+            result[indicator] = _nullable(values[indicator])
+            result[f"{indicator}_percentile"] = _nullable(np.round(percentiles[indicator], 1))
+        result['reference'] = {indicator: growth.reference_curves(indicator, sex)
+                               for indicator in growth.INDICATORS} if sex else None
+        return result
+
+
+def _nullable(values):
+    """Массив → список для JSON, NaN → None"""
+    return [None if np.isnan(value) else float(value) for value in values]
@@ -4,48 +4,76 @@
 BabyCareBot Mini App - Веб-дашборд для родителей
 """
 
-from flask import Flask, render_template, jsonify, request
-import sqlite3
+from flask import Flask, render_template, jsonify, request, abort, send_file
 from datetime import datetime, timedelta
-import pytz
 import json
+import logging
+import os
+import sys
+
+# Общий слой данных лежит в корне проекта, рядом с main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import clock
+import export
+import storage
+from logconfig import setup_logging
+
+import auth
+from analytics import AnalyticsCache, GrowthCache, THAI_TZ
+from compression import compress_response
+from assets import (build_assets, pick_precompressed, guess_mimetype,
+                    PrecompressedBody, IMMUTABLE_CACHE_CONTROL)
+
+setup_logging()
+logger = logging.getLogger('babybot.dashboard')
 
 app = Flask(__name__)
+analytics = AnalyticsCache()
+growth_cache = GrowthCache()
+
+# Хэшированные копии статики собираются в create_app() (см. assets.py)
+ASSET_MANIFEST = {}
+_dashboard_page = None
+
+def create_app():
+    """Подготовить дашборд к работе и вернуть WSGI-приложение.
+
+    Импорт модуля только регистрирует маршруты; база (схема и миграции —
+    дашборд может стартовать раньше бота или на старой базе) и хэшированная
+    статика готовятся здесь, один раз при запуске сервера (wsgi.py).
+    Повторный вызов безопасен.
+    """
+    storage.init_db()
+    ASSET_MANIFEST.update(build_assets())
+    return app
+
+@app.template_global()
+def asset_url(name):
+    """URL статического файла с хэшем содержимого в имени"""
+    return f"/assets/{ASSET_MANIFEST[name]}"
 
 # Функция для получения тайского времени
 def get_thai_time():
-    """Получить текущее время в тайском часовом поясе"""
-    thai_tz = pytz.timezone('Asia/Bangkok')
-    utc_now = datetime.now(pytz.UTC)
-    thai_now = utc_now.astimezone(thai_tz)
-    return thai_now
+    """Получить текущее время в тайском часовом поясе (по часам из clock.py)"""
+    return clock.now()
 
 def get_thai_date():
     """Получить текущую дату в тайском часовом поясе"""
-    return get_thai_time().date()
+    return clock.today()
 
 def get_baby_info(family_id):
     """Получить информацию о малыше"""
-    conn = sqlite3.connect("../babybot.db")
-    cur = conn.cursor()
-    
     # Получаем информацию о семье
-    cur.execute("SELECT name FROM families WHERE id = ?", (family_id,))
-    family_name = cur.fetchone()
+    family_name = storage.get_family_name(family_id)
     
     # Получаем членов семьи
-    cur.execute("SELECT user_id, role, name FROM family_members WHERE family_id = ?", (family_id,))
-    members = cur.fetchall()
+    members = storage.get_family_members_with_roles(family_id)
     
     # Получаем настройки
-    cur.execute("SELECT feed_interval, diaper_interval, tips_enabled, tips_time_hour, tips_time_minute, bath_interval, bath_time_hour, bath_time_minute, bath_enabled FROM settings WHERE family_id = ?", (family_id,))
-    settings = cur.fetchone()
+    settings = storage.get_settings(family_id)
     
     # Получаем информацию о малыше из базы данных
-    cur.execute("SELECT name, birth_date, gender, weight, height FROM baby_info WHERE family_id = ?", (family_id,))
-    baby_result = cur.fetchone()
-    
-    conn.close()
+    baby_result = storage.get_baby_record(family_id)
     
     if baby_result:
         name, birth_date, gender, weight, height = baby_result
@@ -55,7 +83,7 @@ def get_baby_info(family_id):
         if birth_date:
             try:
                 birth_dt = datetime.strptime(birth_date, "%d.%m.%Y")
-                today = datetime.now()
+                today = get_thai_date()
                 age_months = (today.year - birth_dt.year) * 12 + (today.month - birth_dt.month)
                 if today.day < birth_dt.day:
                     age_months -= 1
@@ -82,136 +110,165 @@ def get_baby_info(family_id):
         }
     
     return {
-        'family_name': family_name[0] if family_name else 'Неизвестная семья',
+        'family_name': family_name,
         'baby': baby_info,
         'members': [{'user_id': m[0], 'role': m[1], 'name': m[2]} for m in members],
         'settings': {
-            'feed_interval': settings[0] if settings else 3,
-            'diaper_interval': settings[1] if settings else 2,
-            'tips_enabled': settings[2] if settings else 1,
-            'tips_time': f"{settings[3]:02d}:{settings[4]:02d}" if settings and settings[3] is not None else "09:00",
-            'bath_interval': settings[5] if settings else 1,
-            'bath_time': f"{settings[6]:02d}:{settings[7]:02d}" if settings and settings[6] is not None else "19:00",
-            'bath_enabled': settings[8] if settings else 1
+            'feed_interval': settings['feed_interval'] if settings else 3,
+            'diaper_interval': settings['diaper_interval'] if settings else 2,
+            'tips_enabled': settings['tips_enabled'] if settings else 1,
+            'tips_time': f"{settings['tips_time_hour']:02d}:{settings['tips_time_minute']:02d}" if settings and settings['tips_time_hour'] is not None else "09:00",
+            'bath_interval': settings['bath_interval'] if settings else 1,
+            'bath_time': f"{settings['bath_time_hour']:02d}:{settings['bath_time_minute']:02d}" if settings and settings['bath_time_hour'] is not None else "19:00",
+            'bath_enabled': settings['bath_enabled'] if settings else 1
         }
     }
 
-def get_recent_activity(family_id, days=7):
+ACTIVITY_TYPES = {'feedings': 'feeding', 'diapers': 'diaper', 'sleep': 'sleep', 'baths': 'bath'}
+
+def get_recent_activity(family_id, days=7, limit=20):
     """Получить последнюю активность семьи"""
-    conn = sqlite3.connect("../babybot.db")
-    cur = conn.cursor()
-    
-    # Получаем кормления за последние дни
-    start_date = (get_thai_date() - timedelta(days=days)).isoformat()
-    cur.execute("""
-        SELECT timestamp, author_role, author_name 
-        FROM feedings 
-        WHERE family_id = ? AND timestamp >= ? 
-        ORDER BY timestamp DESC
-    """, (family_id, start_date))
-    feedings = cur.fetchall()
-    
-    # Получаем смены подгузников за последние дни
-    cur.execute("""
-        SELECT timestamp, author_role, author_name 
-        FROM diapers 
-        WHERE family_id = ? AND timestamp >= ? 
-        ORDER BY timestamp DESC
-    """, (family_id, start_date))
-    diapers = cur.fetchall()
-    
-    conn.close()
+    # Все виды событий за последние дни — одним запросом, новые сверху
+    start_date = get_thai_date() - timedelta(days=days)
+    rows = storage.get_timeline(family_id, start_date.isoformat(), limit=limit)
     
     # Форматируем данные
     activities = []
+    for _, table, ts, role, name in rows:
+        dt = clock.from_timestamp(ts)
+        activities.append({
+            'type': ACTIVITY_TYPES[table],
+            'time': dt.strftime('%H:%M'),
+            'date': dt.strftime('%d.%m'),
+            'author': f"{role} {name}" if role and name else "Неизвестно",
+            'timestamp': dt.isoformat()
+        })
     
-    for f in feedings:
-        try:
-            dt = datetime.fromisoformat(f[0])
-            activities.append({
-                'type': 'feeding',
-                'time': dt.strftime('%H:%M'),
-                'date': dt.strftime('%d.%m'),
-                'author': f"{f[1]} {f[2]}" if f[1] and f[2] else "Неизвестно",
-                'timestamp': f[0]
-            })
-        except:
-            continue
-    
-    for d in diapers:
-        try:
-            dt = datetime.fromisoformat(d[0])
-            activities.append({
-                'type': 'diaper',
-                'time': dt.strftime('%H:%M'),
-                'date': dt.strftime('%d.%m'),
-                'author': f"{d[1]} {d[2]}" if d[1] and d[2] else "Неизвестно",
-                'timestamp': d[0]
-            })
-        except:
-            continue
+    return activities
+
+def get_activity_columns(family_id, days=7, limit=20):
+    """Последняя активность в колоночном виде: параллельные массивы, epoch-время и таблица авторов"""
+    start_date = get_thai_date() - timedelta(days=days)
+    rows = storage.get_timeline(family_id, start_date.isoformat(), limit=limit)
+    type_codes = {table: code for code, table in enumerate(ACTIVITY_TYPES)}
     
-    # Сортируем по времени
-    activities.sort(key=lambda x: x['timestamp'], reverse=True)
+    # Имена авторов передаются один раз, в массиве author — индексы в этой таблице
+    authors = []
+    author_index = {}
+    author_codes = []
+    for _, _, _, role, name in rows:
+        label = f"{role} {name}" if role and name else "Неизвестно"
+        code = author_index.get(label)
+        if code is None:
+            code = author_index[label] = len(authors)
+            authors.append(label)
+        author_codes.append(code)
     
-    return activities[:20]  # Возвращаем последние 20 активностей
+    return {
+        'format': 'columnar',
+        'types': list(ACTIVITY_TYPES.values()),
+        'authors': authors,
+        'ts': [int(row[2]) for row in rows],
+        'type': [type_codes[row[1]] for row in rows],
+        'author': author_codes,
+    }
 
 def get_daily_stats(family_id, days=7):
     """Получить статистику по дням"""
-    conn = sqlite3.connect("../babybot.db")
-    cur = conn.cursor()
+    today = get_thai_date()
+    first_day = today - timedelta(days=days - 1)
+    # Все дни и виды событий — одним запросом: штуки по тайским суткам и секунды сна
+    totals = storage.get_daily_totals(family_id, first_day.isoformat())
     
     stats = []
-    
     for i in range(days):
-        target_date = get_thai_date() - timedelta(days=i)
-        start_date = datetime.combine(target_date, datetime.min.time()).isoformat()
-        end_date = datetime.combine(target_date, datetime.max.time()).isoformat()
-        
-        # Кормления за день
-        cur.execute("""
-            SELECT COUNT(*) FROM feedings 
-            WHERE family_id = ? AND timestamp BETWEEN ? AND ?
-        """, (family_id, start_date, end_date))
-        feedings_count = cur.fetchone()[0]
-        
-        # Смены подгузников за день
-        cur.execute("""
-            SELECT COUNT(*) FROM diapers 
-            WHERE family_id = ? AND timestamp BETWEEN ? AND ?
-        """, (family_id, start_date, end_date))
-        diapers_count = cur.fetchone()[0]
-        
+        target_date = today - timedelta(days=i)
+        day = target_date.isoformat()
+        feedings_count = totals.get((day, 'feedings'), 0)
+        diapers_count = totals.get((day, 'diapers'), 0)
         stats.append({
             'date': target_date.strftime('%d.%m'),
             'feedings': feedings_count,
             'diapers': diapers_count,
+            'sleep_hours': round(totals.get((day, 'sleep'), 0) / 3600, 1),
             'total': feedings_count + diapers_count
         })
     
-    conn.close()
     return stats
 
+def stats_to_columns(stats, days):
+    """Перевести статистику по дням в колоночный вид (даты — epoch начала тайских суток)"""
+    today = get_thai_date()
+    return {
+        'format': 'columnar',
+        'date': [
+            int(THAI_TZ.localize(datetime.combine(today - timedelta(days=i), datetime.min.time())).timestamp())
+            for i in range(days)
+        ],
+        'feedings': [day['feedings'] for day in stats],
+        'diapers': [day['diapers'] for day in stats],
+        'sleep_hours': [day['sleep_hours'] for day in stats],
+    }
+
+def wants_columnar():
+    """Клиент запросил компактный колоночный формат (?format=columnar)"""
+    return request.args.get('format') == 'columnar'
+
+@app.after_request
+def compress_api_response(response):
+    """Сжимаем ответы API (gzip или brotli)"""
+    if request.path.startswith('/api/'):
+        return compress_response(response, request.headers.get('Accept-Encoding'))
+    return response
+
 @app.route('/')
 def dashboard():
-    """Главная страница дашборда"""
-    return render_template('dashboard.html')
+    """Главная страница дашборда (шаблон рендерится и сжимается один раз)"""
+    global _dashboard_page
+    if _dashboard_page is None:
+        html = render_template('dashboard.html').encode('utf-8')
+        _dashboard_page = PrecompressedBody(html, 'text/html; charset=utf-8')
+    page = _dashboard_page
+
+    if request.if_none_match.contains(page.etag):
+        response = app.response_class(status=304)
+    else:
+        body, encoding = page.select(request.headers.get('Accept-Encoding'))
+        response = app.response_class(body, content_type=page.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(page.etag)
+    # Страницу можно хранить в кэше, но перед показом нужно сверить ETag
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.route('/assets/<path:filename>')
+def assets(filename):
+    """Хэшированная статика: предсжатый вариант и вечный кэш"""
+    path, encoding = pick_precompressed(filename, request.headers.get('Accept-Encoding'))
+    if path is None:
+        abort(404)
+    response = send_file(path, mimetype=guess_mimetype(filename), conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 @app.route('/api/baby/<int:family_id>')
 def api_baby(family_id):
     """API для получения данных о малыше"""
     try:
-        print(f"DEBUG: Запрос информации о малыше для семьи {family_id}")
+        logger.debug("Запрос информации о малыше для семьи %s", family_id)
         baby_data = get_baby_info(family_id)
-        print(f"DEBUG: Получены данные: {baby_data}")
+        logger.debug("Получены данные: %s", baby_data)
         if baby_data:
             return jsonify(baby_data)
         else:
             return jsonify({'error': 'Семья не найдена'}), 404
     except Exception as e:
-        print(f"ERROR: Ошибка в API baby: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Ошибка в API baby: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/activity/<int:family_id>')
@@ -219,6 +276,9 @@ def api_activity(family_id):
     """API для получения последней активности"""
     try:
         days = request.args.get('days', 7, type=int)
+        if wants_columnar():
+            limit = request.args.get('limit', 20, type=int)
+            return jsonify(get_activity_columns(family_id, days, limit))
         activities = get_recent_activity(family_id, days)
         return jsonify(activities)
     except Exception as e:
@@ -230,20 +290,89 @@ def api_stats(family_id):
     try:
         days = request.args.get('days', 7, type=int)
         stats = get_daily_stats(family_id, days)
+        if wants_columnar():
+            return jsonify(stats_to_columns(stats, days))
         return jsonify(stats)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def analytics_since():
+    """Начало окна аналитики из параметра ?days= (0 или отсутствие — вся история)"""
+    days = request.args.get('days', 0, type=int)
+    return clock.time() - days * 86400 if days > 0 else None
+
+@app.route('/api/analytics/<int:family_id>/intervals')
+def api_analytics_intervals(family_id):
+    """API распределения интервалов между кормлениями"""
+    try:
+        return jsonify(analytics.intervals(family_id, analytics_since()))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analytics/<int:family_id>/heatmap')
+def api_analytics_heatmap(family_id):
+    """API тепловой карты «день недели × час»"""
+    try:
+        return jsonify(analytics.heatmap(family_id, analytics_since()))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analytics/<int:family_id>/authors')
+def api_analytics_authors(family_id):
+    """API доли событий по членам семьи"""
+    try:
+        return jsonify(analytics.authors(family_id, analytics_since()))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/growth/<int:family_id>')
+def api_growth(family_id):
+    """API кривой роста: измерения с перцентилями ВОЗ и линии перцентилей"""
+    try:
+        return jsonify(growth_cache.series(family_id))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def request_init_data():
+    """initData Mini App из заголовка Authorization: tma <initData> или параметра ?init_data="""
+    scheme, _, value = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'tma':
+        return value.strip()
+    return request.args.get('init_data', '')
+
+@app.route('/api/export/<int:family_id>')
+def api_export(family_id):
+    """Выгрузка истории семьи потоком: ?format=csv (по умолчанию) или jsonl.
+
+    Только для участника семьи: пользователь берётся из подписанного initData.
+    """
+    if not auth.enabled():
+        return jsonify({'error': "Выгрузка выключена: не задан BOT_TOKEN"}), 503
+    try:
+        user = auth.validate_init_data(request_init_data())
+    except auth.InvalidInitData as e:
+        return jsonify({'error': str(e)}), 401
+    if storage.get_family_id(user['id']) != family_id:
+        logger.warning("⚠️ Пользователь %s запросил выгрузку чужой семьи %s", user['id'], family_id)
+        return jsonify({'error': "Нет доступа к этой семье"}), 403
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        return jsonify({'error': f"Формат должен быть одним из: {', '.join(export.FORMATS)}"}), 400
+    # Генератор читает события курсором и отдаёт кусками — ответ не собирается в памяти
+    response = app.response_class(export.iter_export(family_id, fmt), mimetype=export.MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{export.filename(family_id, fmt)}"'
+    return response
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
         'service': 'babycare-mini-app',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': get_thai_time().isoformat()
     })
 
 if __name__ == '__main__':
     # Получаем порт из переменных окружения Replit или используем 5000 по умолчанию
-    port = int(os.environ.get('PORT', 5000))
-    app.run(debug=False, host='0.0.0.0', port=port)
+    from wsgi import serve
+    serve(port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Статические ресурсы дашборда
+
+Файлы из static/ копируются в DIST_DIR под именами с хэшем содержимого,
+текстовые — вместе с предсжатыми .gz и .br вариантами. Ссылки url(...)
+внутри CSS переписываются на хэшированные имена. Такие файлы можно
+кэшировать навсегда: при изменении содержимого меняется и имя.
+
+DIST_DIR задаётся переменной DASHBOARD_ASSETS_DIR, по умолчанию — каталог
+во временной директории: дерево исходников может быть доступно только для
+чтения. Сборка идемпотентна (готовые файлы не перезаписываются, новые
+пишутся атомарно) и выполняется в app.create_app(). На деплое её лучше
+сделать заранее, отдельным шагом, с тем же DASHBOARD_ASSETS_DIR:
+
+    python assets.py
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import tempfile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.abspath(os.environ.get('DASHBOARD_ASSETS_DIR')
+                           or os.path.join(tempfile.gettempdir(), 'babycare-assets'))
+# Сюда сборка писала раньше; остатки не должны попасть в исходники
+_LEGACY_DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+
+# Эти типы хорошо сжимаются; woff2 и картинки уже сжаты
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.json', '.txt')
+CSS_URL_RE = re.compile(r'url\((["\']?)([^)"\']+)\1\)')
+
+# Заголовок для хэшированных файлов: содержимое по этому адресу никогда не меняется
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _hashed_name(path, data):
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def _write_atomic(path, data):
+    """Записать файл через временный, чтобы параллельные воркеры не видели его наполовину"""
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _rewrite_css_urls(source_path, css, manifest):
+    """Заменить относительные url(...) в CSS на хэшированные имена"""
+    source_dir = posixpath.dirname(source_path)
+    dist_dir = posixpath.dirname(manifest.get(source_path, source_path))
+
+    def replace(match):
+        quote, url = match.groups()
+        if url.startswith(('data:', 'http:', 'https:', '/', '#')):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(source_dir, url.split('?')[0].split('#')[0]))
+        hashed = manifest.get(target)
+        if hashed is None:
+            return match.group(0)
+        return f"url({quote}{posixpath.relpath(hashed, dist_dir)}{quote})"
+
+    return CSS_URL_RE.sub(replace, css)
+
+
+def _source_files():
+    """Все исходные файлы static/ в виде путей через '/' относительно static/"""
+    skip = {DIST_DIR, _LEGACY_DIST_DIR}
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) not in skip]
+        for name in files:
+            if name.startswith('.') or name == 'LICENSE':
+                continue
+            rel = os.path.relpath(os.path.join(root, name), STATIC_DIR)
+            yield rel.replace(os.sep, '/')
+
+
+def build_assets():
+    """Собрать DIST_DIR и вернуть манифест {исходный путь: хэшированный путь}"""
+    manifest = {}
+    # CSS обрабатываем последним: ему нужны хэшированные имена шрифтов и картинок
+    sources = sorted(_source_files(), key=lambda p: (p.endswith('.css'), p))
+    for path in sources:
+        with open(os.path.join(STATIC_DIR, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            data = _rewrite_css_urls(path, data.decode('utf-8'), manifest).encode('utf-8')
+
+        hashed = _hashed_name(path, data)
+        manifest[path] = hashed
+        target = os.path.join(DIST_DIR, *hashed.split('/'))
+        _write_atomic(target, data)
+        if path.endswith(PRECOMPRESS_EXTENSIONS):
+            _write_atomic(target + '.gz', gzip.compress(data, compresslevel=9))
+            if brotli is not None:
+                _write_atomic(target + '.br', brotli.compress(data, quality=11))
+    return manifest
+
+
+def pick_precompressed(filename, accept_encoding):
+    """Выбрать предсжатый вариант файла из DIST_DIR: (путь, Content-Encoding или None)"""
+    path = os.path.normpath(os.path.join(DIST_DIR, filename))
+    if not path.startswith(DIST_DIR + os.sep) or not os.path.isfile(path):
+        return None, None
+    accepted = {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')}
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in accepted and os.path.isfile(path + suffix):
+            return path + suffix, encoding
+    return path, None
+
+
+def guess_mimetype(filename):
+    """MIME-тип по исходному имени файла"""
+    if filename.endswith('.woff2'):
+        return 'font/woff2'
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+class PrecompressedBody:
+    """Готовое тело ответа с gzip/brotli вариантами и ETag"""
+
+    def __init__(self, data, mimetype):
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(data).hexdigest()[:16]
+        self.variants = {None: data, 'gzip': gzip.compress(data, compresslevel=9)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(data, quality=11)
+
+    def select(self, accept_encoding):
+        """Лучший вариант для клиента: (байты, Content-Encoding или None)"""
+        accepted = {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.variants:
+                return self.variants[encoding], encoding
+        return self.variants[None], None
+
+
+if __name__ == '__main__':
+    built = build_assets()
+    for source, hashed in sorted(built.items()):
+        print(f"{source} -> {os.path.join(DIST_DIR, hashed)}")
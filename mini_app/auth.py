@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка пользователя Telegram Mini App
+
+Telegram передаёт мини-приложению строку initData (Telegram.WebApp.initData),
+подписанную токеном бота. Дашборд проверяет подпись и давность auth_date и
+берёт из неё id пользователя — в отличие от family_id в URL, его подделать
+нельзя. Без BOT_TOKEN проверка выключена и защищённые эндпоинты отвечают 503.
+
+    secret = HMAC_SHA256(key="WebAppData", msg=BOT_TOKEN)
+    hash   = HMAC_SHA256(key=secret, msg="\\n".join(sorted("key=value" без hash)))
+"""
+
+import hashlib
+import hmac
+import json
+import os
+from urllib.parse import parse_qsl
+
+import clock
+
+BOT_TOKEN = os.getenv('BOT_TOKEN', '')
+
+# initData старше этого не принимается: ссылку с ним нельзя переиспользовать бессрочно
+INIT_DATA_MAX_AGE = 24 * 3600
+
+
+class InvalidInitData(Exception):
+    """initData отсутствует, подделана или устарела"""
+
+
+def enabled():
+    return bool(BOT_TOKEN)
+
+
+def _signature(pairs, bot_token):
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(pairs.items()))
+    secret = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    return hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+
+
+def validate_init_data(init_data, max_age=INIT_DATA_MAX_AGE, now=None):
+    """Проверить initData и вернуть пользователя Telegram (словарь с id)"""
+    if not enabled():
+        raise InvalidInitData("Проверка initData выключена: не задан BOT_TOKEN")
+    if not init_data:
+        raise InvalidInitData("Нет initData")
+    try:
+        pairs = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=True))
+    except ValueError:
+        raise InvalidInitData("initData не разбирается")
+    received = pairs.pop('hash', '')
+    # Сравнение за постоянное время
+    if not hmac.compare_digest(received.encode(), _signature(pairs, BOT_TOKEN).encode()):
+        raise InvalidInitData("Подпись initData не совпадает")
+    try:
+        auth_date = int(pairs['auth_date'])
+        user = json.loads(pairs['user'])
+        user_id = int(user['id'])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidInitData("В initData нет auth_date или пользователя")
+    if (clock.time() if now is None else now) - auth_date > max_age:
+        raise InvalidInitData("initData устарела")
+    return dict(user, id=user_id)
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Настройки gunicorn для веб-дашборда
+
+Запуск: cd mini_app && gunicorn -c gunicorn.conf.py wsgi:application
+Плавная перезагрузка кода без потери запросов: kill -HUP <pid мастера>
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Несколько процессов с пулом потоков: каждый поток держит своё соединение с SQLite
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.environ.get('DASHBOARD_THREADS', 4))
+
+# Таймауты запросов и плавной остановки
+timeout = int(os.environ.get('DASHBOARD_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Периодический перезапуск воркеров ограничивает рост памяти (кэши аналитики)
+max_requests = 2000
+max_requests_jitter = 200
+
+# Приложение импортируется в каждом воркере, поэтому соединения с базой не наследуются через fork
+preload_app = False
+
+accesslog = os.environ.get('DASHBOARD_ACCESS_LOG')
+errorlog = '-'
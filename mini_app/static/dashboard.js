@@ -0,0 +1,282 @@
+let currentFamilyId = null;
+let statsChart = null;
+let growthChart = null;
+
+// Загрузка данных малыша
+async function loadBabyData() {
+    try {
+        // Используем фиксированный family_id = 1
+        const familyId = 1;
+        currentFamilyId = familyId;
+
+        // Загружаем информацию о малыше
+        const babyResponse = await fetch(`/api/baby/${familyId}`);
+        const babyData = await babyResponse.json();
+
+        displayBabyInfo(babyData);
+
+        // Загружаем статистику
+        const statsResponse = await fetch(`/api/stats/${familyId}`);
+        const statsData = await statsResponse.json();
+
+        displayStats(statsData);
+        createStatsChart(statsData);
+
+        // Загружаем активность
+        const activityResponse = await fetch(`/api/activity/${familyId}`);
+        const activityData = await activityResponse.json();
+
+        displayActivity(activityData);
+
+        // Загружаем кривую роста
+        const growthResponse = await fetch(`/api/growth/${familyId}`);
+        const growthData = await growthResponse.json();
+
+        createGrowthChart(growthData);
+
+        // Показываем все секции
+        document.getElementById('babyInfo').style.display = 'block';
+        document.getElementById('careSettingsSection').style.display = 'block';
+        document.getElementById('statsSection').style.display = 'block';
+        document.getElementById('chartSection').style.display = 'block';
+        document.getElementById('activitySection').style.display = 'block';
+        document.getElementById('membersSection').style.display = 'block';
+
+    } catch (error) {
+        console.error('Ошибка загрузки данных малыша:', error);
+    }
+}
+
+
+
+// Отображение информации о малыше
+function displayBabyInfo(babyData) {
+    // Отображаем информацию о малыше
+    document.getElementById('babyName').textContent = babyData.baby.name;
+    document.getElementById('babyAge').textContent = `${babyData.baby.age_months} мес.`;
+    document.getElementById('babyWeight').textContent = babyData.baby.weight;
+    document.getElementById('babyHeight').textContent = babyData.baby.height;
+    document.getElementById('babyGender').textContent = babyData.baby.gender;
+    document.getElementById('babyBirthDate').textContent = babyData.baby.birth_date;
+    document.getElementById('familyName').textContent = babyData.family_name;
+
+    // Отображаем настройки ухода
+    document.getElementById('feedInterval').textContent = babyData.settings.feed_interval;
+    document.getElementById('diaperInterval').textContent = babyData.settings.diaper_interval;
+    document.getElementById('bathTime').textContent = babyData.settings.bath_time;
+    document.getElementById('tipsTime').textContent = babyData.settings.tips_time;
+
+    // Отображаем членов семьи
+    const membersList = document.getElementById('membersList');
+    membersList.innerHTML = '';
+
+    babyData.members.forEach(member => {
+        const memberDiv = document.createElement('div');
+        memberDiv.className = 'activity-item';
+        memberDiv.innerHTML = `
+            <div class="row align-items-center">
+                <div class="col-md-6">
+                    <strong>${member.role}</strong> ${member.name}
+                </div>
+                <div class="col-md-6 text-end">
+                    <span class="badge bg-primary">ID: ${member.user_id}</span>
+                </div>
+            </div>
+        `;
+        membersList.appendChild(memberDiv);
+    });
+}
+
+// Отображение статистики
+function displayStats(statsData) {
+    const totalFeedings = statsData.reduce((sum, day) => sum + day.feedings, 0);
+    const totalDiapers = statsData.reduce((sum, day) => sum + day.diapers, 0);
+    const totalSleep = statsData.reduce((sum, day) => sum + (day.sleep_hours || 0), 0);
+    const totalActivities = totalFeedings + totalDiapers;
+
+    document.getElementById('totalFeedings').textContent = totalFeedings;
+    document.getElementById('totalDiapers').textContent = totalDiapers;
+    document.getElementById('avgSleep').textContent = (totalSleep / (statsData.length || 1)).toFixed(1);
+    document.getElementById('totalActivities').textContent = totalActivities;
+}
+
+// Создание графика статистики
+function createStatsChart(statsData) {
+    const ctx = document.getElementById('statsChart').getContext('2d');
+
+    if (statsChart) {
+        statsChart.destroy();
+    }
+
+    const labels = statsData.map(day => day.date).reverse();
+    const feedingData = statsData.map(day => day.feedings).reverse();
+    const diaperData = statsData.map(day => day.diapers).reverse();
+    const sleepData = statsData.map(day => day.sleep_hours || 0).reverse();
+
+    statsChart = new Chart(ctx, {
+        type: 'bar',
+        data: {
+            labels: labels,
+            datasets: [
+                {
+                    label: 'Кормления',
+                    data: feedingData,
+                    backgroundColor: '#ff9a9e',
+                    borderColor: '#ff9a9e',
+                    borderWidth: 1
+                },
+                {
+                    label: 'Смены подгузников',
+                    data: diaperData,
+                    backgroundColor: '#a8edea',
+                    borderColor: '#a8edea',
+                    borderWidth: 1
+                },
+                {
+                    label: 'Сон, ч',
+                    data: sleepData,
+                    backgroundColor: '#c3b1e1',
+                    borderColor: '#c3b1e1',
+                    borderWidth: 1
+                }
+            ]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    ticks: {
+                        stepSize: 1
+                    }
+                }
+            },
+            plugins: {
+                legend: {
+                    position: 'top'
+                }
+            }
+        }
+    });
+}
+
+// График веса на фоне линий перцентилей ВОЗ
+function createGrowthChart(growthData) {
+    const section = document.getElementById('growthSection');
+    const points = (growthData.weight || [])
+        .map((weight, i) => ({ x: growthData.age_months[i], y: weight }))
+        .filter(point => point.x !== null && point.y !== null);
+
+    if (!growthData.reference || points.length === 0) {
+        section.style.display = 'none';
+        return;
+    }
+
+    if (growthChart) {
+        growthChart.destroy();
+    }
+
+    const reference = growthData.reference.weight;
+    const referenceLine = (key, color) => ({
+        type: 'line',
+        label: key.toUpperCase(),
+        data: reference.months.map((month, i) => ({ x: month, y: reference[key][i] })),
+        borderColor: color,
+        borderWidth: 1,
+        pointRadius: 0,
+        fill: false
+    });
+
+    growthChart = new Chart(document.getElementById('growthChart').getContext('2d'), {
+        type: 'scatter',
+        data: {
+            datasets: [
+                referenceLine('p3', '#f5c6cb'),
+                referenceLine('p50', '#adb5bd'),
+                referenceLine('p97', '#f5c6cb'),
+                {
+                    label: 'Вес, кг',
+                    data: points,
+                    backgroundColor: '#ff9a9e',
+                    pointRadius: 4
+                }
+            ]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            scales: {
+                x: { type: 'linear', title: { display: true, text: 'Возраст, мес.' } },
+                y: { title: { display: true, text: 'кг' } }
+            },
+            plugins: {
+                legend: {
+                    position: 'top'
+                }
+            }
+        }
+    });
+    section.style.display = 'block';
+}
+
+// Оформление видов активности
+const ACTIVITY_VIEW = {
+    feeding: { className: 'feeding-item', icon: 'fa-utensils icon-feeding', text: 'Кормление' },
+    diaper: { className: 'diaper-item', icon: 'fa-baby icon-diaper', text: 'Смена подгузника' },
+    sleep: { className: 'sleep-item', icon: 'fa-moon icon-sleep', text: 'Сон' },
+    bath: { className: 'bath-item', icon: 'fa-bath icon-bath', text: 'Купание' }
+};
+
+// Отображение активности
+function displayActivity(activityData) {
+    const activityList = document.getElementById('activityList');
+    activityList.innerHTML = '';
+
+    if (activityData.length === 0) {
+        activityList.innerHTML = '<div class="text-center text-muted">Активности пока нет</div>';
+        return;
+    }
+
+    activityData.forEach(activity => {
+        const activityDiv = document.createElement('div');
+        const view = ACTIVITY_VIEW[activity.type] || ACTIVITY_VIEW.diaper;
+        activityDiv.className = `activity-item ${view.className}`;
+
+        const icon = view.icon;
+        const typeText = view.text;
+
+        activityDiv.innerHTML = `
+            <div class="row align-items-center">
+                <div class="col-md-2">
+                    <i class="fas ${icon} fa-lg"></i>
+                </div>
+                <div class="col-md-3">
+                    <strong>${typeText}</strong>
+                </div>
+                <div class="col-md-2">
+                    ${activity.time}
+                </div>
+                <div class="col-md-2">
+                    ${activity.date}
+                </div>
+                <div class="col-md-3 text-end">
+                    <small class="text-muted">${activity.author}</small>
+                </div>
+            </div>
+        `;
+        activityList.appendChild(activityDiv);
+    });
+}
+
+// Обновление данных
+function refreshData() {
+    if (currentFamilyId) {
+        loadBabyData();
+    }
+}
+
+// Загрузка при старте
+document.addEventListener('DOMContentLoaded', function() {
+    loadBabyData();
+});
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Продакшн-запуск веб-дашборда
+
+Отдельным процессом (несколько воркеров, таймауты, плавная перезагрузка по SIGHUP):
+
+    cd mini_app && gunicorn -c gunicorn.conf.py wsgi:application
+
+В одном процессе с ботом (Replit) используется serve(): многопоточный waitress,
+а если он не установлен — встроенный сервер Flask в многопоточном режиме.
+Соединения с базой создаются по одному на рабочий поток и переиспользуются
+между запросами (см. storage.get_connection).
+"""
+
+import logging
+import os
+
+from app import create_app
+
+logger = logging.getLogger('babybot.dashboard')
+
+application = app = create_app()
+
+
+def serve(host='0.0.0.0', port=None):
+    """Запустить дашборд в текущем процессе"""
+    port = port or int(os.environ.get('PORT', 5000))
+    mode = os.environ.get('DASHBOARD_SERVER', 'production')
+
+    if mode == 'production':
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            logger.warning("⚠️ waitress не установлен, используем встроенный сервер Flask")
+        else:
+            threads = int(os.environ.get('DASHBOARD_THREADS', 8))
+            timeout = int(os.environ.get('DASHBOARD_TIMEOUT', 30))
+            logger.info("🌐 Дашборд (waitress, %s потоков) на порту %s", threads, port)
+            waitress_serve(
+                app,
+                host=host,
+                port=port,
+                threads=threads,
+                channel_timeout=timeout,
+                connection_limit=int(os.environ.get('DASHBOARD_CONNECTION_LIMIT', 200)),
+                ident='babycare-mini-app',
+            )
+            return
+
+    logger.info("🌐 Дашборд (Flask dev server) на порту %s", port)
+    app.run(host=host, port=port, debug=False, threaded=True)
+
+
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Профилирование работающего бота по запросу
+
+Health-сервер отдаёт эти функции на /debug/profile и /debug/tracemalloc,
+если задан PROFILING_TOKEN (токен передаётся заголовком
+«Authorization: Bearer <токен>» или параметром ?token=). Без токена
+эндпоинты выключены.
+
+Режимы /debug/profile:
+    sample   — стек-сэмплер: раз в interval мс снимает стеки потоков через
+               sys._current_frames() и возвращает collapsed stacks
+               (формат flamegraph.pl / speedscope)
+    cprofile — cProfile в потоке event loop на seconds секунд; отчёт pstats
+               текстом или двоичным дампом (&format=pstats)
+
+/debug/tracemalloc сравнивает снимки памяти в начале и в конце окна.
+"""
+
+import collections
+import cProfile
+import functools
+import hmac
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+
+MAX_SECONDS = 120
+DEFAULT_SECONDS = 10
+DEFAULT_INTERVAL_MS = 10
+
+# Одновременно идёт только одно профилирование
+_busy = threading.Lock()
+_loop = None
+
+
+class ProfilerBusy(Exception):
+    """Профилирование уже выполняется"""
+
+
+def enabled():
+    return bool(PROFILING_TOKEN)
+
+
+def check_token(token):
+    """Сравнить токен за постоянное время"""
+    return enabled() and bool(token) and hmac.compare_digest(token, PROFILING_TOKEN)
+
+
+def attach_loop(loop):
+    """Запомнить event loop бота (cProfile включается в его потоке)"""
+    global _loop
+    _loop = loop
+
+
+def clamp_seconds(value):
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_SECONDS
+    return min(max(seconds, 0.1), MAX_SECONDS)
+
+
+def _exclusive(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _busy.acquire(blocking=False):
+            raise ProfilerBusy("Профилирование уже выполняется")
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _busy.release()
+    return wrapper
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+@_exclusive
+def sample_stacks(seconds=DEFAULT_SECONDS, interval_ms=DEFAULT_INTERVAL_MS, loop_only=False):
+    """Стек-сэмплер: collapsed stacks «поток;f1;f2;... N», самые частые первыми"""
+    interval = max(interval_ms, 1) / 1000.0
+    own_thread = threading.get_ident()
+    loop_thread = getattr(_loop, '_thread_id', None) if loop_only else None
+    names = {}
+    counts = collections.Counter()
+    deadline = time.monotonic() + seconds
+    samples = 0
+
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread or (loop_thread and thread_id != loop_thread):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if thread_id not in names:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            stack.append(names.get(thread_id, str(thread_id)))
+            counts[';'.join(reversed(stack))] += 1
+        samples += 1
+        time.sleep(interval)
+
+    lines = [f"# samples={samples} interval_ms={interval_ms} seconds={seconds}"]
+    lines.extend(f"{stack} {count}" for stack, count in counts.most_common())
+    return '\n'.join(lines) + '\n'
+
+
+@_exclusive
+def profile_loop(seconds=DEFAULT_SECONDS, binary=False, limit=60):
+    """cProfile потока event loop; текстовый отчёт или двоичный дамп pstats"""
+    profiler = cProfile.Profile()
+    if _loop is None or not _loop.is_running():
+        # Цикл не запущен (например, в бенчмарке) — профилируем вызывающий поток
+        profiler.enable()
+        time.sleep(seconds)
+        profiler.disable()
+    else:
+        _loop.call_soon_threadsafe(profiler.enable)
+        time.sleep(seconds)
+        done = threading.Event()
+
+        def stop():
+            profiler.disable()
+            done.set()
+        _loop.call_soon_threadsafe(stop)
+        done.wait(timeout=10)
+
+    profiler.create_stats()
+    if binary:
+        return marshal.dumps(profiler.stats)
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+@_exclusive
+def tracemalloc_diff(seconds=DEFAULT_SECONDS, limit=30):
+    """Разница снимков tracemalloc за окно seconds, сгруппированная по строкам"""
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start(10)
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_here:
+            tracemalloc.stop()
+
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen *>')]
+    diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')
+    lines = [f"# seconds={seconds} top={limit} traced_current={current} traced_peak={peak}"]
+    lines.extend(str(stat) for stat in diff[:limit])
+    return '\n'.join(lines) + '\n'
@@ -29,11 +29,20 @@ def run_bot():
     try:
         # Импортируем и запускаем бота
         import main
+        main.create_app()
+        main.connect()
         print("✅ Бот запущен успешно")
         
+        # Health-сервер на event loop бота (к нему же ходит keep_alive_ping)
+        main.client.loop.run_until_complete(main.start_health_server(main.bot_config.health_port))
+        print(f"🌐 Health-сервер запущен на порту {main.bot_config.health_port}")
+        
         # Запускаем планировщик
         main.scheduler.start()
         print("⏰ Планировщик запущен")
+        main.loop_monitor.start(main.client.loop)
+        main.profiling.attach_loop(main.client.loop)
+        main.log_startup_phases()
         
         # Запускаем бота
         main.client.run_until_disconnected()
@@ -46,15 +55,15 @@ def run_dashboard():
     """Запуск веб-дашборда"""
     print("🌐 Запуск веб-дашборда...")
     try:
-        # Переходим в папку mini_app
-        os.chdir('mini_app')
+        # Дашборд импортирует общий модуль storage, путь к базе не зависит от cwd
+        sys.path.insert(0, str(Path(__file__).resolve().parent / 'mini_app'))
         
         # Импортируем и запускаем Flask приложение
-        from app import app
+        from wsgi import serve
         print("✅ Дашборд запущен успешно")
         
-        # Запускаем Flask на всех интерфейсах
-        app.run(host='0.0.0.0', port=8080, debug=False)
+        # Многопоточный WSGI-сервер на всех интерфейсах (DASHBOARD_SERVER=dev — сервер Flask)
+        serve(host='0.0.0.0', port=8080)
     except Exception as e:
         print(f"❌ Ошибка запуска дашборда: {e}")
         import traceback
@@ -0,0 +1,1384 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Общий слой доступа к данным BabyCareBot
+
+Используется и ботом (main.py), и веб-дашбордом (mini_app/app.py).
+Путь к базе задаётся переменной окружения BABYBOT_DB (по умолчанию
+babybot.db рядом с этим файлом) и не зависит от текущей директории.
+Соединения переиспользуются в пределах потока, поэтому sqlite3 кэширует
+подготовленные запросы, а редко меняющиеся данные (семья, участник,
+настройки, текст вечерней сводки) кэшируются в памяти до следующей записи.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import clock
+from clock import from_timestamp, to_thai
+from metrics import track_query
+
+logger = logging.getLogger('babybot.storage')
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "babybot.db")
+DB_PATH = os.getenv('BABYBOT_DB', DEFAULT_DB_PATH)
+
+# Виды событий в общей таблице events (колонка type). Имена совпадают с
+# прежними таблицами feedings/diapers — под ними остались представления.
+# Новый вид события — новая строка здесь, без новых таблиц и функций.
+FEEDING = 1
+DIAPER = 2
+SLEEP = 3
+BATH = 4
+EVENT_TYPES = {'feedings': FEEDING, 'diapers': DIAPER, 'sleep': SLEEP, 'baths': BATH}
+EVENT_NAMES = {code: name for name, code in EVENT_TYPES.items()}
+EVENT_TABLES = tuple(EVENT_TYPES)
+# Виды, которые раньше были отдельными таблицами (миграция и представления)
+LEGACY_TABLES = ('feedings', 'diapers')
+# Виды-моменты: считаются штуками; сон — интервал [ts, end_ts), считается секундами
+POINT_TABLES = ('feedings', 'diapers', 'baths')
+
+# Сон дольше суток — почти наверняка забытая кнопка «Проснулся»: в суммах
+# интервал обрезается этой длиной, а открытый интервал идёт до «сейчас»
+SLEEP_MAX_SECONDS = 24 * 3600
+
+# У Бангкока нет перехода на летнее время: тайские сутки в SQL — это UTC + 7 часов
+THAI_UTC_MODIFIER = '+7 hours'
+THAI_UTC_OFFSET = 7 * 3600
+
+SETTINGS_COLUMNS = (
+    'feed_interval', 'diaper_interval', 'tips_enabled', 'tips_time_hour', 'tips_time_minute',
+    'bath_interval', 'bath_time_hour', 'bath_time_minute', 'bath_enabled', 'adaptive_feeding',
+    'digest_enabled', 'digest_time_hour', 'digest_time_minute', 'anomaly_alerts',
+)
+
+# Колонки settings с тайской датой последнего напоминания о купании каждого вида:
+# 'bath' — само напоминание, 'bath_soon' — предупреждение за час
+BATH_REMINDER_COLUMNS = {'bath': 'last_bath_reminder_date', 'bath_soon': 'last_bath_soon_date'}
+
+# Адаптивный интервал кормления: экспоненциальное скользящее среднее промежутков
+FEEDING_EWMA_ALPHA = 0.3
+# Промежутки короче 10 минут (повторное нажатие) и длиннее 12 часов (пропуск записи) не учитываются
+FEEDING_GAP_RANGE = (10 * 60, 12 * 3600)
+# Сколько последних кормлений проигрывается при пересборке статистики
+FEEDING_STATS_REPLAY = 50
+# Пересчёт daily_rollup по events идёт пачками семей, по транзакции на пачку
+ROLLUP_BACKFILL_BATCH = 1000
+
+_local = threading.local()
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def configure(db_path):
+    """Сменить путь к базе данных (закрывает соединение текущего потока и сбрасывает кэш)"""
+    global DB_PATH
+    DB_PATH = db_path
+    close_connection()
+    invalidate_cache()
+
+
+def get_connection():
+    """Получить соединение текущего потока (создаётся один раз на поток)"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = sqlite3.connect(DB_PATH, timeout=10, cached_statements=256)
+        conn.execute("PRAGMA busy_timeout = 10000")
+        _local.conn = conn
+        _local.path = DB_PATH
+        _local.data_version = None
+    return conn
+
+
+def ping():
+    """Проверочный запрос к базе (для health-сервера)"""
+    return get_connection().execute("SELECT 1").fetchone()
+
+
+def close_connection():
+    """Закрыть соединение текущего потока"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def _event_type(table):
+    """Код вида события по имени ('feedings', 'diapers', ...)"""
+    try:
+        return EVENT_TYPES[table]
+    except KeyError:
+        raise ValueError(f"Неизвестный вид событий: {table}") from None
+
+
+# Кэш редко меняющихся данных
+def invalidate_cache(*keys):
+    """Сбросить кэш целиком или по ключам вида (kind, id)"""
+    with _cache_lock:
+        if not keys:
+            _cache.clear()
+        for key in keys:
+            _cache.pop(key, None)
+
+
+def _check_data_version(conn):
+    """Сбросить кэш, если в базу писало другое соединение (другой поток или процесс)"""
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if _local.data_version != version:
+        if _local.data_version is not None:
+            invalidate_cache()
+        _local.data_version = version
+
+
+def _cached(key, loader):
+    """Вернуть значение из кэша, если с момента загрузки база не менялась другими соединениями"""
+    conn = get_connection()
+    _check_data_version(conn)
+
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    value = loader(conn)
+    with _cache_lock:
+        _cache[key] = value
+    return value
+
+
+def get_cached(key):
+    """Значение, сохранённое put_cached, или None, если его сбросила запись в базу"""
+    _check_data_version(get_connection())
+    with _cache_lock:
+        return _cache.get(key)
+
+
+def put_cached(key, value):
+    """Сохранить посчитанное вне storage значение до следующей записи (ключ вида (kind, id))"""
+    with _cache_lock:
+        _cache[key] = value
+
+
+# Схема базы данных
+def init_db():
+    """Создать таблицы и индексы, выполнить миграции старых схем"""
+    conn = get_connection()
+    cur = conn.cursor()
+
+    # WAL позволяет дашборду читать, пока бот пишет
+    cur.execute("PRAGMA journal_mode=WAL")
+
+    # Создание таблиц (если их нет)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS families (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS family_members (
+            family_id INTEGER,
+            user_id INTEGER,
+            role TEXT DEFAULT 'Родитель',
+            name TEXT DEFAULT 'Неизвестно',
+            FOREIGN KEY (family_id) REFERENCES families (id)
+        )
+    """)
+
+    # Все события в одной таблице: вид — в type, время — epoch-секунды в ts.
+    # У интервальных событий (сон) end_ts — конец, NULL пока интервал открыт
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            family_id INTEGER NOT NULL,
+            type INTEGER NOT NULL,
+            ts REAL NOT NULL,
+            end_ts REAL,
+            author_id INTEGER,
+            author_role TEXT DEFAULT 'Родитель',
+            author_name TEXT DEFAULT 'Неизвестно',
+            FOREIGN KEY (family_id) REFERENCES families (id)
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            family_id INTEGER,
+            feed_interval INTEGER DEFAULT 3,
+            diaper_interval INTEGER DEFAULT 2,
+            tips_enabled INTEGER DEFAULT 1,
+            tips_time_hour INTEGER DEFAULT 9,
+            tips_time_minute INTEGER DEFAULT 0,
+            bath_interval INTEGER DEFAULT 1,
+            bath_time_hour INTEGER DEFAULT 19,
+            bath_time_minute INTEGER DEFAULT 0,
+            bath_enabled INTEGER DEFAULT 1,
+            adaptive_feeding INTEGER DEFAULT 0,
+            digest_enabled INTEGER DEFAULT 0,
+            digest_time_hour INTEGER DEFAULT 21,
+            digest_time_minute INTEGER DEFAULT 0,
+            anomaly_alerts INTEGER DEFAULT 1,
+            last_bath_reminder_date TEXT,
+            last_bath_soon_date TEXT,
+            FOREIGN KEY (family_id) REFERENCES families (id)
+        )
+    """)
+
+    # Итоги моментальных событий по тайским суткам: одна строка на (семья, сутки, вид).
+    # authors — JSON {author_id: число событий}, max_gap — самый долгий перерыв внутри суток
+    rollup_created = not cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_rollup'").fetchone()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS daily_rollup (
+            family_id INTEGER NOT NULL,
+            local_date TEXT NOT NULL,
+            type INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            first_ts REAL NOT NULL,
+            last_ts REAL NOT NULL,
+            max_gap REAL NOT NULL DEFAULT 0,
+            authors TEXT NOT NULL DEFAULT '{}',
+            PRIMARY KEY (family_id, local_date, type)
+        ) WITHOUT ROWID
+    """)
+
+    # Бегущая статистика промежутков между кормлениями (обновляется при каждой записи)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS feeding_stats (
+            family_id INTEGER PRIMARY KEY,
+            last_ts REAL NOT NULL,
+            ewma_gap REAL,
+            ewma_var REAL DEFAULT 0,
+            samples INTEGER DEFAULT 0,
+            FOREIGN KEY (family_id) REFERENCES families (id)
+        )
+    """)
+
+    # Счётчик правок событий семьи (растёт в триггерах на events): новые записи
+    # его не трогают — их инкрементальные кэши дочитывают по id
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS event_versions (
+            family_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS baby_info (
+            family_id INTEGER PRIMARY KEY,
+            name TEXT DEFAULT 'Малыш',
+            birth_date TEXT,
+            gender TEXT DEFAULT 'Не указан',
+            weight REAL DEFAULT 0.0,
+            height REAL DEFAULT 0.0,
+            FOREIGN KEY (family_id) REFERENCES families (id)
+        )
+    """)
+
+    # Измерения веса (кг) и роста (см); в baby_info остаются последние значения
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS growth (
+            id INTEGER PRIMARY KEY,
+            family_id INTEGER NOT NULL,
+            ts REAL NOT NULL,
+            weight REAL,
+            height REAL,
+            author_id INTEGER,
+            FOREIGN KEY (family_id) REFERENCES families (id)
+        )
+    """)
+
+    # Добавляем новые колонки к существующей таблице settings, если их нет
+    try:
+        cur.execute("ALTER TABLE settings ADD COLUMN tips_time_hour INTEGER DEFAULT 9")
+        logger.info("✅ Добавлена колонка tips_time_hour")
+    except sqlite3.OperationalError:
+        logger.debug("ℹ️ Колонка tips_time_hour уже существует")
+
+    try:
+        cur.execute("ALTER TABLE settings ADD COLUMN tips_time_minute INTEGER DEFAULT 0")
+        logger.info("✅ Добавлена колонка tips_time_minute")
+    except sqlite3.OperationalError:
+        logger.debug("ℹ️ Колонка tips_time_minute уже существует")
+
+    # Обновляем существующие записи, устанавливая значения по умолчанию
+    cur.execute("UPDATE settings SET tips_time_hour = 9 WHERE tips_time_hour IS NULL")
+    cur.execute("UPDATE settings SET tips_time_minute = 0 WHERE tips_time_minute IS NULL")
+
+    # Добавляем новые колонки для купания, если их нет
+    try:
+        cur.execute("ALTER TABLE settings ADD COLUMN bath_interval INTEGER DEFAULT 1")
+        logger.info("✅ Добавлена колонка bath_interval")
+    except sqlite3.OperationalError:
+        logger.debug("ℹ️ Колонка bath_interval уже существует")
+
+    try:
+        cur.execute("ALTER TABLE settings ADD COLUMN bath_time_hour INTEGER DEFAULT 19")
+        logger.info("✅ Добавлена колонка bath_time_hour")
+    except sqlite3.OperationalError:
+        logger.debug("ℹ️ Колонка bath_time_hour уже существует")
+
+    try:
+        cur.execute("ALTER TABLE settings ADD COLUMN bath_time_minute INTEGER DEFAULT 0")
+        logger.info("✅ Добавлена колонка bath_time_minute")
+    except sqlite3.OperationalError:
+        logger.debug("ℹ️ Колонка bath_time_minute уже существует")
+
+    try:
+        cur.execute("ALTER TABLE settings ADD COLUMN bath_enabled INTEGER DEFAULT 1")
+        logger.info("✅ Добавлена колонка bath_enabled")
+    except sqlite3.OperationalError:
+        logger.debug("ℹ️ Колонка bath_enabled уже существует")
+
+    try:
+        cur.execute("ALTER TABLE settings ADD COLUMN adaptive_feeding INTEGER DEFAULT 0")
+        logger.info("✅ Добавлена колонка adaptive_feeding")
+    except sqlite3.OperationalError:
+        logger.debug("ℹ️ Колонка adaptive_feeding уже существует")
+
+    for column, default in (('digest_enabled', 0), ('digest_time_hour', 21), ('digest_time_minute', 0),
+                            ('anomaly_alerts', 1)):
+        try:
+            cur.execute(f"ALTER TABLE settings ADD COLUMN {column} INTEGER DEFAULT {default}")
+            logger.info("✅ Добавлена колонка %s", column)
+        except sqlite3.OperationalError:
+            logger.debug("ℹ️ Колонка %s уже существует", column)
+
+    for column in BATH_REMINDER_COLUMNS.values():
+        try:
+            cur.execute(f"ALTER TABLE settings ADD COLUMN {column} TEXT")
+            logger.info("✅ Добавлена колонка %s", column)
+        except sqlite3.OperationalError:
+            logger.debug("ℹ️ Колонка %s уже существует", column)
+
+    # Обновляем существующие записи, устанавливая значения по умолчанию для купания
+    cur.execute("UPDATE settings SET bath_interval = 1 WHERE bath_interval IS NULL")
+    cur.execute("UPDATE settings SET bath_time_hour = 19 WHERE bath_time_hour IS NULL")
+    cur.execute("UPDATE settings SET bath_time_minute = 0 WHERE bath_time_minute IS NULL")
+    cur.execute("UPDATE settings SET bath_enabled = 1 WHERE bath_enabled IS NULL")
+    cur.execute("UPDATE settings SET adaptive_feeding = 0 WHERE adaptive_feeding IS NULL")
+    cur.execute("UPDATE settings SET digest_enabled = 0 WHERE digest_enabled IS NULL")
+    cur.execute("UPDATE settings SET anomaly_alerts = 1 WHERE anomaly_alerts IS NULL")
+
+    # Миграция таблиц feedings и diapers (старые базы, где они ещё таблицы, а не представления)
+    legacy_tables = [table for table in LEGACY_TABLES if cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()]
+    for table in legacy_tables:
+        try:
+            # Проверяем, есть ли колонка family_id в таблице
+            cur.execute(f"PRAGMA table_info({table})")
+            columns = [col[1] for col in cur.fetchall()]
+
+            if 'family_id' not in columns:
+                logger.info("🔄 Мигрируем таблицу %s...", table)
+                # Создаем временную таблицу с новой структурой
+                cur.execute(f"""
+                    CREATE TABLE {table}_new (
+                        id INTEGER PRIMARY KEY,
+                        family_id INTEGER,
+                        author_id INTEGER,
+                        timestamp TEXT NOT NULL,
+                        author_role TEXT DEFAULT 'Родитель',
+                        author_name TEXT DEFAULT 'Неизвестно',
+                        FOREIGN KEY (family_id) REFERENCES families (id)
+                    )
+                """)
+
+                # Копируем данные из старой таблицы
+                cur.execute(f"SELECT id, user_id, timestamp FROM {table}")
+                old_data = cur.fetchall()
+
+                for row in old_data:
+                    # Для каждой записи создаем временную семью
+                    temp_family_id = create_family(f"Миграция {row[0]}", row[1])
+                    cur.execute(f"INSERT INTO {table}_new (family_id, author_id, timestamp, author_role, author_name) VALUES (?, ?, ?, ?, ?)",
+                               (temp_family_id, row[1], row[2], 'Родитель', 'Неизвестно'))
+
+                # Удаляем старую таблицу и переименовываем новую
+                cur.execute(f"DROP TABLE {table}")
+                cur.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+                logger.info("✅ Таблица %s мигрирована", table)
+            else:
+                logger.debug("ℹ️ Таблица %s уже имеет правильную структуру", table)
+
+        except sqlite3.OperationalError as e:
+            logger.info("ℹ️ Миграция %s: %s", table, e)
+
+    # Колонка end_ts для интервальных событий (базы до появления сна)
+    try:
+        cur.execute("ALTER TABLE events ADD COLUMN end_ts REAL")
+        logger.info("✅ Добавлена колонка end_ts в таблицу events")
+    except sqlite3.OperationalError:
+        logger.debug("ℹ️ Колонка end_ts уже существует")
+
+    # Индексы для частых запросов бота и дашборда
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_family_members_user ON family_members (user_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_family_members_family ON family_members (family_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_settings_family ON settings (family_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_growth_family_ts ON growth (family_id, ts)")
+    # Задачи купания выбирают только семьи, чьё время купания попало в окно тика
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_settings_bath_time ON settings (bath_time_hour * 60 + bath_time_minute) "
+                "WHERE bath_enabled = 1")
+    # То же для вечерней сводки
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_settings_digest_time ON settings (digest_time_hour * 60 + digest_time_minute) "
+                "WHERE digest_enabled = 1")
+    # Последнее событие вида и выборки за период по виду
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_events_family_type_ts ON events (family_id, type, ts)")
+    # Лента из нескольких видов сразу, отсортированная по времени
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_events_family_ts ON events (family_id, ts)")
+    # «Спит ли сейчас?»: частичный индекс только по открытым интервалам сна — в нём
+    # не больше строки на семью, сколько бы закрытых интервалов ни накопилось
+    cur.execute(f"CREATE INDEX IF NOT EXISTS idx_events_open_sleep ON events (family_id) "
+                f"WHERE type = {SLEEP} AND end_ts IS NULL")
+
+    # Счётчик правок растёт при удалении и изменении события любым путём (бот,
+    # дашборд, ручной SQL); закрытие сна (end_ts) правкой не считается
+    bump = ("INSERT INTO event_versions (family_id, version) VALUES ({}.family_id, 1) "
+            "ON CONFLICT (family_id) DO UPDATE SET version = version + 1;")
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS events_version_delete AFTER DELETE ON events "
+                f"BEGIN {bump.format('OLD')} END")
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS events_version_update "
+                f"AFTER UPDATE OF family_id, type, ts, author_id, author_role, author_name ON events "
+                f"BEGIN {bump.format('OLD')} {bump.format('NEW')} END")
+
+    for table in legacy_tables:
+        _migrate_to_events(cur, table)
+    for table in LEGACY_TABLES:
+        _create_compat_view(cur, table)
+
+    conn.commit()
+    invalidate_cache()
+    # Новая таблица итогов или только что перенесённые события — пересчитываем итоги по events
+    if rollup_created or legacy_tables:
+        backfill_daily_rollup()
+    logger.info("✅ База данных инициализирована/обновлена")
+
+
+def _migrate_to_events(cur, table):
+    """Перенести строки старой таблицы feedings/diapers в events и удалить таблицу"""
+    event_type = EVENT_TYPES[table]
+    rows = cur.execute(f"SELECT id, family_id, author_id, timestamp, author_role, author_name FROM {table} ORDER BY id").fetchall()
+    migrated = []
+    for entry_id, family_id, author_id, timestamp, role, name in rows:
+        try:
+            ts = _to_ts(timestamp)
+        except (TypeError, ValueError):
+            logger.warning("⚠️ %s #%s: не удалось разобрать время %r, запись пропущена", table, entry_id, timestamp)
+            continue
+        migrated.append((family_id, event_type, ts, author_id, role, name))
+    cur.executemany("INSERT INTO events (family_id, type, ts, author_id, author_role, author_name) VALUES (?, ?, ?, ?, ?, ?)",
+                    migrated)
+    cur.execute(f"DROP TABLE {table}")
+    logger.info("✅ Таблица %s перенесена в events (%d записей)", table, len(migrated))
+
+
+def _create_compat_view(cur, table):
+    """Представление со старыми колонками (timestamp — ISO с +07:00) и вставка через него"""
+    event_type = EVENT_TYPES[table]
+    cur.execute(f"""
+        CREATE VIEW IF NOT EXISTS {table} AS
+        SELECT id, family_id, author_id,
+               strftime('%Y-%m-%dT%H:%M:%f+07:00', ts, 'unixepoch', '{THAI_UTC_MODIFIER}') AS timestamp,
+               author_role, author_name
+        FROM events WHERE type = {event_type}
+    """)
+    # Время без часового пояса считается тайским, как и в остальном коде
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_insert INSTEAD OF INSERT ON {table}
+        BEGIN
+            INSERT INTO events (family_id, type, ts, author_id, author_role, author_name)
+            VALUES (NEW.family_id, {event_type},
+                    ROUND((julianday(NEW.timestamp) - 2440587.5) * 86400.0, 3)
+                    - CASE WHEN NEW.timestamp GLOB '*[+-][0-9][0-9]:[0-9][0-9]' OR NEW.timestamp GLOB '*Z'
+                           THEN 0 ELSE 25200 END,
+                    NEW.author_id, COALESCE(NEW.author_role, 'Родитель'), COALESCE(NEW.author_name, 'Неизвестно'));
+        END
+    """)
+
+
+# Семьи и участники
+@track_query
+def get_family_id(user_id):
+    def load(conn):
+        result = conn.execute("SELECT family_id FROM family_members WHERE user_id = ?", (user_id,)).fetchone()
+        return result[0] if result else None
+    return _cached(('family_id', user_id), load)
+
+
+@track_query
+def create_family(name, user_id):
+    conn = get_connection()
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO families (name) VALUES (?)", (name,))
+    family_id = cur.lastrowid
+
+    cur.execute("INSERT INTO family_members (family_id, user_id) VALUES (?, ?)", (family_id, user_id))
+    cur.execute("INSERT INTO settings (family_id) VALUES (?)", (family_id,))
+
+    conn.commit()
+    invalidate_cache(('family_id', user_id), ('member', user_id))
+    return family_id
+
+
+@track_query
+def join_family_by_code(code, user_id):
+    """Присоединить пользователя к семье по коду приглашения"""
+    try:
+        family_id = int(code)
+        conn = get_connection()
+        cur = conn.cursor()
+
+        # Проверяем, существует ли семья
+        cur.execute("SELECT id, name FROM families WHERE id = ?", (family_id,))
+        family = cur.fetchone()
+
+        if not family:
+            return None, "Семья не найдена"
+
+        # Проверяем, не состоит ли пользователь уже в семье
+        cur.execute("SELECT family_id FROM family_members WHERE user_id = ?", (user_id,))
+        existing = cur.fetchone()
+
+        if existing:
+            return None, "Вы уже состоите в семье"
+
+        # Добавляем пользователя в семью
+        cur.execute("INSERT INTO family_members (family_id, user_id) VALUES (?, ?)", (family_id, user_id))
+        conn.commit()
+        # Сводка семьи показывает авторов по ролям — состав изменился
+        invalidate_cache(('family_id', user_id), ('member', user_id), ('digest', family_id))
+
+        return family_id, family[1]  # family_id, family_name
+    except ValueError:
+        return None, "Неверный код приглашения"
+    except Exception as e:
+        return None, f"Ошибка: {str(e)}"
+
+
+@track_query
+def get_family_name(family_id):
+    """Получить название семьи по ID"""
+    def load(conn):
+        result = conn.execute("SELECT name FROM families WHERE id = ?", (family_id,)).fetchone()
+        return result[0] if result else None
+    name = _cached(('family_name', family_id), load)
+    return name if name is not None else "Неизвестная семья"
+
+
+@track_query
+def get_member_info(user_id):
+    """Получить информацию о члене семьи"""
+    def load(conn):
+        return conn.execute("SELECT role, name FROM family_members WHERE user_id = ?", (user_id,)).fetchone()
+    result = _cached(('member', user_id), load)
+    if result:
+        return result[0], result[1]  # role, name
+    return "Родитель", "Неизвестно"
+
+
+@track_query
+def set_member_role(user_id, role, name):
+    """Установить роль и имя для члена семьи"""
+    conn = get_connection()
+    conn.execute("UPDATE family_members SET role = ?, name = ? WHERE user_id = ?", (role, name, user_id))
+    conn.commit()
+    # Роли авторов есть и в кэшированных сводках семей этого участника
+    families = conn.execute("SELECT family_id FROM family_members WHERE user_id = ?", (user_id,)).fetchall()
+    invalidate_cache(('member', user_id), *(('digest', row[0]) for row in families))
+
+
+@track_query
+def get_family_members_with_roles(family_id):
+    """Получить всех членов семьи с ролями"""
+    conn = get_connection()
+    return conn.execute("SELECT user_id, role, name FROM family_members WHERE family_id = ?", (family_id,)).fetchall()
+
+
+@track_query
+def get_family_member_ids(family_id):
+    """Получить user_id всех членов семьи"""
+    conn = get_connection()
+    return [row[0] for row in conn.execute("SELECT user_id FROM family_members WHERE family_id = ?", (family_id,))]
+
+
+@track_query
+def get_baby_record(family_id):
+    """Получить запись baby_info: (name, birth_date, gender, weight, height) или None"""
+    conn = get_connection()
+    return conn.execute("SELECT name, birth_date, gender, weight, height FROM baby_info WHERE family_id = ?", (family_id,)).fetchone()
+
+
+# Настройки
+@track_query
+def get_settings(family_id):
+    """Получить настройки семьи в виде словаря (или None, если их нет)"""
+    def load(conn):
+        row = conn.execute(f"SELECT {', '.join(SETTINGS_COLUMNS)} FROM settings WHERE family_id = ?", (family_id,)).fetchone()
+        return dict(zip(SETTINGS_COLUMNS, row)) if row else None
+    return _cached(('settings', family_id), load)
+
+
+@track_query
+def get_all_settings(flag=None):
+    """Получить настройки всех семей (при flag — только тех, где эта настройка включена)"""
+    conn = get_connection()
+    query = f"SELECT family_id, {', '.join(SETTINGS_COLUMNS)} FROM settings"
+    if flag is not None:
+        if flag not in SETTINGS_COLUMNS:
+            raise ValueError(f"Неизвестная настройка: {flag}")
+        query += f" WHERE {flag} = 1"
+    return [dict(zip(('family_id',) + SETTINGS_COLUMNS, row)) for row in conn.execute(query)]
+
+
+def _update_settings(family_id, assignments, params):
+    conn = get_connection()
+    conn.execute(f"UPDATE settings SET {assignments} WHERE family_id = ?", (*params, family_id))
+    conn.commit()
+    invalidate_cache(('settings', family_id))
+
+
+@track_query
+def get_user_intervals(family_id):
+    settings = get_settings(family_id)
+    if settings:
+        return settings['feed_interval'], settings['diaper_interval']
+    return 3, 2
+
+
+@track_query
+def set_user_interval(family_id, feed_interval=None, diaper_interval=None):
+    if feed_interval is not None:
+        _update_settings(family_id, "feed_interval = ?", (feed_interval,))
+    if diaper_interval is not None:
+        _update_settings(family_id, "diaper_interval = ?", (diaper_interval,))
+
+
+@track_query
+def is_tips_enabled(family_id):
+    settings = get_settings(family_id)
+    return settings['tips_enabled'] if settings else 1
+
+
+@track_query
+def toggle_tips(family_id):
+    _update_settings(family_id, "tips_enabled = CASE WHEN tips_enabled = 1 THEN 0 ELSE 1 END", ())
+
+
+@track_query
+def set_tips_time(family_id, hour, minute):
+    """Установить время рассылки советов"""
+    _update_settings(family_id, "tips_time_hour = ?, tips_time_minute = ?", (hour, minute))
+
+
+@track_query
+def get_tips_time(family_id):
+    """Получить время рассылки советов"""
+    settings = get_settings(family_id)
+    if settings:
+        return settings['tips_time_hour'], settings['tips_time_minute']
+    return 9, 0  # значения по умолчанию
+
+
+@track_query
+def get_bath_settings(family_id):
+    """Получить настройки купания для семьи"""
+    settings = get_settings(family_id)
+    if settings:
+        return settings['bath_interval'], settings['bath_time_hour'], settings['bath_time_minute'], settings['bath_enabled']
+    return 1, 19, 0, 1  # значения по умолчанию
+
+
+@track_query
+def set_bath_interval(family_id, interval):
+    """Установить интервал купания"""
+    _update_settings(family_id, "bath_interval = ?", (interval,))
+
+
+@track_query
+def set_bath_time(family_id, hour, minute):
+    """Установить время купания"""
+    _update_settings(family_id, "bath_time_hour = ?, bath_time_minute = ?", (hour, minute))
+
+
+@track_query
+def toggle_bath_reminders(family_id):
+    """Включить/выключить напоминания о купании"""
+    _update_settings(family_id, "bath_enabled = CASE WHEN bath_enabled = 1 THEN 0 ELSE 1 END", ())
+
+
+@track_query
+def toggle_adaptive_feeding(family_id):
+    """Включить/выключить адаптивный интервал кормления"""
+    _update_settings(family_id, "adaptive_feeding = CASE WHEN adaptive_feeding = 1 THEN 0 ELSE 1 END", ())
+
+
+@track_query
+def toggle_digest(family_id):
+    """Включить/выключить вечернюю сводку"""
+    _update_settings(family_id, "digest_enabled = CASE WHEN digest_enabled = 1 THEN 0 ELSE 1 END", ())
+
+
+@track_query
+def toggle_anomaly_alerts(family_id):
+    """Включить/выключить ночную сводку аномалий"""
+    _update_settings(family_id, "anomaly_alerts = CASE WHEN anomaly_alerts = 1 THEN 0 ELSE 1 END", ())
+
+
+@track_query
+def set_digest_time(family_id, hour, minute):
+    """Установить время вечерней сводки"""
+    _update_settings(family_id, "digest_time_hour = ?, digest_time_minute = ?", (hour, minute))
+
+
+# Рост и вес
+@track_query
+def add_growth(user_id, timestamp, weight=None, height=None):
+    """Записать измерение (вес в кг, рост в см; одно из них может быть None) и обновить baby_info"""
+    family_id = get_family_id(user_id)
+    if not family_id:
+        family_id = create_family("Временная семья", user_id)
+
+    conn = get_connection()
+    cur = conn.execute("INSERT INTO growth (family_id, ts, weight, height, author_id) VALUES (?, ?, ?, ?, ?)",
+                       (family_id, _to_ts(timestamp), weight, height, user_id))
+    conn.execute("INSERT OR IGNORE INTO baby_info (family_id) VALUES (?)", (family_id,))
+    conn.execute("UPDATE baby_info SET weight = COALESCE(?, weight), height = COALESCE(?, height) WHERE family_id = ?",
+                 (weight, height, family_id))
+    conn.commit()
+    return cur.lastrowid
+
+
+@track_query
+def get_growth_after_id(family_id, last_id=0):
+    """Измерения семьи с id больше last_id: (id, ts, weight, height)"""
+    conn = get_connection()
+    return conn.execute("SELECT id, ts, weight, height FROM growth WHERE family_id = ? AND id > ? ORDER BY id",
+                        (family_id, last_id)).fetchall()
+
+
+@track_query
+def count_growth(family_id):
+    """Число измерений семьи"""
+    conn = get_connection()
+    return conn.execute("SELECT COUNT(*) FROM growth WHERE family_id = ?", (family_id,)).fetchone()[0]
+
+
+# События: кормления, смены подгузников, сон и т.д. — все в одной таблице events
+def _to_ts(value):
+    """datetime или ISO-строка → epoch-секунды (наивное время считается тайским)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return to_thai(value).timestamp()
+
+
+def _types_clause(tables):
+    """Условие «type IN (...)» и его параметры для списка видов событий"""
+    types = [_event_type(table) for table in (tables or EVENT_TABLES)]
+    return f"type IN ({', '.join('?' * len(types))})", types
+
+
+@track_query
+def add_event(table, user_id, timestamp):
+    """Записать событие от имени пользователя (создаёт временную семью, если её нет)"""
+    event_type = _event_type(table)
+
+    # Получаем family_id пользователя
+    family_id = get_family_id(user_id)
+    if not family_id:
+        # Если пользователь не в семье, создаем временную семью
+        family_id = create_family("Временная семья", user_id)
+
+    # Получаем информацию об авторе
+    role, name = get_member_info(user_id)
+
+    ts = _to_ts(timestamp)
+    conn = get_connection()
+    cur = conn.execute("INSERT INTO events (family_id, type, ts, author_id, author_role, author_name) VALUES (?, ?, ?, ?, ?, ?)",
+                       (family_id, event_type, ts, user_id, role, name))
+    if event_type == FEEDING:
+        _update_feeding_stats(conn, family_id, ts)
+    if table in POINT_TABLES:
+        _update_rollup(conn, family_id, event_type, ts, user_id)
+    conn.commit()
+    invalidate_cache(('digest', family_id))
+    return cur.lastrowid
+
+
+@track_query
+def get_last_event_time(table, family_id):
+    """Получить время последнего события семьи (aware, в тайском поясе)"""
+    conn = get_connection()
+    result = conn.execute("SELECT MAX(ts) FROM events WHERE family_id = ? AND type = ?",
+                          (family_id, _event_type(table))).fetchone()
+    if result and result[0] is not None:
+        return from_timestamp(result[0])
+    return None
+
+
+def _feeding_stats_step(state, ts):
+    """Учесть кормление в момент ts: O(1), состояние — (last_ts, ewma_gap, ewma_var, samples)"""
+    if state is None:
+        return ts, None, 0.0, 0
+    last_ts, mean, var, samples = state
+    if ts <= last_ts:
+        # Запись задним числом не продлевает ряд; точную картину даст пересборка при удалении
+        return state
+    gap = ts - last_ts
+    if FEEDING_GAP_RANGE[0] <= gap <= FEEDING_GAP_RANGE[1]:
+        if mean is None:
+            mean, var = gap, 0.0
+        else:
+            diff = gap - mean
+            mean += FEEDING_EWMA_ALPHA * diff
+            var = (1 - FEEDING_EWMA_ALPHA) * (var + FEEDING_EWMA_ALPHA * diff * diff)
+        samples += 1
+    return ts, mean, var, samples
+
+
+def _rebuild_feeding_stats(conn, family_id):
+    """Пересчитать статистику по последним FEEDING_STATS_REPLAY кормлениям"""
+    rows = conn.execute("SELECT ts FROM events WHERE family_id = ? AND type = ? ORDER BY ts DESC LIMIT ?",
+                        (family_id, FEEDING, FEEDING_STATS_REPLAY)).fetchall()
+    state = None
+    for (ts,) in reversed(rows):
+        state = _feeding_stats_step(state, ts)
+    if state is None:
+        conn.execute("DELETE FROM feeding_stats WHERE family_id = ?", (family_id,))
+    else:
+        conn.execute("INSERT OR REPLACE INTO feeding_stats (family_id, last_ts, ewma_gap, ewma_var, samples) "
+                     "VALUES (?, ?, ?, ?, ?)", (family_id,) + state)
+    return state
+
+
+def _update_feeding_stats(conn, family_id, ts):
+    """Обновить статистику после записи кормления (без коммита)"""
+    state = conn.execute("SELECT last_ts, ewma_gap, ewma_var, samples FROM feeding_stats WHERE family_id = ?",
+                         (family_id,)).fetchone()
+    if state is None:
+        # Статистики ещё нет (новая семья или база до адаптивного режима) — один раз по истории
+        _rebuild_feeding_stats(conn, family_id)
+        return
+    conn.execute("UPDATE feeding_stats SET last_ts = ?, ewma_gap = ?, ewma_var = ?, samples = ? WHERE family_id = ?",
+                 _feeding_stats_step(state, ts) + (family_id,))
+
+
+def backfill_feeding_stats(family_ids=None):
+    """Пересчитать feeding_stats для всех семей с кормлениями (или перечисленных).
+
+    Нужен после массовой вставки в events в обход add_event; в обычной работе
+    статистика обновляется при записи и пересобирается лениво. Возвращает число семей.
+    """
+    conn = get_connection()
+    if family_ids is None:
+        family_ids = [row[0] for row in conn.execute("SELECT DISTINCT family_id FROM events WHERE type = ?", (FEEDING,))]
+    for family_id in family_ids:
+        _rebuild_feeding_stats(conn, family_id)
+    conn.commit()
+    return len(family_ids)
+
+
+@track_query
+def get_feeding_stats(family_id):
+    """Статистика промежутков между кормлениями: {'last_ts', 'ewma_gap', 'ewma_std', 'samples'} или None"""
+    conn = get_connection()
+    state = conn.execute("SELECT last_ts, ewma_gap, ewma_var, samples FROM feeding_stats WHERE family_id = ?",
+                         (family_id,)).fetchone()
+    if state is None:
+        state = _rebuild_feeding_stats(conn, family_id)
+        conn.commit()
+        if state is None:
+            return None
+    last_ts, mean, var, samples = state
+    return {'last_ts': last_ts, 'ewma_gap': mean, 'ewma_std': (var or 0.0) ** 0.5, 'samples': samples}
+
+
+# Итоги по суткам (daily_rollup): статистика читает их вместо сырых событий
+def _local_date(ts):
+    """epoch-секунды → дата тайских суток (ISO)"""
+    return from_timestamp(ts).date().isoformat()
+
+
+def _rollup_insert_sql(where):
+    """INSERT итогов по событиям, отобранным условием where (параметры — у вызывающего)"""
+    types_sql, types = _types_clause(POINT_TABLES)
+    # Перерывы — внутри суток и вида; авторы сначала считаются по отдельности, затем сворачиваются в JSON
+    return f"""
+        INSERT INTO daily_rollup (family_id, local_date, type, count, first_ts, last_ts, max_gap, authors)
+        WITH day_events AS (
+            SELECT family_id, type, ts, COALESCE(author_id, 0) AS author,
+                   date(ts, 'unixepoch', '{THAI_UTC_MODIFIER}') AS local_date
+            FROM events WHERE {types_sql} AND {where}
+        ), gaps AS (
+            SELECT *, ts - LAG(ts) OVER (PARTITION BY family_id, type, local_date ORDER BY ts) AS gap
+            FROM day_events
+        ), by_author AS (
+            SELECT family_id, local_date, type, author, COUNT(*) AS n,
+                   MIN(ts) AS first_ts, MAX(ts) AS last_ts, MAX(gap) AS max_gap
+            FROM gaps GROUP BY family_id, local_date, type, author
+        )
+        SELECT family_id, local_date, type, SUM(n), MIN(first_ts), MAX(last_ts), COALESCE(MAX(max_gap), 0),
+               json_group_object(CAST(author AS TEXT), n)
+        FROM by_author GROUP BY family_id, local_date, type
+    """, types
+
+
+def _rebuild_rollup_day(conn, family_id, event_type, local_date):
+    """Пересчитать итог одних суток одного вида по events (после удаления, правки, записи задним числом)"""
+    conn.execute("DELETE FROM daily_rollup WHERE family_id = ? AND local_date = ? AND type = ?",
+                 (family_id, local_date, event_type))
+    start_ts = to_thai(datetime.fromisoformat(local_date)).timestamp()
+    sql, types = _rollup_insert_sql("family_id = ? AND type = ? AND ts >= ? AND ts < ?")
+    conn.execute(sql, types + [family_id, event_type, start_ts, start_ts + 86400])
+
+
+def _update_rollup(conn, family_id, event_type, ts, author_id):
+    """Учесть новое событие в итогах суток за O(1); запись задним числом пересчитывает сутки"""
+    local_date = _local_date(ts)
+    author = str(author_id or 0)
+    path = f'$."{author}"'
+    # Обычный случай — событие позже всех за эти сутки: перерыв и авторы обновляются на месте
+    cur = conn.execute("""
+        INSERT INTO daily_rollup (family_id, local_date, type, count, first_ts, last_ts, max_gap, authors)
+        VALUES (?, ?, ?, 1, ?, ?, 0, json_object(?, 1))
+        ON CONFLICT (family_id, local_date, type) DO UPDATE SET
+            count = count + 1,
+            max_gap = MAX(max_gap, excluded.last_ts - last_ts),
+            last_ts = excluded.last_ts,
+            authors = json_set(authors, ?, COALESCE(json_extract(authors, ?), 0) + 1)
+        WHERE excluded.last_ts >= last_ts
+    """, (family_id, local_date, event_type, ts, ts, author, path, path))
+    if cur.rowcount == 0:
+        _rebuild_rollup_day(conn, family_id, event_type, local_date)
+
+
+def backfill_daily_rollup(family_ids=None):
+    """Пересчитать daily_rollup по events для всех семей (или перечисленных) пачками семей.
+
+    Каждая пачка — отдельная транзакция, поэтому бот и дашборд не ждут
+    весь пересчёт. Возвращает число пересчитанных семей.
+    """
+    conn = get_connection()
+    if family_ids is None:
+        family_ids = [row[0] for row in conn.execute("SELECT DISTINCT family_id FROM events")]
+    family_ids = sorted(family_ids)
+    sql, types = _rollup_insert_sql("family_id >= ? AND family_id <= ?")
+    started = time.perf_counter()
+    for i in range(0, len(family_ids), ROLLUP_BACKFILL_BATCH):
+        batch = family_ids[i:i + ROLLUP_BACKFILL_BATCH]
+        lo, hi = batch[0], batch[-1]
+        conn.execute("DELETE FROM daily_rollup WHERE family_id >= ? AND family_id <= ?", (lo, hi))
+        conn.execute(sql, types + [lo, hi])
+        conn.commit()
+    invalidate_cache()
+    logger.info("✅ daily_rollup пересчитан: %d семей за %.1f с", len(family_ids), time.perf_counter() - started)
+    return len(family_ids)
+
+
+@track_query
+def get_last_feeding_time_for_family(family_id):
+    """Получить время последнего кормления для семьи"""
+    return get_last_event_time('feedings', family_id)
+
+
+@track_query
+def get_last_diaper_change_for_family(family_id):
+    """Получить время последней смены подгузника для семьи"""
+    return get_last_event_time('diapers', family_id)
+
+
+@track_query
+def get_last_bath_time(family_id):
+    """Получить время последнего купания для семьи"""
+    return get_last_event_time('baths', family_id)
+
+
+@track_query
+def claim_due_baths(start, end, kind='bath'):
+    """Семьи, которым пора напомнить о купании: время купания попадает в (start, end],
+    с последнего купания прошло не меньше bath_interval дней и напоминания kind
+    за эти сутки ещё не было: [(family_id, bath_interval, час, минута, last_ts)].
+
+    Найденным семьям в той же транзакции записывается дата напоминания, поэтому
+    окно можно брать с запасом назад: пропущенный тик или рестарт догоняется
+    следующим тиком, а пересекающиеся окна и параллельный тик не шлют повтор.
+    Просматриваются только семьи из окна (индекс по времени купания), последнее
+    купание каждой — один поиск по (family_id, type, ts); историю не сканируем.
+    last_ts — epoch-секунды или None, если купаний ещё не было.
+    """
+    column = BATH_REMINDER_COLUMNS[kind]
+    conn = get_connection()
+    if conn.in_transaction:
+        conn.commit()
+    # Запись сразу: второй тик ждёт, пока первый отметит семьи, и видит его даты
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        due = []
+        for day, lo, hi in _minute_windows(start, end):
+            rows = conn.execute(f"""
+                SELECT family_id, bath_interval, bath_time_hour, bath_time_minute, last_ts FROM (
+                    SELECT family_id, bath_interval, bath_time_hour, bath_time_minute, {column} AS reminded,
+                           (SELECT MAX(ts) FROM events WHERE family_id = s.family_id AND type = {BATH}) AS last_ts
+                    FROM settings s
+                    WHERE bath_enabled = 1 AND bath_time_hour * 60 + bath_time_minute > ?
+                          AND bath_time_hour * 60 + bath_time_minute <= ?
+                )
+                WHERE (reminded IS NULL OR reminded < ?)
+                  AND (last_ts IS NULL
+                       OR date(last_ts, 'unixepoch', '{THAI_UTC_MODIFIER}') <= date(?, '-' || bath_interval || ' days'))
+            """, (lo, hi, day.isoformat(), day.isoformat())).fetchall()
+            conn.executemany(f"UPDATE settings SET {column} = ? WHERE family_id = ?",
+                             [(day.isoformat(), row[0]) for row in rows])
+            due += rows
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return due
+
+
+@track_query
+def get_due_digests(start, end):
+    """Семьи с включённой сводкой, у которых время сводки попадает в (start, end]: [family_id]"""
+    conn = get_connection()
+    due = []
+    for _, lo, hi in _minute_windows(start, end):
+        due += [row[0] for row in conn.execute(
+            "SELECT family_id FROM settings WHERE digest_enabled = 1 "
+            "AND digest_time_hour * 60 + digest_time_minute > ? AND digest_time_hour * 60 + digest_time_minute <= ?",
+            (lo, hi))]
+    return due
+
+
+@track_query
+def get_digest_stats(family_ids, day):
+    """Итоги тайских суток day (date) для нескольких семей одним запросом по daily_rollup.
+
+    Возвращает строки (family_id, вид, число, первое ts, последнее ts, самый
+    долгий перерыв, author_role, author_name, число событий автора) — по строке
+    на автора; участник, которого уже нет в семье, приходит с ролью None.
+    """
+    if not family_ids:
+        return []
+    types_sql, params = _types_clause(POINT_TABLES)
+    conn = get_connection()
+    return conn.execute(f"""
+        SELECT r.family_id, r.type, r.count, r.first_ts, r.last_ts, r.max_gap, m.role, m.name, a.value
+        FROM daily_rollup r
+        JOIN json_each(r.authors) a
+        LEFT JOIN family_members m ON m.family_id = r.family_id AND m.user_id = CAST(a.key AS INTEGER)
+        WHERE r.family_id IN (SELECT value FROM json_each(?)) AND r.local_date = ? AND r.{types_sql}
+    """, [json.dumps(list(family_ids)), day.isoformat()] + params).fetchall()
+
+
+def _minute_windows(start, end):
+    """Разбить (start, end] по тайским суткам: (дата, минута суток от, минута суток до)"""
+    start, end = to_thai(start), to_thai(end)
+    # Окно, переходящее через полночь, делится на куски по тайским суткам
+    while start < end:
+        day_end = min(end, start.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1))
+        lo = (start.hour * 3600 + start.minute * 60 + start.second + start.microsecond / 1e6) / 60
+        yield start.date(), lo, lo + (day_end - start).total_seconds() / 60
+        start = day_end
+
+
+@track_query
+def get_timeline(family_id, start=None, end=None, tables=None, limit=None, newest_first=True, after=None):
+    """События нескольких видов одним запросом: (id, вид, ts, author_role, author_name).
+
+    start/end — datetime или ISO-строки, интервал [start, end); ts — epoch-секунды.
+    after — (ts, id) последней строки предыдущей страницы: следующая страница
+    начинается сразу за ней в выбранном порядке (keyset, без OFFSET), поэтому
+    любая страница — один спуск по индексу (family_id, ts).
+    """
+    types_sql, params = _types_clause(tables)
+    query = f"SELECT id, type, ts, author_role, author_name FROM events WHERE family_id = ? AND {types_sql}"
+    params = [family_id] + params
+    if start is not None:
+        query += " AND ts >= ?"
+        params.append(_to_ts(start))
+    if end is not None:
+        query += " AND ts < ?"
+        params.append(_to_ts(end))
+    if after is not None:
+        query += " AND (ts, id) < (?, ?)" if newest_first else " AND (ts, id) > (?, ?)"
+        params += list(after)
+    query += " ORDER BY ts DESC, id DESC" if newest_first else " ORDER BY ts, id"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    conn = get_connection()
+    return [(entry_id, EVENT_NAMES[event_type], ts, role, name)
+            for entry_id, event_type, ts, role, name in conn.execute(query, params)]
+
+
+@track_query
+def get_daily_totals(family_id, start, end=None, tables=None):
+    """Итоги по тайским суткам одним запросом: {(date ISO, вид): значение}.
+
+    Для моментальных видов значение — число событий за сутки из daily_rollup
+    (берутся целые сутки, которые задевает период), для сна — секунды сна
+    в эти сутки (интервал через полночь делится между сутками).
+    """
+    tables = tables or EVENT_TABLES
+    start_ts = _to_ts(start)
+    end_ts = _to_ts(end) if end is not None else clock.time()
+    now = clock.time()
+    # Одним запросом: счётчики моментальных событий и интервалы сна, задевающие период
+    parts, params = [], []
+    points = [table for table in tables if table in POINT_TABLES]
+    if points:
+        types_sql, types = _types_clause(points)
+        parts.append(f"SELECT local_date, type, count, NULL FROM daily_rollup "
+                     f"WHERE family_id = ? AND {types_sql} AND local_date >= ? AND local_date <= ?")
+        params += [family_id] + types + [_local_date(start_ts), _local_date(max(start_ts, end_ts - 0.001))]
+    if 'sleep' in tables:
+        parts.append(f"SELECT NULL, type, ts, end_ts FROM events WHERE family_id = ? AND type = {SLEEP} "
+                     f"AND ts >= ? AND ts < ? AND COALESCE(end_ts, ?) > ?")
+        params += [family_id, start_ts - SLEEP_MAX_SECONDS, end_ts, now, start_ts]
+    if not parts:
+        return {}
+
+    totals = {}
+    conn = get_connection()
+    for day, event_type, value, sleep_end in conn.execute(" UNION ALL ".join(parts), params):
+        if day is not None:
+            totals[(day, EVENT_NAMES[event_type])] = value
+            continue
+        lo = max(value, start_ts)
+        hi = min(_sleep_end(value, sleep_end, now), end_ts)
+        for sleep_day, seconds in _split_by_day(lo, hi):
+            key = (sleep_day, 'sleep')
+            totals[key] = totals.get(key, 0) + seconds
+    return totals
+
+
+# Сон: интервалы [ts, end_ts) в той же таблице events
+def _sleep_end(ts, end_ts, now):
+    """Фактический конец интервала сна: открытый — до «сейчас», не длиннее SLEEP_MAX_SECONDS"""
+    return min(end_ts if end_ts is not None else now, ts + SLEEP_MAX_SECONDS)
+
+
+def _split_by_day(lo, hi):
+    """Разбить интервал epoch-секунд по тайским суткам: [(date ISO, секунды)]"""
+    parts = []
+    while lo < hi:
+        midnight = (lo + THAI_UTC_OFFSET) // 86400 * 86400 + 86400 - THAI_UTC_OFFSET
+        part_end = min(hi, midnight)
+        parts.append((from_timestamp(lo).date().isoformat(), part_end - lo))
+        lo = part_end
+    return parts
+
+
+@track_query
+def get_open_sleep(family_id):
+    """Открытый интервал сна семьи: (id, ts) или None"""
+    conn = get_connection()
+    # Без ANALYZE планировщик выбирает (family_id, type, ts) и перебирает весь сон семьи
+    return conn.execute(f"SELECT id, ts FROM events INDEXED BY idx_events_open_sleep "
+                        f"WHERE family_id = ? AND type = {SLEEP} AND end_ts IS NULL "
+                        f"ORDER BY ts DESC LIMIT 1", (family_id,)).fetchone()
+
+
+@track_query
+def start_sleep(user_id, timestamp):
+    """Открыть интервал сна; если малыш уже спит — вернуть открытый: (id, ts, создан ли новый)"""
+    family_id = get_family_id(user_id)
+    start_ts = _to_ts(timestamp)
+    if family_id:
+        current = get_open_sleep(family_id)
+        if current and start_ts - current[1] < SLEEP_MAX_SECONDS:
+            return current[0], current[1], False
+        if current:
+            # Забытый интервал закрываем той длиной, которой он уже учитывался в суммах
+            conn = get_connection()
+            conn.execute("UPDATE events SET end_ts = ts + ? WHERE id = ?", (SLEEP_MAX_SECONDS, current[0]))
+            conn.commit()
+            logger.info("ℹ️ Семья %s: незакрытый сон #%s закрыт автоматически", family_id, current[0])
+    return add_event('sleep', user_id, timestamp), start_ts, True
+
+
+@track_query
+def stop_sleep(user_id, timestamp):
+    """Закрыть открытый интервал сна семьи: (id, ts, end_ts) или None, если малыш не спит"""
+    family_id = get_family_id(user_id)
+    current = get_open_sleep(family_id) if family_id else None
+    if not current:
+        return None
+    entry_id, start_ts = current
+    end_ts = max(_to_ts(timestamp), start_ts)
+    conn = get_connection()
+    conn.execute("UPDATE events SET end_ts = ? WHERE id = ?", (end_ts, entry_id))
+    conn.commit()
+    return entry_id, start_ts, end_ts
+
+
+@track_query
+def get_sleep_intervals(family_id, start, end=None):
+    """Интервалы сна, пересекающие [start, end): (id, ts, end_ts или None, author_role, author_name).
+
+    Интервал не длиннее SLEEP_MAX_SECONDS, поэтому поиск по индексу
+    (family_id, type, ts) ограничен снизу start - SLEEP_MAX_SECONDS.
+    """
+    start_ts = _to_ts(start)
+    end_ts = _to_ts(end) if end is not None else clock.time()
+    conn = get_connection()
+    return conn.execute(
+        f"SELECT id, ts, end_ts, author_role, author_name FROM events "
+        f"WHERE family_id = ? AND type = {SLEEP} AND ts >= ? AND ts < ? AND COALESCE(end_ts, ?) > ? ORDER BY ts",
+        (family_id, start_ts - SLEEP_MAX_SECONDS, end_ts, clock.time(), start_ts)).fetchall()
+
+
+def get_sleep_total(family_id, start, end=None):
+    """Сколько секунд малыш спал в [start, end) (открытый интервал — до «сейчас»)"""
+    start_ts = _to_ts(start)
+    end_ts = _to_ts(end) if end is not None else clock.time()
+    now = clock.time()
+    return sum(max(0, min(_sleep_end(ts, sleep_end, now), end_ts) - max(ts, start_ts))
+               for _, ts, sleep_end, _, _ in get_sleep_intervals(family_id, start, end))
+
+
+@track_query
+def get_events_after_id(table, family_id, last_id):
+    """Получить события семьи с id больше last_id (для инкрементальных кэшей): (id, ts, author_role, author_name)"""
+    conn = get_connection()
+    return conn.execute("SELECT id, ts, author_role, author_name FROM events WHERE family_id = ? AND type = ? AND id > ? ORDER BY id",
+                        (family_id, _event_type(table), last_id)).fetchall()
+
+
+@track_query
+def get_events_version(family_id):
+    """Счётчик правок событий семьи (0, если их не было).
+
+    Растёт при каждом удалении или изменении записи семьи (триггеры на events),
+    поэтому кэш, дочитывающий только новые id, по смене счётчика понимает, что
+    нужен пересчёт. Один поиск по первичному ключу.
+    """
+    conn = get_connection()
+    row = conn.execute("SELECT version FROM event_versions WHERE family_id = ?", (family_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def iter_event_times(tables, since_ts, batch_size=100_000):
+    """Пачки (family_id, type, ts) всех семей с since_ts, по порядку (family_id, type, ts)
+
+    Генератор для ночных проходов по всей базе: строки читаются покрывающим
+    индексом без сортировки и отдаются по batch_size, не собираясь в один список.
+    """
+    types_sql, params = _types_clause(tables)
+    conn = get_connection()
+    cursor = conn.execute(f"SELECT family_id, type, ts FROM events INDEXED BY idx_events_family_type_ts "
+                          f"WHERE {types_sql} AND ts >= ? ORDER BY family_id, type, ts", params + [since_ts])
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+@track_query
+def families_with_events(table, family_ids, since_ts):
+    """Какие из семей family_ids записывали события table с since_ts: множество id.
+
+    По одному поиску в индексе (family_id, type, ts) на семью — для коротких
+    списков кандидатов, без прохода по событиям всех семей.
+    """
+    event_type = _event_type(table)
+    conn = get_connection()
+    return {family_id for family_id in family_ids if conn.execute(
+        "SELECT 1 FROM events WHERE family_id = ? AND type = ? AND ts >= ? LIMIT 1",
+        (family_id, event_type, since_ts)).fetchone()}
+
+
+def iter_family_events(family_id, batch_size=1000):
+    """Все события семьи по времени: (id, вид, ts, end_ts, author_id, author_role, author_name).
+
+    Генератор для выгрузки: курсор шагает по индексу (family_id, ts) и отдаёт
+    строки пачками по batch_size, поэтому память не зависит от длины истории.
+    """
+    conn = get_connection()
+    cursor = conn.execute("SELECT id, type, ts, end_ts, author_id, author_role, author_name FROM events "
+                          "WHERE family_id = ? ORDER BY ts, id", (family_id,))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for entry_id, event_type, ts, end_ts, author_id, role, name in rows:
+            yield entry_id, EVENT_NAMES.get(event_type, str(event_type)), ts, end_ts, author_id, role, name
+
+
+@track_query
+def delete_entry(table, entry_id, family_id=None):
+    """Удалить событие (при family_id — только если оно принадлежит этой семье)"""
+    query = "DELETE FROM events WHERE id = ? AND type = ?"
+    params = [entry_id, _event_type(table)]
+    if family_id is not None:
+        query += " AND family_id = ?"
+        params.append(family_id)
+    conn = get_connection()
+    # Семья и время удаляемой записи: для пересборки статистики, итогов суток и сброса сводки
+    row = conn.execute("SELECT family_id, ts FROM events WHERE id = ?", (entry_id,)).fetchone()
+    deleted = conn.execute(query, params).rowcount
+    if deleted:
+        _after_event_change(conn, table, row[0], [row[1]])
+    conn.commit()
+    if deleted:
+        invalidate_cache(('digest', row[0]))
+    return deleted
+
+
+@track_query
+def get_event_time(table, entry_id, family_id=None):
+    """Время события (aware, в тайском поясе) или None, если записи нет (или она чужой семьи)"""
+    query = "SELECT ts FROM events WHERE id = ? AND type = ?"
+    params = [entry_id, _event_type(table)]
+    if family_id is not None:
+        query += " AND family_id = ?"
+        params.append(family_id)
+    row = get_connection().execute(query, params).fetchone()
+    return from_timestamp(row[0]) if row else None
+
+
+@track_query
+def get_event_cursor(entry_id, family_id):
+    """Ключ (ts, id) события семьи для keyset-пагинации (after= в get_timeline) или None"""
+    row = get_connection().execute("SELECT ts, id FROM events WHERE id = ? AND family_id = ?",
+                                   (entry_id, family_id)).fetchone()
+    return tuple(row) if row else None
+
+
+@track_query
+def update_event_time(table, entry_id, timestamp, family_id=None):
+    """Изменить время события (при family_id — только события этой семьи); True, если запись найдена"""
+    event_type = _event_type(table)
+    query = "SELECT family_id, ts FROM events WHERE id = ? AND type = ?"
+    params = [entry_id, event_type]
+    if family_id is not None:
+        query += " AND family_id = ?"
+        params.append(family_id)
+    conn = get_connection()
+    row = conn.execute(query, params).fetchone()
+    if row is None:
+        return False
+    ts = _to_ts(timestamp)
+    conn.execute("UPDATE events SET ts = ? WHERE id = ?", (ts, entry_id))
+    # Пересчитываются и прежние, и новые сутки
+    _after_event_change(conn, table, row[0], [row[1], ts])
+    conn.commit()
+    invalidate_cache(('digest', row[0]))
+    return True
+
+
+def _after_event_change(conn, table, family_id, timestamps):
+    """Пересобрать производные данные после удаления или правки события (в той же транзакции)"""
+    if table == 'feedings':
+        _rebuild_feeding_stats(conn, family_id)
+    if table in POINT_TABLES:
+        for local_date in {_local_date(ts) for ts in timestamps}:
+            _rebuild_rollup_day(conn, family_id, EVENT_TYPES[table], local_date)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Общие фикстуры тестов
+
+База и собранная статика дашборда создаются во временном каталоге до
+импорта storage и app, чтобы тесты никогда не трогали рабочий babybot.db
+и дерево исходников.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_workdir = tempfile.mkdtemp(prefix='babybot-tests-')
+os.environ['BABYBOT_DB'] = os.path.join(_workdir, 'babybot.db')
+os.environ['DASHBOARD_ASSETS_DIR'] = os.path.join(_workdir, 'assets')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'mini_app'))
+
+import clock  # noqa: E402
+import storage  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Чистая база на каждый тест"""
+    storage.configure(str(tmp_path / 'babybot.db'))
+    storage.init_db()
+    yield storage
+    storage.close_connection()
+
+
+@pytest.fixture
+def dashboard(db):
+    """Тестовый клиент дашборда поверх чистой базы"""
+    import app as dashboard_app
+    dashboard_app.analytics.invalidate()
+    dashboard_app.growth_cache.invalidate()
+    return dashboard_app.create_app().test_client()
+
+
+@pytest.fixture
+def virtual_clock():
+    """Часы бота, которые стоят на месте: 13.10.2025 (понедельник) 12:00 по тайскому времени"""
+    virtual = clock.VirtualClock(datetime(2025, 10, 13, 12, 0))
+    previous = clock.set_clock(virtual)
+    yield virtual
+    clock.set_clock(previous)
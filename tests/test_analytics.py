@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Тесты кэша аналитики дашборда"""
+
+from datetime import datetime
+
+import clock
+
+
+def _thai(hour, day=13):
+    # 13.10.2025 — понедельник
+    return clock.to_thai(datetime(2025, 10, day, hour, 0))
+
+
+def _heatmap_hours(response, table):
+    grid = response.get_json()[table]
+    return [(weekday, hour) for weekday, row in enumerate(grid) for hour, n in enumerate(row) for _ in range(n)]
+
+
+def test_analytics_sees_edited_event_time(dashboard, db):
+    family_id = db.create_family("Семья", 201)
+    db.add_event('feedings', 201, _thai(8))
+    entry_id = db.add_event('feedings', 201, _thai(11))
+
+    assert _heatmap_hours(dashboard.get(f'/api/analytics/{family_id}/heatmap'), 'feedings') == [(0, 8), (0, 11)]
+    assert dashboard.get(f'/api/analytics/{family_id}/intervals').get_json()['average_minutes'] == 180.0
+
+    # Число событий и максимальный id не меняются — меняется только время
+    assert db.update_event_time('feedings', entry_id, _thai(10), family_id)
+
+    assert _heatmap_hours(dashboard.get(f'/api/analytics/{family_id}/heatmap'), 'feedings') == [(0, 8), (0, 10)]
+    assert dashboard.get(f'/api/analytics/{family_id}/intervals').get_json()['average_minutes'] == 120.0
+    authors = dashboard.get(f'/api/analytics/{family_id}/authors').get_json()
+    assert [author['feedings'] for author in authors] == [2]
+
+
+def test_analytics_sees_delete_then_insert(dashboard, db):
+    family_id = db.create_family("Семья", 202)
+    first = db.add_event('diapers', 202, _thai(8))
+    db.add_event('diapers', 202, _thai(9))
+    assert _heatmap_hours(dashboard.get(f'/api/analytics/{family_id}/heatmap'), 'diapers') == [(0, 8), (0, 9)]
+
+    db.delete_entry('diapers', first, family_id)
+    db.add_event('diapers', 202, _thai(15, day=14))
+
+    assert _heatmap_hours(dashboard.get(f'/api/analytics/{family_id}/heatmap'), 'diapers') == [(0, 9), (1, 15)]
+
+
+def test_events_version_counts_only_rewrites(db, virtual_clock):
+    family_id = db.create_family("Семья", 203)
+    entry_id = db.add_event('feedings', 203, _thai(8))
+    db.start_sleep(203, _thai(9))
+    db.stop_sleep(203, _thai(10))
+    # Новые записи и закрытие сна кэши видят по id — счётчик не растёт
+    assert db.get_events_version(family_id) == 0
+
+    db.update_event_time('feedings', entry_id, _thai(7), family_id)
+    edited = db.get_events_version(family_id)
+    assert edited > 0
+    db.delete_entry('feedings', entry_id, family_id)
+    assert db.get_events_version(family_id) > edited
+
+
+def test_analytics_sees_author_changed_in_sql(dashboard, db):
+    family_id = db.create_family("Семья", 204)
+    db.add_event('feedings', 204, _thai(8))
+    assert [a['author'] for a in dashboard.get(f'/api/analytics/{family_id}/authors').get_json()] == \
+        ['Родитель Неизвестно']
+
+    # Правка в обход storage: число событий и их время прежние
+    conn = db.get_connection()
+    conn.execute("UPDATE events SET author_role = 'Папа', author_name = 'Иван' WHERE family_id = ?", (family_id,))
+    conn.commit()
+    assert [a['author'] for a in dashboard.get(f'/api/analytics/{family_id}/authors').get_json()] == ['Папа Иван']
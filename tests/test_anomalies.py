@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Тесты ночного поиска аномалий и его рассылки"""
+
+import asyncio
+from datetime import timedelta
+
+import anomalies
+
+
+def _log(db, user_id, table, now, hours):
+    for hour in hours:
+        db.add_event(table, user_id, now - timedelta(hours=hour))
+
+
+def test_missing_diapers_flag_only_for_families_that_log_them(db, virtual_clock):
+    now = virtual_clock.now()
+    never = db.create_family("Без подгузников", 61)
+    stopped = db.create_family("Перестали записывать", 62)
+    _log(db, 61, 'feedings', now, (1, 4, 7))
+    _log(db, 62, 'feedings', now, (1, 4, 7))
+    _log(db, 62, 'diapers', now, (5 * 24, 5 * 24 + 3))
+
+    flags = anomalies.scan(now=now.timestamp())
+    assert never not in flags
+    assert flags[stopped] == {'diaper_gap': None}
+
+    # Смены были больше DIAPER_LOOKBACK_DAYS назад — тоже не пишем
+    assert stopped not in anomalies.scan(now=(now + timedelta(days=3)).timestamp())
+
+
+def test_anomaly_digest_respects_opt_out(db, virtual_clock, monkeypatch):
+    import main
+
+    now = virtual_clock.now()
+    subscribed = db.create_family("Со сводкой", 63)
+    opted_out = db.create_family("Без сводки", 64)
+    for user_id in (63, 64):
+        _log(db, user_id, 'feedings', now, (1, 3))
+        _log(db, user_id, 'diapers', now, (20, 24))
+
+    sent = []
+
+    async def fake_send(user_id, message, **kwargs):
+        sent.append(user_id)
+
+    monkeypatch.setattr(main, 'send_message', fake_send)
+    db.toggle_anomaly_alerts(opted_out)
+    asyncio.run(main.send_anomaly_digests())
+    assert sent == [63]
+
+    assert db.get_settings(subscribed)['anomaly_alerts'] == 1
+    db.toggle_anomaly_alerts(opted_out)
+    sent.clear()
+    asyncio.run(main.send_anomaly_digests())
+    assert sorted(sent) == [63, 64]
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Тесты выбора семей для напоминаний о купании"""
+
+from datetime import datetime, timedelta
+
+import clock
+
+
+def _at(hour, minute=0, day=13):
+    return clock.to_thai(datetime(2025, 10, day, hour, minute))
+
+
+def _family(db, user_id, interval=1, hour=19, minute=0):
+    family_id = db.create_family("Семья", user_id)
+    db.set_bath_interval(family_id, interval)
+    db.set_bath_time(family_id, hour, minute)
+    return family_id
+
+
+def _claimed(db, start, end, kind='bath'):
+    return [row[0] for row in db.claim_due_baths(start, end, kind)]
+
+
+def test_bath_interval_counts_calendar_days(db):
+    every_other_day = _family(db, 41, interval=2)
+    bathed_yesterday = _family(db, 42, interval=2)
+    never_bathed = _family(db, 43, interval=3)
+    # Позавчера в 21:00 — меньше 48 часов назад, но уже два календарных дня
+    db.add_event('baths', 41, _at(21, day=11))
+    db.add_event('baths', 42, _at(19, day=12))
+
+    due = db.claim_due_baths(_at(18, 45), _at(19))
+    assert [row[:4] for row in due] == [(every_other_day, 2, 19, 0), (never_bathed, 3, 19, 0)]
+    assert due[0][4] == _at(21, day=11).timestamp() and due[1][4] is None
+    assert bathed_yesterday not in _claimed(db, _at(18), _at(20))
+
+
+def test_disabled_and_out_of_window_families_are_skipped(db):
+    disabled = _family(db, 44)
+    db.toggle_bath_reminders(disabled)
+    later = _family(db, 45, hour=20)
+    assert _claimed(db, _at(17), _at(19, 30)) == []
+    assert _claimed(db, _at(19, 30), _at(20)) == [later]
+
+
+def test_reminder_is_sent_once_per_day(db):
+    family_id = _family(db, 46)
+    assert _claimed(db, _at(18, 50), _at(19, 5)) == [family_id]
+    # Пересекающееся окно и повторный тик в те же сутки ничего не возвращают
+    assert _claimed(db, _at(18), _at(19, 20)) == []
+    assert _claimed(db, _at(18), _at(19, 20)) == []
+    # Предупреждение за час учитывается отдельно
+    assert _claimed(db, _at(18), _at(19), 'bath_soon') == [family_id]
+    # На следующие сутки купание снова пора
+    assert _claimed(db, _at(17, day=14), _at(19, 5, day=14)) == [family_id]
+
+
+def test_missed_tick_is_caught_up(db):
+    family_id = _family(db, 47, minute=10)
+    # Тики 19:15 и 19:30 пропущены (рестарт): следующий тик с окном назад догоняет
+    now = _at(19, 40)
+    assert _claimed(db, now - timedelta(hours=2), now) == [family_id]
+
+
+def test_window_across_midnight_uses_bath_day(db):
+    family_id = _family(db, 48, hour=23, minute=50)
+    db.add_event('baths', 48, _at(20, day=12))
+    now = _at(0, 5, day=14)
+    # 23:50 относится к 13-му, а купание 12-го для интервала 1 день уже не считается
+    assert _claimed(db, now - timedelta(hours=2), now) == [family_id]
+    conn = db.get_connection()
+    assert conn.execute("SELECT last_bath_reminder_date FROM settings WHERE family_id = ?",
+                        (family_id,)).fetchone()[0] == '2025-10-13'
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Тесты веб-дашборда"""
+
+import os
+import re
+
+import assets
+
+
+def test_dashboard_content_type_has_single_charset(dashboard):
+    response = dashboard.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'text/html; charset=utf-8'
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+def test_dashboard_not_modified(dashboard):
+    etag = dashboard.get('/').headers['ETag']
+    response = dashboard.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_assets_are_built_outside_the_source_tree(dashboard):
+    assert assets.DIST_DIR == os.environ['DASHBOARD_ASSETS_DIR']
+    html = dashboard.get('/').get_data(as_text=True)
+    urls = re.findall(r'/assets/[^"\']+', html)
+    assert urls
+    for url in urls:
+        response = dashboard.get(url)
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == assets.IMMUTABLE_CACHE_CONTROL
+        response.close()
+        assert os.path.isfile(os.path.join(assets.DIST_DIR, url[len('/assets/'):]))
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Тесты потоковой выгрузки истории и доступа к ней из дашборда"""
+
+import csv
+import hashlib
+import hmac
+import io
+import json
+from datetime import datetime
+from urllib.parse import urlencode
+
+import pytest
+
+import auth
+import clock
+import export
+
+BOT_TOKEN = '123456:TEST'
+
+
+def _at(hour, minute=0, day=13):
+    return clock.to_thai(datetime(2025, 10, day, hour, minute))
+
+
+@pytest.fixture
+def family(db, virtual_clock):
+    family_id = db.create_family("Семья", 81)
+    db.set_member_role(81, 'Мама', 'Анна')
+    db.add_event('feedings', 81, _at(8))
+    db.add_event('diapers', 81, _at(8, 30))
+    db.start_sleep(81, _at(9))
+    db.stop_sleep(81, _at(10, 15))
+    return family_id
+
+
+def _events(records):
+    return [(r['type'], r['time'], r['end_time'] or None, r['author_role']) for r in records if r['record'] == 'event']
+
+
+EXPECTED_EVENTS = [
+    ('feedings', '2025-10-13T08:00:00+07:00', None, 'Мама'),
+    ('diapers', '2025-10-13T08:30:00+07:00', None, 'Мама'),
+    ('sleep', '2025-10-13T09:00:00+07:00', '2025-10-13T10:15:00+07:00', 'Мама'),
+]
+
+
+def test_csv_export_streams_in_chunks(family, monkeypatch):
+    monkeypatch.setattr(export, 'CHUNK_RECORDS', 4)
+    chunks = list(export.iter_export(family, 'csv'))
+    assert len(chunks) > 2
+    rows = list(csv.DictReader(io.StringIO(''.join(chunks))))
+
+    settings = {r['key']: r['value'] for r in rows if r['record'] == 'setting'}
+    assert settings['feed_interval'] == '3' and len(settings) == len(export.storage.SETTINGS_COLUMNS)
+    assert [(r['user_id'], r['role'], r['name']) for r in rows if r['record'] == 'member'] == [('81', 'Мама', 'Анна')]
+    assert _events(rows) == EXPECTED_EVENTS
+
+
+def test_jsonl_export_omits_empty_fields(family, tmp_path):
+    path = str(tmp_path / export.filename(family, 'jsonl'))
+    size = export.write_export(family, 'jsonl', path)
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    assert size == len(text.encode('utf-8'))
+
+    records = [json.loads(line) for line in text.splitlines()]
+    assert all(None not in record.values() for record in records)
+    assert _events([dict({'end_time': None}, **r) for r in records]) == EXPECTED_EVENTS
+    with pytest.raises(ValueError):
+        export.iter_export(family, 'xml')
+
+
+def _init_data(user_id, auth_date, token=BOT_TOKEN):
+    pairs = {'auth_date': str(int(auth_date)), 'query_id': 'AAH', 'user': json.dumps({'id': user_id, 'first_name': 'Анна'})}
+    check_string = "\n".join(f"{key}={value}" for key, value in sorted(pairs.items()))
+    secret = hmac.new(b'WebAppData', token.encode(), hashlib.sha256).digest()
+    pairs['hash'] = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(pairs)
+
+
+@pytest.fixture
+def signed(monkeypatch):
+    monkeypatch.setattr(auth, 'BOT_TOKEN', BOT_TOKEN)
+
+
+def test_export_requires_family_member(dashboard, family, signed, db, virtual_clock):
+    url = f'/api/export/{family}?format=jsonl'
+    assert dashboard.get(url).status_code == 401
+
+    now = virtual_clock.time()
+    response = dashboard.get(url, headers={'Authorization': f'tma {_init_data(81, now)}'})
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['type'] for line in lines if '"event"' in line] == ['feedings', 'diapers', 'sleep']
+
+    # Тот же initData через параметр — для обычной ссылки на скачивание
+    assert dashboard.get(f'{url}&{urlencode({"init_data": _init_data(81, now)})}').status_code == 200
+
+    db.create_family("Другая семья", 82)
+    assert dashboard.get(url, headers={'Authorization': f'tma {_init_data(82, now)}'}).status_code == 403
+
+
+@pytest.mark.parametrize('init_data', [
+    lambda now: _init_data(81, now, token='999:OTHER'),
+    lambda now: _init_data(81, now).replace('%22id%22%3A+81', '%22id%22%3A+82'),
+    lambda now: _init_data(81, now - auth.INIT_DATA_MAX_AGE - 1),
+    lambda now: 'hash=abc',
+])
+def test_export_rejects_bad_init_data(dashboard, family, signed, virtual_clock, init_data):
+    response = dashboard.get(f'/api/export/{family}', headers={'Authorization': f'tma {init_data(virtual_clock.time())}'})
+    assert response.status_code == 401
+
+
+def test_export_disabled_without_bot_token(dashboard, family, monkeypatch, virtual_clock):
+    monkeypatch.setattr(auth, 'BOT_TOKEN', '')
+    response = dashboard.get(f'/api/export/{family}', headers={'Authorization': f'tma {_init_data(81, virtual_clock.time())}'})
+    assert response.status_code == 503
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Тесты статистики промежутков между кормлениями (feeding_stats)"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import clock
+import storage
+
+HOUR = 3600
+
+
+def _at(hour, minute=0, day=13):
+    return clock.to_thai(datetime(2025, 10, day, hour, minute))
+
+
+def _replay(timestamps):
+    state = None
+    for ts in timestamps:
+        state = storage._feeding_stats_step(state, ts)
+    return state
+
+
+def test_ewma_step_by_hand():
+    # Промежутки 3 ч, затем 2 ч: среднее 3 - 0.3 * 1 ч, дисперсия 0.7 * 0.3 * 1 ч²
+    last_ts, mean, var, samples = _replay([0, 3 * HOUR, 5 * HOUR])
+    assert last_ts == 5 * HOUR
+    assert mean == pytest.approx(2.7 * HOUR)
+    assert var == pytest.approx(0.21 * HOUR * HOUR)
+    assert samples == 2
+
+
+def test_gaps_outside_range_and_backdated_feedings_are_ignored():
+    short, long = storage.FEEDING_GAP_RANGE[0] - 1, storage.FEEDING_GAP_RANGE[1] + 1
+    state = _replay([0, 3 * HOUR])
+    # Повторное нажатие и пропуск записи двигают только last_ts
+    after_short = storage._feeding_stats_step(state, 3 * HOUR + short)
+    assert after_short == (3 * HOUR + short,) + state[1:]
+    after_long = storage._feeding_stats_step(after_short, after_short[0] + long)
+    assert after_long[1:] == state[1:]
+    # Запись задним числом не меняет состояние
+    assert storage._feeding_stats_step(state, HOUR) == state
+
+
+def test_stats_follow_add_edit_and_delete(db):
+    family_id = db.create_family("Семья", 51)
+    ids = [db.add_event('feedings', 51, _at(hour)) for hour in (6, 9, 11)]
+    stats = db.get_feeding_stats(family_id)
+    assert stats['ewma_gap'] == pytest.approx(2.7 * HOUR)
+    assert stats['ewma_std'] == pytest.approx(0.21 ** 0.5 * HOUR)
+    assert stats['samples'] == 2
+
+    # Удаление последнего кормления пересобирает ряд: остался один промежуток 3 ч
+    assert db.delete_entry('feedings', ids[-1], family_id)
+    stats = db.get_feeding_stats(family_id)
+    assert (stats['last_ts'], stats['ewma_gap'], stats['samples']) == (_at(9).timestamp(), 3 * HOUR, 1)
+
+    # Правка времени тоже пересобирает: 6:00 → 7:00, промежуток 2 ч
+    assert db.update_event_time('feedings', ids[0], _at(7), family_id)
+    assert db.get_feeding_stats(family_id)['ewma_gap'] == 2 * HOUR
+
+
+def test_incremental_stats_match_rebuild(db):
+    family_id = db.create_family("Семья", 52)
+    start = _at(0, day=10)
+    for minutes in (0, 170, 175, 400, 560, 1500, 1690, 1880, 1700):
+        db.add_event('feedings', 52, start + timedelta(minutes=minutes))
+    incremental = db.get_feeding_stats(family_id)
+
+    db.backfill_feeding_stats([family_id])
+    rebuilt = db.get_feeding_stats(family_id)
+    # Кормление 1700 пришло задним числом: инкремент его пропустил, пересборка учла
+    assert rebuilt['samples'] == incremental['samples'] + 1
+    assert rebuilt['last_ts'] == incremental['last_ts']
+
+    db.get_connection().execute("DELETE FROM feeding_stats")
+    assert db.get_feeding_stats(family_id) == rebuilt
+
+
+def test_no_feedings_means_no_stats(db):
+    family_id = db.create_family("Семья", 53)
+    assert db.get_feeding_stats(family_id) is None
+    feeding_id = db.add_event('feedings', 53, _at(8))
+    assert db.get_feeding_stats(family_id)['samples'] == 0
+    assert db.delete_entry('feedings', feeding_id, family_id)
+    assert db.get_feeding_stats(family_id) is None
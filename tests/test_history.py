@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Тесты постраничной истории бота"""
+
+from datetime import datetime, timedelta
+
+import clock
+import metrics
+
+
+def test_history_pages_have_bounded_callback_kinds(db):
+    import main
+
+    family_id = db.create_family("Семья", 301)
+    day = datetime(2025, 10, 13)
+    for minutes in range(0, 25 * 30, 30):
+        db.add_event('feedings', 301, clock.to_thai(day + timedelta(minutes=minutes, seconds=0.123456)))
+
+    seen = []
+    text, buttons = main.history_day_view(family_id, day.date())
+    for _ in range(5):
+        data = [button.type.data.decode() for row in buttons for button in row]
+        seen.extend(data)
+        later = [d for d in data if d.startswith('histn_')]
+        if not later:
+            break
+        entry_id = int(later[0].split('_')[1])
+        cursor = db.get_event_cursor(entry_id, family_id)
+        assert clock.from_timestamp(cursor[0]).date() == day.date()
+        text, buttons = main.history_day_view(family_id, day.date(), cursor)
+
+    kinds = {metrics.callback_kind(d) for d in seen}
+    assert {'histn', 'histp'} <= kinds
+    assert kinds <= {'histd', 'histw', 'histn', 'histp', 'edit_feed', 'del_feed'}
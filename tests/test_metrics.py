@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""Тесты метрик"""
+
+import metrics
+
+
+def test_track_query_records_only_outer_call():
+    @metrics.track_query
+    def inner_helper():
+        return 1
+
+    @metrics.track_query
+    def outer_helper():
+        return inner_helper() + inner_helper()
+
+    assert outer_helper() == 2
+    assert metrics.DB_QUERY_LATENCY.count(helper='outer_helper') == 1
+    assert metrics.DB_QUERY_LATENCY.count(helper='inner_helper') == 0
+
+    inner_helper()
+    assert metrics.DB_QUERY_LATENCY.count(helper='inner_helper') == 1
+
+
+def test_callback_kind_has_fixed_history_kinds():
+    data = [b'hist_2', b'histd_20261019', b'histw_20261019', b'histn_1760000045', b'histp_45',
+            b'feed_15', b'tips_hour_7', b'del_feed_123']
+    assert [metrics.callback_kind(d) for d in data] == [
+        'hist', 'histd', 'histw', 'histn', 'histp', 'feed', 'tips_hour', 'del_feed']
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Тесты миграции старых таблиц feedings/diapers в events и представлений совместимости"""
+
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import clock
+import storage
+from conftest import ROOT
+
+# Схема из исходной версии бота: события — отдельные таблицы с ISO-временем в тексте
+BASELINE_SCHEMA = """
+    CREATE TABLE families (id INTEGER PRIMARY KEY, name TEXT NOT NULL);
+    CREATE TABLE family_members (family_id INTEGER, user_id INTEGER,
+                                 role TEXT DEFAULT 'Родитель', name TEXT DEFAULT 'Неизвестно');
+    CREATE TABLE feedings (id INTEGER PRIMARY KEY, family_id INTEGER, author_id INTEGER, timestamp TEXT NOT NULL,
+                           author_role TEXT DEFAULT 'Родитель', author_name TEXT DEFAULT 'Неизвестно');
+    CREATE TABLE diapers (id INTEGER PRIMARY KEY, family_id INTEGER, author_id INTEGER, timestamp TEXT NOT NULL,
+                          author_role TEXT DEFAULT 'Родитель', author_name TEXT DEFAULT 'Неизвестно');
+    CREATE TABLE settings (family_id INTEGER, feed_interval INTEGER DEFAULT 3, diaper_interval INTEGER DEFAULT 2,
+                           tips_enabled INTEGER DEFAULT 1, tips_time_hour INTEGER DEFAULT 9,
+                           tips_time_minute INTEGER DEFAULT 0, bath_interval INTEGER DEFAULT 1,
+                           bath_time_hour INTEGER DEFAULT 19, bath_time_minute INTEGER DEFAULT 0,
+                           bath_enabled INTEGER DEFAULT 1);
+"""
+
+
+def _thai_ts(*args):
+    return clock.to_thai(datetime(*args)).timestamp()
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """База в исходной схеме: наивное тайское время и время с +07:00, плюс нечитаемая запись"""
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.execute("INSERT INTO families (id, name) VALUES (1, 'Семья')")
+    conn.execute("INSERT INTO family_members (family_id, user_id, role, name) VALUES (1, 11, 'Мама', 'Анна')")
+    conn.execute("INSERT INTO settings (family_id) VALUES (1)")
+    conn.executemany("INSERT INTO feedings (family_id, author_id, timestamp, author_role, author_name) "
+                     "VALUES (1, 11, ?, 'Мама', 'Анна')",
+                     [('2025-08-27T20:00:00',), ('2025-08-27T23:20:09.535717+07:00',), ('не время',)])
+    conn.execute("INSERT INTO diapers (family_id, author_id, timestamp) VALUES (1, 11, '2025-08-28 03:25:00')")
+    conn.commit()
+    conn.close()
+    storage.configure(path)
+    yield path
+    storage.close_connection()
+
+
+def _events(conn):
+    return conn.execute("SELECT family_id, type, ts, author_id, author_role, author_name "
+                        "FROM events ORDER BY type, ts").fetchall()
+
+
+def test_legacy_tables_move_into_events(legacy_db):
+    storage.init_db()
+    conn = storage.get_connection()
+
+    assert _events(conn) == [
+        (1, storage.FEEDING, _thai_ts(2025, 8, 27, 20, 0), 11, 'Мама', 'Анна'),
+        (1, storage.FEEDING, _thai_ts(2025, 8, 27, 23, 20, 9, 535717), 11, 'Мама', 'Анна'),
+        (1, storage.DIAPER, _thai_ts(2025, 8, 28, 3, 25), 11, 'Родитель', 'Неизвестно'),
+    ]
+    kinds = dict(conn.execute("SELECT name, type FROM sqlite_master WHERE name IN ('feedings', 'diapers')"))
+    assert kinds == {'feedings': 'view', 'diapers': 'view'}
+    # Итоги по суткам пересчитаны по перенесённым событиям
+    assert storage.get_daily_totals(1, '2025-08-27')[('2025-08-27', 'feedings')] == 2
+
+
+def test_migration_is_idempotent(legacy_db):
+    storage.init_db()
+    before = _events(storage.get_connection())
+    storage.init_db()
+    assert _events(storage.get_connection()) == before
+
+
+@pytest.mark.skipif(not os.path.exists(os.path.join(ROOT, 'babybot.db')), reason="нет babybot.db из репозитория")
+def test_tracked_database_migrates(tmp_path):
+    path = str(tmp_path / 'babybot.db')
+    shutil.copy(os.path.join(ROOT, 'babybot.db'), path)
+    legacy = sqlite3.connect(path)
+    expected = legacy.execute("SELECT COUNT(*) FROM feedings").fetchone()[0]
+    first = legacy.execute("SELECT timestamp FROM feedings ORDER BY id").fetchone()[0]
+    legacy.close()
+
+    storage.configure(path)
+    try:
+        storage.init_db()
+        storage.init_db()
+        conn = storage.get_connection()
+        assert conn.execute("SELECT COUNT(*) FROM events WHERE type = ?", (storage.FEEDING,)).fetchone()[0] == expected
+        # Представление отдаёт то же время, что было в старой таблице (с точностью до миллисекунд)
+        migrated = conn.execute("SELECT timestamp FROM feedings ORDER BY id").fetchone()[0]
+        assert clock.parse(migrated).timestamp() == pytest.approx(clock.parse(first).timestamp(), abs=1e-3)
+    finally:
+        storage.close_connection()
+
+
+@pytest.mark.parametrize('timestamp, expected', [
+    ('2025-08-27T20:00:00', _thai_ts(2025, 8, 27, 20, 0)),
+    ('2025-08-27T20:00:00+07:00', _thai_ts(2025, 8, 27, 20, 0)),
+    ('2025-08-27T13:00:00Z', _thai_ts(2025, 8, 27, 20, 0)),
+    ('2025-08-27T20:00:00.250+07:00', _thai_ts(2025, 8, 27, 20, 0) + 0.25),
+])
+def test_insert_through_compat_view(db, timestamp, expected):
+    family_id = db.create_family("Семья", 21)
+    conn = db.get_connection()
+    conn.execute("INSERT INTO diapers (family_id, author_id, timestamp) VALUES (?, 21, ?)", (family_id, timestamp))
+    conn.commit()
+
+    row = conn.execute("SELECT type, ts, author_role, author_name FROM events WHERE family_id = ?",
+                       (family_id,)).fetchone()
+    assert row == (db.DIAPER, pytest.approx(expected), 'Родитель', 'Неизвестно')
+    assert conn.execute("SELECT timestamp FROM diapers WHERE family_id = ?", (family_id,)).fetchone()[0] \
+        .startswith('2025-08-27T20:00:00')
+    assert conn.execute("SELECT COUNT(*) FROM feedings WHERE family_id = ?", (family_id,)).fetchone()[0] == 0
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Тесты итогов по суткам (daily_rollup): инкремент и пересчёт против полного пересчёта"""
+
+import json
+from datetime import datetime
+
+import clock
+
+
+def _at(hour, minute=0, day=13):
+    return clock.to_thai(datetime(2025, 10, day, hour, minute))
+
+
+def _rows(db, family_id):
+    rows = db.get_connection().execute(
+        "SELECT local_date, type, count, first_ts, last_ts, max_gap, authors FROM daily_rollup "
+        "WHERE family_id = ? ORDER BY local_date, type", (family_id,)).fetchall()
+    return [row[:6] + (json.loads(row[6]),) for row in rows]
+
+
+def _assert_matches_backfill(db, family_id):
+    incremental = _rows(db, family_id)
+    db.backfill_daily_rollup([family_id])
+    assert _rows(db, family_id) == incremental
+    return incremental
+
+
+def _family(db):
+    family_id = db.create_family("Семья", 71)
+    db.join_family_by_code(str(family_id), 72)
+    return family_id
+
+
+def test_inserts_upsert_one_row_per_day_and_kind(db):
+    family_id = _family(db)
+    db.add_event('feedings', 71, _at(8))
+    db.add_event('feedings', 72, _at(11))
+    db.add_event('feedings', 71, _at(12))
+    db.add_event('diapers', 72, _at(9))
+    # 23:30 и 00:30 по тайскому времени — разные сутки
+    db.add_event('feedings', 71, _at(23, 30))
+    db.add_event('feedings', 72, _at(0, 30, day=14))
+
+    assert _assert_matches_backfill(db, family_id) == [
+        ('2025-10-13', db.FEEDING, 4, _at(8).timestamp(), _at(23, 30).timestamp(), 11.5 * 3600,
+         {'71': 3, '72': 1}),
+        ('2025-10-13', db.DIAPER, 1, _at(9).timestamp(), _at(9).timestamp(), 0, {'72': 1}),
+        ('2025-10-14', db.FEEDING, 1, _at(0, 30, day=14).timestamp(), _at(0, 30, day=14).timestamp(), 0,
+         {'72': 1}),
+    ]
+
+
+def test_backdated_insert_rebuilds_the_day(db):
+    family_id = _family(db)
+    db.add_event('feedings', 71, _at(6))
+    db.add_event('feedings', 71, _at(14))
+    # Задним числом — посреди самого долгого перерыва
+    db.add_event('feedings', 72, _at(10))
+
+    (row,) = _assert_matches_backfill(db, family_id)
+    assert row[2:] == (3, _at(6).timestamp(), _at(14).timestamp(), 4 * 3600, {'71': 2, '72': 1})
+
+
+def test_edit_and_delete_rebuild_affected_days(db):
+    family_id = _family(db)
+    moved = db.add_event('diapers', 71, _at(7))
+    db.add_event('diapers', 72, _at(9))
+    only = db.add_event('diapers', 72, _at(10, day=14))
+
+    # Перенос на другие сутки пересчитывает и прежние, и новые
+    assert db.update_event_time('diapers', moved, _at(12, day=14), family_id)
+    assert _assert_matches_backfill(db, family_id) == [
+        ('2025-10-13', db.DIAPER, 1, _at(9).timestamp(), _at(9).timestamp(), 0, {'72': 1}),
+        ('2025-10-14', db.DIAPER, 2, _at(10, day=14).timestamp(), _at(12, day=14).timestamp(), 2 * 3600,
+         {'71': 1, '72': 1}),
+    ]
+
+    # Удаление единственного события суток убирает строку
+    db.delete_entry('diapers', moved, family_id)
+    db.delete_entry('diapers', only, family_id)
+    assert [row[0] for row in _assert_matches_backfill(db, family_id)] == ['2025-10-13']
+    assert db.get_daily_totals(family_id, _at(0), _at(0, day=15), ['diapers']) == {('2025-10-13', 'diapers'): 1}
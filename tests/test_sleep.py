@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Тесты интервалов сна: открытие, закрытие и суммы по суткам"""
+
+from datetime import datetime, timedelta
+
+import clock
+
+
+def _at(hour, minute=0, day=13):
+    return clock.to_thai(datetime(2025, 10, day, hour, minute))
+
+
+def test_start_and_stop_pair_into_one_interval(db, virtual_clock):
+    family_id = db.create_family("Семья", 31)
+    entry_id, start_ts, created = db.start_sleep(31, _at(9))
+    assert created
+
+    # Повторное «Уснул», пока малыш спит, возвращает тот же интервал
+    assert db.start_sleep(31, _at(9, 30)) == (entry_id, start_ts, False)
+    assert db.get_open_sleep(family_id) == (entry_id, start_ts)
+
+    assert db.stop_sleep(31, _at(10, 30)) == (entry_id, start_ts, _at(10, 30).timestamp())
+    assert db.get_open_sleep(family_id) is None
+    assert db.stop_sleep(31, _at(11)) is None
+    assert db.get_sleep_total(family_id, _at(0), _at(23)) == 90 * 60
+
+
+def test_stop_before_start_gives_empty_interval(db, virtual_clock):
+    family_id = db.create_family("Семья", 33)
+    entry_id, start_ts, _ = db.start_sleep(33, _at(9))
+    assert db.stop_sleep(33, _at(8)) == (entry_id, start_ts, start_ts)
+    assert db.get_sleep_total(family_id, _at(0), _at(23)) == 0
+
+
+def test_open_interval_counts_until_now(db, virtual_clock):
+    family_id = db.create_family("Семья", 34)
+    db.start_sleep(34, _at(11))
+    assert db.get_sleep_total(family_id, _at(0)) == 3600
+    virtual_clock.advance(minutes=30)
+    assert db.get_sleep_total(family_id, _at(0)) == 90 * 60
+
+
+def test_forgotten_interval_is_closed_at_the_cap(db, virtual_clock):
+    family_id = db.create_family("Семья", 35)
+    old_id, old_ts, _ = db.start_sleep(35, _at(8, day=11))
+    new_id, new_ts, created = db.start_sleep(35, _at(9))
+    assert created and new_id != old_id
+
+    end_ts = db.get_connection().execute("SELECT end_ts FROM events WHERE id = ?", (old_id,)).fetchone()[0]
+    assert end_ts == old_ts + db.SLEEP_MAX_SECONDS
+    assert db.get_open_sleep(family_id) == (new_id, new_ts)
+
+
+def test_sleep_across_midnight_is_split_by_thai_day(db, virtual_clock):
+    family_id = db.create_family("Семья", 36)
+    db.start_sleep(36, _at(22, day=12))
+    db.stop_sleep(36, _at(6, day=13))
+
+    totals = db.get_daily_totals(family_id, '2025-10-12', '2025-10-14')
+    assert totals[('2025-10-12', 'sleep')] == 2 * 3600
+    assert totals[('2025-10-13', 'sleep')] == 6 * 3600
+    # Окно запроса обрезает интервал
+    assert db.get_sleep_total(family_id, _at(0), _at(23)) == 6 * 3600
+    assert db.get_sleep_total(family_id, _at(23, day=12), _at(1)) == 2 * 3600
+    assert timedelta(seconds=db.get_sleep_total(family_id, _at(22, day=12), _at(6))) == timedelta(hours=8)
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""Тесты слоя данных"""
+
+
+def test_member_changes_invalidate_cached_digest(db):
+    family_id = db.create_family("Семья", 101)
+    db.put_cached(('digest', family_id), ('2026-10-19', "старая сводка"))
+    db.set_member_role(101, 'Мама', 'Анна')
+    assert db.get_cached(('digest', family_id)) is None
+
+    db.put_cached(('digest', family_id), ('2026-10-19', "старая сводка"))
+    assert db.join_family_by_code(str(family_id), 102)[0] == family_id
+    assert db.get_cached(('digest', family_id)) is None
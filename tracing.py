@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Лёгкая трассировка обработки апдейтов BabyCareBot
+
+Каждый входящий апдейт (и каждый запуск задачи планировщика) открывает
+корневой span, внутри которого вложенными span'ами отмечаются функции
+storage.py и запросы к Telegram API. Текущий span хранится в contextvars,
+поэтому вложенность сохраняется и в корутинах, и в обычных функциях.
+
+Готовые span'ы пишутся отдельным потоком в файл JSON Lines — по строке на
+span, с полями в духе OTLP (traceId, spanId, parentSpanId, время в нс).
+
+Переменные окружения:
+    TRACE_SAMPLE_RATE  доля трассируемых апдейтов от 0 до 1 (по умолчанию 0 — выключено)
+    TRACE_FILE         файл для span'ов (по умолчанию traces.jsonl рядом с этим модулем)
+"""
+
+import atexit
+import contextlib
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+TRACE_FILE = os.getenv(
+    'TRACE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traces.jsonl'))
+
+_current_span = contextvars.ContextVar('babybot_span', default=None)
+
+
+class Span:
+    """Один отрезок работы внутри трассы"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'start_ns', 'end_ns', 'error')
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def to_dict(self):
+        entry = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id,
+            'name': self.name,
+            'startTimeUnixNano': self.start_ns,
+            'endTimeUnixNano': self.end_ns,
+            'durationMs': round((self.end_ns - self.start_ns) / 1e6, 3),
+            'attributes': self.attributes,
+            'status': 'ERROR' if self.error else 'OK',
+        }
+        if self.error:
+            entry['error'] = self.error
+        return entry
+
+
+class _FileExporter:
+    """Пишет span'ы в файл из отдельного потока, не задерживая event loop"""
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def export(self, span):
+        if self._thread is None:
+            self._start()
+        self._queue.put(span)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Забираем всё, что накопилось, и пишем одной операцией
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        spans = [span for span in batch if span is not None]
+        if spans:
+            with self._write_lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(s.to_dict(), ensure_ascii=False) + '\n' for s in spans))
+
+    def flush(self):
+        """Дописать всё из очереди (при выходе из процесса)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._write(batch)
+
+
+exporter = _FileExporter(TRACE_FILE)
+
+
+def configure(sample_rate=None, path=None):
+    """Переопределить долю выборки и файл (например, в бенчмарках)"""
+    global TRACE_SAMPLE_RATE
+    if sample_rate is not None:
+        TRACE_SAMPLE_RATE = sample_rate
+    if path is not None:
+        exporter.path = path
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextlib.contextmanager
+def _run_span(span):
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.end_ns = time.time_ns()
+        _current_span.reset(token)
+        exporter.export(span)
+
+
+@contextlib.contextmanager
+def start_trace(name, **attributes):
+    """Корневой span апдейта; трасса записывается с вероятностью TRACE_SAMPLE_RATE"""
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        yield None
+        return
+    with _run_span(Span(name, f"{random.getrandbits(128):032x}", attributes=attributes)) as span:
+        yield span
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Вложенный span; вне трассируемого апдейта ничего не делает"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    with _run_span(Span(name, parent.trace_id, parent.span_id, attributes)) as child:
+        yield child